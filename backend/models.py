@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Enum, Float, Boolean, Date, DateTime, ForeignKey, Text, JSON as JSONType
+from sqlalchemy import Column, Integer, String, Enum, Float, Boolean, Date, DateTime, ForeignKey, Index, Text, JSON as JSONType
 from database import Base
 import enum
 from datetime import datetime
@@ -125,6 +125,20 @@ class TariffArchive(Base):
     is_active = Column(Boolean, default=True)  # Активен ли архивный тариф
     created_by_user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=True)  # Кто создал тариф
 
+    # Частичный индекс под поиск активного архива по маршруту: в него
+    # попадают только активные записи, а выборка и сортировка по дате
+    # архивирования выполняются одним проходом по индексу
+    __table_args__ = (
+        Index(
+            "ix_tariff_archive_active",
+            transport_type, basis, origin_city, destination_city, archived_at.desc(),
+            # Условие в той же форме, в какой SQLAlchemy выводит фильтр по
+            # is_active для каждого диалекта: иначе индекс не применяется
+            postgresql_where=is_active,
+            sqlite_where=is_active == True
+        ),
+    )
+
 
 class Discount(Base):
     __tablename__ = "discounts"
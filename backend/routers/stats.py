@@ -33,7 +33,7 @@ def get_system_stats(current_user: models.User = Depends(get_current_user), db:
     
     # Количество архивных тарифов
     archived_tariffs = db.query(models.TariffArchive).filter(
-        models.TariffArchive.is_active == True
+        models.TariffArchive.is_active
     ).count()
     
     # Общее количество тарифов (активные + архивные)
@@ -67,7 +67,7 @@ def get_system_stats(current_user: models.User = Depends(get_current_user), db:
     archived_this_month = db.query(models.TariffArchive).filter(
         and_(
             models.TariffArchive.archived_at >= month_ago,
-            models.TariffArchive.is_active == True
+            models.TariffArchive.is_active
         )
     ).count()
     
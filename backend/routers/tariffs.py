@@ -140,7 +140,7 @@ def archive_tariff(tariff_id: int, _: models.User = Depends(get_current_user), d
 def list_archive(_: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
     """Получает полные данные архивных тарифов для отображения"""
     archived_tariffs = db.query(models.TariffArchive).filter(
-        models.TariffArchive.is_active == True
+        models.TariffArchive.is_active
     ).order_by(models.TariffArchive.archived_at.desc()).all()
     
     # Получаем данные поставщиков и пользователей
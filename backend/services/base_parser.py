@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 import logging
 import re
@@ -6,6 +7,26 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Ключевые слова в имени файла для определения типа транспорта (проверяются по порядку)
+_FILENAME_TRANSPORT_KEYWORDS = (
+    ('air', ('air', 'авиа', 'воздушн')),
+    ('sea', ('sea', 'море', 'морск', 'fcl', 'lcl')),
+    ('rail', ('rail', 'жд', 'железнодорожн', 'railway')),
+    ('multimodal', ('multimodal', 'мульти', 'комбинированн')),
+)
+
+
+@lru_cache(maxsize=4096)
+def detect_transport_type_by_filename(file_path: str) -> str:
+    """
+    Определение типа транспорта по имени файла
+    """
+    filename = file_path.lower()
+    for transport_type, keywords in _FILENAME_TRANSPORT_KEYWORDS:
+        if any(word in filename for word in keywords):
+            return transport_type
+    return 'auto'  # По умолчанию
+
 class BaseParser(ABC):
     """
     Базовый класс для всех специализированных парсеров тарифов
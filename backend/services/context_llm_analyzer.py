@@ -3,39 +3,187 @@
 Использует OCR для извлечения текста и LLM для понимания контекста
 """
 
+import os
+import asyncio
+import atexit
+import copy
+import hashlib
 import logging
 import json
 import re
+import threading
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 import traceback
 
 logger = logging.getLogger(__name__)
 
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+# Таймаут одного запроса к LLM (сек) и число попыток при таймауте/обрыве соединения
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "15"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+# Максимум одновременных запросов к LLM при пакетной обработке
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "4"))
+# Доля обязательных полей, найденных локальным парсером, при которой LLM не вызывается
+LOCAL_PARSE_MIN_COMPLETENESS = float(os.getenv("LOCAL_PARSE_MIN_COMPLETENESS", "0.8"))
+
+# Обязательные поля для каждого типа транспорта
+REQUIRED_FIELDS = {
+    'auto': ['origin_city', 'destination_city', 'price_rub', 'transit_time_days', 'basis'],
+    'air': ['origin_city', 'destination_city', 'price_usd', 'transit_time_days', 'basis'],
+    'sea': ['origin_city', 'destination_city', 'price_usd', 'transit_time_days', 'basis'],
+    'rail': ['origin_city', 'destination_city', 'price_rub', 'transit_time_days', 'basis']
+}
+
+# Пул клиентов Ollama: один клиент (и его keep-alive соединения) на хост,
+# общий для всех экземпляров анализатора
+_CLIENT_POOL: Dict[str, Any] = {}
+_CLIENT_POOL_LOCK = threading.Lock()
+
+
+def _get_client(host: str):
+    """Возвращает общий клиент Ollama для хоста, создавая его при первом обращении"""
+    client = _CLIENT_POOL.get(host)
+    if client is None:
+        with _CLIENT_POOL_LOCK:
+            client = _CLIENT_POOL.get(host)
+            if client is None:
+                import httpx
+                import ollama
+                client = ollama.Client(
+                    host=host,
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+                    timeout=httpx.Timeout(LLM_REQUEST_TIMEOUT),
+                )
+                _CLIENT_POOL[host] = client
+    return client
+
+
+@atexit.register
+def _close_clients() -> None:
+    """Закрывает соединения клиентов Ollama при завершении процесса"""
+    with _CLIENT_POOL_LOCK:
+        clients = list(_CLIENT_POOL.values())
+        _CLIENT_POOL.clear()
+    for client in clients:
+        # ollama.Client хранит httpx.Client в _client; close есть не во всех версиях
+        close = getattr(client, 'close', None) or getattr(getattr(client, '_client', None), 'close', None)
+        if close is None:
+            continue
+        try:
+            close()
+        except Exception as e:
+            logger.debug(f"Не удалось закрыть клиент Ollama: {e}")
+
+
+# Кэш ответов LLM: sha256 нормализованного текста -> структурированные данные.
+# Повторная загрузка того же тарифа не требует повторного запроса к модели.
+_response_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+_RESPONSE_CACHE_SIZE = int(os.getenv("LLM_RESPONSE_CACHE_SIZE", "512"))
+
+
+def _cache_key(text: str, transport_type: str, supplier_name: str) -> str:
+    """Ключ кэша: схлопываем пробелы, чтобы разный перенос строк OCR давал один ключ"""
+    normalized = " ".join(text.split())
+    payload = f"{transport_type}\x00{supplier_name}\x00{normalized}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Символы, влияющие на разбор JSON-объекта
+_JSON_STRUCTURE_RE = re.compile(r'[{}"\\]')
+
+
+class _JsonObjectScanner:
+    """
+    Инкрементально находит первый JSON-объект верхнего уровня в тексте.
+    Учитывает строки и экранирование, поэтому скобки внутри значений не сбивают счет.
+    """
+    
+    def __init__(self):
+        self.start = -1
+        self.end = -1
+        self._offset = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+    
+    def feed(self, chunk: str) -> bool:
+        """Добавляет фрагмент текста; возвращает True, когда объект закрыт"""
+        if self.end >= 0:
+            return True
+        if not chunk:
+            return False
+        pos = 0
+        if self._escape:
+            # Экранированный символ пришел в начале нового фрагмента
+            self._escape = False
+            pos = 1
+        # Перескакиваем сразу к следующему значимому символу: обычный текст
+        # просматривает движок regex, а не цикл Python по символам
+        while True:
+            match = _JSON_STRUCTURE_RE.search(chunk, pos)
+            if match is None:
+                break
+            ch = match.group()
+            pos = match.end()
+            if self._in_string:
+                if ch == '\\':
+                    if pos >= len(chunk):
+                        self._escape = True
+                    pos += 1
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                # Кавычки в тексте до объекта не считаем началом строки
+                if self._depth:
+                    self._in_string = True
+            elif ch == '{':
+                if self._depth == 0:
+                    self.start = self._offset + match.start()
+                self._depth += 1
+            elif ch == '}' and self._depth:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.end = self._offset + pos
+                    return True
+        self._offset += len(chunk)
+        return False
+
+
+def extract_json_object(text: str) -> Optional[str]:
+    """Возвращает первый JSON-объект верхнего уровня из ответа LLM (один проход)"""
+    scanner = _JsonObjectScanner()
+    if scanner.feed(text):
+        return text[scanner.start:scanner.end]
+    return None
+
+
 class ContextLLMAnalyzer:
     """
     LLM анализатор для понимания контекста и структурирования данных
     """
     
-    def __init__(self):
+    def __init__(self, host: str = OLLAMA_HOST):
+        self.host = host
         self.llm_available = False
         self._init_llm()
         
     def _init_llm(self):
         """Инициализация LLM (Ollama)"""
         try:
-            import ollama
-            self.ollama = ollama
+            self.client = _get_client(self.host)
             self.llm_available = True
             logger.info("LLM (Ollama) успешно инициализирован")
         except ImportError:
             logger.warning("Ollama не установлен. LLM функции недоступны")
             self.llm_available = False
-            self.ollama = None
+            self.client = None
         except Exception as e:
             logger.error(f"Ошибка инициализации LLM: {e}")
             self.llm_available = False
-            self.ollama = None
+            self.client = None
     
     def analyze_context_and_structure(self, extracted_text: str, transport_type: str = "auto", supplier_name: str = "") -> Dict[str, Any]:
         """
@@ -49,16 +197,43 @@ class ContextLLMAnalyzer:
         Returns:
             Структурированные данные для формы
         """
+        local_data = None
         try:
             if not self.llm_available:
                 logger.warning("LLM недоступен, используем fallback парсинг")
                 return self._fallback_parsing(extracted_text, transport_type)
             
+            # Проверяем кэш ранее обработанных текстов
+            key = _cache_key(extracted_text, transport_type, supplier_name)
+            with _response_cache_lock:
+                cached = _response_cache.get(key)
+                if cached is not None:
+                    _response_cache.move_to_end(key)
+            if cached is not None:
+                logger.info("LLM анализ взят из кэша")
+                return copy.deepcopy(cached)
+            
+            # Сначала локальный парсер: простые таблицы он разбирает сам,
+            # и запрос к LLM нужен только при неполном результате
+            local_data = self._fallback_parsing(extracted_text, transport_type)
+            completeness = self._required_fields_completeness(local_data, transport_type)
+            if completeness >= LOCAL_PARSE_MIN_COMPLETENESS:
+                logger.info(f"Локальный парсер заполнил {completeness:.0%} обязательных полей, LLM не требуется")
+                # Тот же формат и метаданные, что у результата LLM
+                validated_data = self._validate_and_enrich_data(
+                    local_data, transport_type,
+                    parsing_method=local_data.get('parsing_method') or 'intelligent_parser'
+                )
+                self._cache_response(key, validated_data)
+                return validated_data
+            logger.info(f"Локальный парсер заполнил {completeness:.0%} обязательных полей, обращаемся к LLM")
+            
             # Создаем промпт для LLM
+            system_prompt = self._create_system_prompt(transport_type)
             prompt = self._create_analysis_prompt(extracted_text, transport_type, supplier_name)
             
             # Отправляем запрос в LLM
-            response = self._query_llm(prompt)
+            response = self._query_llm(prompt, system_prompt)
             
             # Парсим ответ LLM
             structured_data = self._parse_llm_response(response, transport_type)
@@ -66,28 +241,47 @@ class ContextLLMAnalyzer:
             # Валидируем и дополняем данные
             validated_data = self._validate_and_enrich_data(structured_data, transport_type)
             
+            self._cache_response(key, validated_data)
+            
             logger.info(f"LLM анализ завершен. Извлечено полей: {len(validated_data)}")
             return validated_data
             
         except Exception as e:
             logger.error(f"Ошибка LLM анализа: {e}")
             logger.error(traceback.format_exc())
+            # Локальный разбор уже выполнен - повторять его незачем
+            if local_data is not None:
+                return local_data
             return self._fallback_parsing(extracted_text, transport_type)
     
-    def _create_analysis_prompt(self, text: str, transport_type: str, supplier_name: str) -> str:
-        """Создание промпта для LLM"""
+    def _cache_response(self, key: str, data: Dict[str, Any]) -> None:
+        """Сохраняет результат анализа в кэш ответов"""
+        with _response_cache_lock:
+            _response_cache[key] = copy.deepcopy(data)
+            while len(_response_cache) > _RESPONSE_CACHE_SIZE:
+                _response_cache.popitem(last=False)
+    
+    def _required_fields_completeness(self, data: Dict[str, Any], transport_type: str) -> float:
+        """Доля заполненных обязательных полей"""
+        if not data.get('success', True):
+            return 0.0
+        required = REQUIRED_FIELDS.get(transport_type, REQUIRED_FIELDS['auto'])
+        filled = sum(1 for field in required if data.get(field) is not None)
+        return filled / len(required)
+    
+    def _create_system_prompt(self, transport_type: str) -> str:
+        """Системный промпт с инструкциями и шаблоном формы.
+
+        Не зависит от текста документа и побайтово совпадает между вызовами
+        для одного типа транспорта, поэтому модель переиспользует уже
+        обработанный префикс контекста.
+        """
         
         # Определяем шаблон формы в зависимости от типа транспорта
         form_template = self._get_form_template(transport_type)
         
-        prompt = f"""
-Ты - эксперт по логистике и тарифам. Проанализируй следующий текст и извлеки структурированные данные для формы тарифа.
-
-ТИП ТРАНСПОРТА: {transport_type.upper()}
-ПОСТАВЩИК: {supplier_name}
-
-ТЕКСТ ДЛЯ АНАЛИЗА:
-{text}
+        return f"""
+Ты - эксперт по логистике и тарифам. Проанализируй присланный текст и извлеки структурированные данные для формы тарифа.
 
 ШАБЛОН ФОРМЫ:
 {form_template}
@@ -108,7 +302,18 @@ class ContextLLMAnalyzer:
 - Даты в формате YYYY-MM-DD
 - Будь точным и не выдумывай данные
 
-Верни только JSON без дополнительных комментариев:
+Верни только JSON без дополнительных комментариев.
+"""
+    
+    def _create_analysis_prompt(self, text: str, transport_type: str, supplier_name: str) -> str:
+        """Создание пользовательского промпта: только данные конкретного документа"""
+        
+        prompt = f"""
+ТИП ТРАНСПОРТА: {transport_type.upper()}
+ПОСТАВЩИК: {supplier_name}
+
+ТЕКСТ ДЛЯ АНАЛИЗА:
+{text}
 """
         return prompt
     
@@ -188,22 +393,48 @@ class ContextLLMAnalyzer:
         
         return templates.get(transport_type, templates['auto'])
     
-    def _query_llm(self, prompt: str) -> str:
+    def _query_llm(self, prompt: str, system_prompt: Optional[str] = None) -> str:
         """Запрос к LLM"""
         try:
-            if not self.llm_available or not self.ollama:
+            if not self.llm_available or not self.client:
                 raise Exception("LLM недоступен")
-                
-            response = self.ollama.chat(
-                model='mistral',
-                messages=[
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ]
-            )
-            return response['message']['content']
+            
+            import httpx
+            
+            messages = []
+            if system_prompt:
+                messages.append({'role': 'system', 'content': system_prompt})
+            messages.append({'role': 'user', 'content': prompt})
+            
+            # Медленный ответ не должен останавливать весь конвейер:
+            # прерываем запрос по таймауту и повторяем
+            for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+                try:
+                    # Читаем ответ потоком и прекращаем генерацию, как только
+                    # закрылся JSON-объект: пояснения модели после него не нужны
+                    parts = []
+                    scanner = _JsonObjectScanner()
+                    # format='json' включает режим JSON в Ollama: модель не может
+                    # выйти за пределы валидного JSON, лишние токены не генерируются
+                    stream = self.client.chat(
+                        model='mistral',
+                        messages=messages,
+                        format='json',
+                        stream=True
+                    )
+                    try:
+                        for chunk in stream:
+                            content = chunk['message']['content']
+                            parts.append(content)
+                            if scanner.feed(content):
+                                break
+                    finally:
+                        stream.close()
+                    return ''.join(parts)
+                except (httpx.TimeoutException, httpx.ConnectError) as e:
+                    if attempt == LLM_MAX_ATTEMPTS:
+                        raise
+                    logger.warning(f"LLM не ответил (попытка {attempt}/{LLM_MAX_ATTEMPTS}): {e}")
         except Exception as e:
             logger.error(f"Ошибка запроса к LLM: {e}")
             raise
@@ -212,9 +443,8 @@ class ContextLLMAnalyzer:
         """Парсинг ответа LLM"""
         try:
             # Ищем JSON в ответе
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
+            json_str = extract_json_object(response)
+            if json_str:
                 data = json.loads(json_str)
                 logger.info(f"LLM вернул структурированные данные: {list(data.keys())}")
                 return data
@@ -228,22 +458,15 @@ class ContextLLMAnalyzer:
             logger.error(f"Ошибка обработки ответа LLM: {e}")
             return {}
     
-    def _validate_and_enrich_data(self, data: Dict[str, Any], transport_type: str) -> Dict[str, Any]:
+    def _validate_and_enrich_data(self, data: Dict[str, Any], transport_type: str,
+                                  parsing_method: str = 'llm_context_analysis') -> Dict[str, Any]:
         """Валидация и обогащение данных"""
         try:
             validated_data = {}
             
-            # Обязательные поля для каждого типа транспорта
-            required_fields = {
-                'auto': ['origin_city', 'destination_city', 'price_rub', 'transit_time_days', 'basis'],
-                'air': ['origin_city', 'destination_city', 'price_usd', 'transit_time_days', 'basis'],
-                'sea': ['origin_city', 'destination_city', 'price_usd', 'transit_time_days', 'basis'],
-                'rail': ['origin_city', 'destination_city', 'price_rub', 'transit_time_days', 'basis']
-            }
-            
             # Проверяем обязательные поля
             missing_fields = []
-            for field in required_fields.get(transport_type, []):
+            for field in REQUIRED_FIELDS.get(transport_type, []):
                 if field not in data or data[field] is None:
                     missing_fields.append(field)
                 else:
@@ -257,7 +480,7 @@ class ContextLLMAnalyzer:
             # Добавляем метаданные
             validated_data['transport_type'] = transport_type
             validated_data['parsed_at'] = datetime.now().isoformat()
-            validated_data['parsing_method'] = 'llm_context_analysis'
+            validated_data['parsing_method'] = parsing_method
             validated_data['missing_required_fields'] = missing_fields
             
             if missing_fields:
@@ -273,7 +496,7 @@ class ContextLLMAnalyzer:
         """Fallback парсинг без LLM"""
         try:
             # Импортируем только при необходимости, чтобы избежать циклических импортов
-            from intelligent_parser import intelligent_parser
+            from services.intelligent_parser import intelligent_parser
             result = intelligent_parser.parse_text(text, transport_type)
             if result.get('success', True):  # Если success не False, считаем успешным
                 return result
@@ -303,3 +526,25 @@ class ContextLLMAnalyzer:
 
 # Создаем глобальный экземпляр
 context_llm_analyzer = ContextLLMAnalyzer()
+
+
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+
+async def analyze_texts_with_llm(texts: List[str], transport_type: str = "auto", supplier_name: str = "") -> List[Dict[str, Any]]:
+    """
+    Пакетный анализ нескольких текстов (например, при загрузке нескольких файлов).
+    Число одновременных запросов к LLM ограничено LLM_CONCURRENCY, чтобы
+    параллельные загрузки не перегружали модель.
+    """
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    
+    async def analyze_one(text: str) -> Dict[str, Any]:
+        async with _llm_semaphore:
+            return await asyncio.to_thread(
+                context_llm_analyzer.analyze_context_and_structure, text, transport_type, supplier_name
+            )
+    
+    return await asyncio.gather(*(analyze_one(text) for text in texts))
@@ -6,12 +6,300 @@
 
 import re
 import logging
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 # LLM анализатор удален
 from services.adaptive_analyzer import analyze_tariff_text_adaptive
 
+# RE2 (google-re2) гарантирует линейное время поиска без возвратов;
+# если пакет не установлен, используем стандартный re
+try:
+    import re2 as regex_engine
+except ImportError:
+    regex_engine = re
+
 logger = logging.getLogger(__name__)
 
+# Исправления типичных ошибок OCR: ошибочный фрагмент -> верный
+OCR_CORRECTIONS = {
+    # Основные OCR исправления
+    'SVO1': 'SVO',
+    'VWVO': 'VVO',
+    
+    # Исправления названий городов
+    'MOSCOW': 'Moscow',
+    'BEIJING': 'Beijing',
+    'HONGKONG': 'Hong Kong',
+    'HONG KONG': 'Hong Kong',
+    'SHENZHEN': 'Shenzhen',
+    
+    # Исправления кодов аэропортов
+    'XIY': 'Xian',
+    'PEK': 'Beijing',
+    'CAN': 'Guangzhou',
+    'SHA': 'Shanghai',
+    'CTU': 'Chengdu',
+    'CKG': 'Chongqing',
+    'KMG': 'Kunming',
+    'XMN': 'Xiamen',
+    'TAO': 'Qingdao',
+    'DLC': 'Dalian',
+    'TSN': 'Tianjin',
+    'SHE': 'Shenyang',
+    'HGH': 'Hangzhou',
+    'NGB': 'Ningbo',
+    'WUH': 'Wuhan',
+    'CSX': 'Changsha',
+    'CGO': 'Zhengzhou',
+    
+    # Дополнительные исправления
+    'ian': 'Xian',  # Исправление для 001-AIR.png
+    'Viadivostok': 'Vladivostok',
+    'Urumai': 'Urumqi',
+    'Urungi': 'Urumqi',
+    'RMB': 'CNY',
+    'RMB/kg': 'CNY/kg',
+    'usd/kg': 'USD/kg',
+    'usd': 'USD',
+    'yuan': 'CNY',
+    
+    # Исправления для маршрутов
+    'HKG-XIY-SVO1': 'HKG-XIY-SVO',
+    'PEK-VWVO': 'PEK-VVO'
+}
+
+# Коды аэропортов
+AIRPORT_CODES = {
+    "HKG": "Hong Kong",
+    "XIY": "Xian", 
+    "SVO": "Moscow",
+    "PEK": "Beijing",
+    "VVO": "Vladivostok",
+    "CAN": "Guangzhou",
+    "SHA": "Shanghai",
+    "CTU": "Chengdu",
+    "CKG": "Chongqing",
+    "KMG": "Kunming",
+    "XMN": "Xiamen",
+    "TAO": "Qingdao",
+    "DLC": "Dalian",
+    "TSN": "Tianjin",
+    "SHE": "Shenyang",
+    "HGH": "Hangzhou",
+    "NGB": "Ningbo",
+    "WUH": "Wuhan",
+    "CSX": "Changsha",
+    "CGO": "Zhengzhou"
+}
+
+# Страна по городу
+_CHINESE_CITIES = ("Hong Kong", "Beijing", "Shanghai", "Xian", "Guangzhou", "Shenzhen", "Chengdu", "Chongqing", "Kunming", "Xiamen", "Qingdao", "Dalian", "Tianjin", "Shenyang", "Hangzhou", "Ningbo", "Wuhan", "Changsha", "Zhengzhou")
+_RUSSIAN_CITIES = ("Moscow", "Vladivostok", "St. Petersburg", "Novosibirsk", "Yekaterinburg", "Kazan", "Nizhny Novgorod", "Chelyabinsk", "Samara", "Omsk", "Rostov", "Ufa", "Perm", "Volgograd", "Krasnoyarsk", "Saratov", "Voronezh")
+_COUNTRY_BY_CITY = {
+    **{city: "China" for city in _CHINESE_CITIES},
+    **{city: "Russia" for city in _RUSSIAN_CITIES},
+}
+
+# Кириллические буквы, которые OCR выдает вместо похожих латинских
+_CYRILLIC_TO_LATIN = str.maketrans({
+    "А": "A", "В": "B", "Е": "E", "К": "K", "М": "M", "Н": "H",
+    "О": "O", "Р": "P", "С": "C", "Т": "T", "У": "V", "Х": "X",
+})
+# Трехбуквенные слова из заглавных латинских и похожих кириллических букв
+# с хотя бы одной кириллической ('УУО', 'РЕК')
+_CYRILLIC_CODE_PATTERN = r'\b(?=[A-Z]*[АВЕКМНОРСТУХ])[A-ZАВЕКМНОРСТУХ]{3}\b'
+
+# Все исправления одной альтернацией вместе с кириллическими кодами, чтобы
+# текст просматривался за один проход. Более длинные ключи раньше, чтобы
+# 'HKG-XIY-SVO1' побеждал 'SVO1'
+_OCR_FIX_RE = re.compile(
+    f'(?P<code>{_CYRILLIC_CODE_PATTERN})|'
+    + '|'.join(re.escape(wrong) for wrong in sorted(OCR_CORRECTIONS, key=len, reverse=True))
+)
+
+
+def _fix_ocr_match(match) -> str:
+    """Замена для найденного ошибочного фрагмента."""
+    word = match.group(0)
+    if match.lastgroup == 'code':
+        # Кириллицу переводим в латиницу, только если получается известный код аэропорта
+        code = word.translate(_CYRILLIC_TO_LATIN)
+        if code not in AIRPORT_CODES:
+            return word
+        return OCR_CORRECTIONS.get(code, code)
+    return OCR_CORRECTIONS[word]
+
+
+# Коды и названия узловых аэропортов для маршрутов с городами
+_AIR_HUBS = r'(HKG|PEK|CAN|SHA|XIY|SVO|VVO|Moscow|Beijing|Hong Kong|Гонконг|Россия)'
+
+# Расширенные паттерны для маршрутов (флаг регистра встроен как (?i) -
+# эту форму понимают и re, и RE2)
+_ROUTE_PATTERNS = tuple(regex_engine.compile('(?i)' + pattern) for pattern in (
+    # Стандартные коды аэропортов
+    r'([A-Z]{3})-([A-Z]{3}(?:-[A-Z0-9]+)?)',
+    r'([A-Z]{3})\s*[-→]\s*([A-Z]{3})',
+    r'([A-Z]{3})\s*TO\s*([A-Z]{3})',
+    r'([A-Z]{3})\s*-\s*([A-Z]{3})',
+    
+    # Маршруты с городами
+    _AIR_HUBS + r'\s*[-→]\s*' + _AIR_HUBS,
+    _AIR_HUBS + r'\s*TO\s*' + _AIR_HUBS,
+    
+    # Маршруты с дополнительными кодами
+    r'([A-Z]{3})-([A-Z]{3})\s*([A-Z0-9]+)',
+    r'([A-Z]{3})\s*[-→]\s*([A-Z]{3})\s*([A-Z0-9]+)',
+    
+    # Специальные паттерны для авиационных маршрутов
+    r'([A-Z]{3})-([A-Z]{3})-([A-Z0-9]+)',
+    r'([A-Z]{3})\s*[-→]\s*([A-Z]{3})\s*[-→]\s*([A-Z0-9]+)',
+    
+    # Паттерны для маршрутов с описанием
+    r'([A-Z]{3})\s*[-→]\s*([A-Z]{3})\s*.*?(\d+\.?\d*)',
+    r'([A-Z]{3})-([A-Z]{3})\s*.*?(\d+\.?\d*)',
+    
+    # Новые паттерны для найденных маршрутов
+    r'(Гонконг)\s*-\s*(Россия)',
+    r'(Индонезия.*?Бали)\s*-\s*(Москва)',
+    r'(Дубай)\s*-\s*(Москва)',
+    r'(BEIJING)\s*TO\s*(MOSCOW)',
+    r'(BEIJING)\s*-\s*(MOSCOW)',
+    r'(XINJIANG)\s*TO\s*(MOSCOW)',
+    r'(XINJIANG)\s*-\s*(MOSCOW)',
+    
+    # Специальные паттерны для сложных маршрутов
+    r'(HKG)-([A-Z]{3})-([A-Z0-9]+)',  # HKG-XIY-SVO1
+))
+
+# Расширенные паттерны для цен
+_PRICE_PATTERNS = tuple(regex_engine.compile('(?i)' + pattern) for pattern in (
+    # Стандартные паттерны с валютой
+    r'(\d+\.?\d*)\s*USD',
+    r'(\d+\.?\d*)\s*CNY', 
+    r'(\d+\.?\d*)\s*RUB',
+    r'USD\s*(\d+\.?\d*)',
+    r'CNY\s*(\d+\.?\d*)',
+    r'RUB\s*(\d+\.?\d*)',
+    
+    # Паттерны без валюты (предполагаем USD)
+    r'\|\s*(\d+\.?\d*)',
+    r'(\d+\.?\d*)\s*per',
+    r'(\d+\.?\d*)\s*shpt',
+    r'(\d+\.?\d*)\s*kg',
+    
+    # Табличные данные
+    r'(\d+\.?\d*)\s*\|\s*(\d+\.?\d*)\s*\|\s*(\d+\.?\d*)',
+    r'(\d+\.?\d*)\s*(\d+\.?\d*)\s*(\d+\.?\d*)',
+    
+    # Специальные паттерны для авиационных цен
+    r'(\d+\.?\d*)\s*USD/kg',
+    r'(\d+\.?\d*)\s*CNY/kg',
+    r'(\d+\.?\d*)\s*RUB/kg',
+    
+    # Новые паттерны для найденных цен
+    r'(\d+,\d+)\s*\|',  # 59,00 |
+    r'(\d+\.?\d*)\s*RMB/kg',  # Цены в RMB
+    r'(\d+\.?\d*)\s*usd/kg',  # Цены в usd/kg
+    r'(\d+\.?\d*)\s*kg\+',  # 100 кг+
+    r'(\d+\.?\d*)\s*\+',  # 100+
+    
+    # Паттерны для цен в таблицах
+    r'(\d+\.?\d*)\s*\|\s*(\d+\.?\d*)\s*\|\s*(\d+\.?\d*)\s*\|',  # Табличные цены
+    r'(\d+\.?\d*)\s*(\d+\.?\d*)\s*(\d+\.?\d*)\s*\|',  # Цены без разделителей
+    
+    # Дополнительные паттерны для найденных цен
+    r'(\d+\.?\d*)\s*\|',  # 8.90 |
+    r'(\d+\.?\d*)\s*(\d+\.?\d*)\s*(\d+\.?\d*)\s*(\d+\.?\d*)',  # 8.90 5.50 4.85 4.57
+    r'(\d+\.?\d*)\s*(\d+\.?\d*)\s*(\d+\.?\d*)',  # 1250 1450
+    r'(\d+\.?\d*)\s*(\d+\.?\d*)',  # 1250 1450
+))
+
+def _scan_line_prices(line: str) -> List[Tuple[str, float]]:
+    """Цены, найденные в строке, в порядке применения паттернов."""
+    found = []
+    line_upper = line.upper()
+    for pattern in _PRICE_PATTERNS:
+        match = pattern.search(line)
+        if match:
+            try:
+                # Обрабатываем разные группы захвата
+                if len(match.groups()) == 1:
+                    price = float(match.group(1).replace(',', '.'))
+                    
+                    # Определяем валюту по контексту
+                    if 'USD' in line_upper:
+                        found.append(("price_usd", price))
+                    elif 'CNY' in line_upper or 'RMB' in line_upper or 'yuan' in line.lower():
+                        found.append(("price_cny", price))
+                    elif 'RUB' in line_upper:
+                        found.append(("price_rub", price))
+                    else:
+                        # По умолчанию считаем USD для авиационных тарифов
+                        found.append(("price_usd", price))
+                
+                elif len(match.groups()) >= 2:
+                    # Для табличных данных берем первое значение
+                    price = float(match.group(1).replace(',', '.'))
+                    
+                    # Определяем валюту по контексту строки
+                    if 'RMB' in line_upper or 'CNY' in line_upper:
+                        found.append(("price_cny", price))
+                    else:
+                        found.append(("price_usd", price))
+            
+            except ValueError:
+                continue
+    return found
+
+
+def _scan_text_prices(text: str) -> List[Tuple[str, float]]:
+    """Цены по всему тексту - запасной вариант, когда у маршрута их нет."""
+    text_upper = text.upper()
+    price_key = "price_cny" if 'RMB' in text_upper or 'CNY' in text_upper else "price_usd"
+    found = []
+    for pattern in _PRICE_PATTERNS:
+        for match in pattern.finditer(text):
+            if len(match.groups()) == 1:
+                try:
+                    found.append((price_key, float(match.group(1).replace(',', '.'))))
+                except ValueError:
+                    continue
+    return found
+
+
+class _TariffLines:
+    """Текст тарифа, разбитый на строки один раз на документ.
+
+    Хранит индекс строк, где встречается маршрут, и кэш цен по строкам:
+    соседние строки разных маршрутов не сканируются повторно.
+    """
+    
+    def __init__(self, text: str):
+        self.text = text
+        self.lines = text.split('\n')
+        self._route_lines: Dict[str, List[int]] = {}
+        self._line_prices: Dict[int, List[Tuple[str, float]]] = {}
+        self._text_prices: Optional[List[Tuple[str, float]]] = None
+    
+    def route_line_indexes(self, route_text: str) -> List[int]:
+        indexes = self._route_lines.get(route_text)
+        if indexes is None:
+            indexes = [i for i, line in enumerate(self.lines) if route_text in line]
+            self._route_lines[route_text] = indexes
+        return indexes
+    
+    def line_prices(self, index: int) -> List[Tuple[str, float]]:
+        found = self._line_prices.get(index)
+        if found is None:
+            found = _scan_line_prices(self.lines[index])
+            self._line_prices[index] = found
+        return found
+    
+    def text_prices(self) -> List[Tuple[str, float]]:
+        if self._text_prices is None:
+            self._text_prices = _scan_text_prices(self.text)
+        return self._text_prices
+
+
 class EnhancedAviationAnalyzer:
     """Улучшенный анализатор авиационных файлов с интеграцией всех решений."""
     
@@ -43,105 +331,15 @@ class EnhancedAviationAnalyzer:
     
     def _fix_ocr_errors(self, text: str) -> str:
         """Исправляет OCR ошибки в тексте."""
-        corrections = {
-            # Основные OCR исправления
-            'SVO1': 'SVO',
-            'VWVO': 'VVO',
-            'УУО': 'VVO',
-            'УУО': 'VVO',
-            
-            # Исправления названий городов
-            'MOSCOW': 'Moscow',
-            'BEIJING': 'Beijing',
-            'HONGKONG': 'Hong Kong',
-            'HONG KONG': 'Hong Kong',
-            'SHENZHEN': 'Shenzhen',
-            
-            # Исправления кодов аэропортов
-            'XIY': 'Xian',
-            'PEK': 'Beijing',
-            'CAN': 'Guangzhou',
-            'SHA': 'Shanghai',
-            'CTU': 'Chengdu',
-            'CKG': 'Chongqing',
-            'KMG': 'Kunming',
-            'XMN': 'Xiamen',
-            'TAO': 'Qingdao',
-            'DLC': 'Dalian',
-            'TSN': 'Tianjin',
-            'SHE': 'Shenyang',
-            'HGH': 'Hangzhou',
-            'NGB': 'Ningbo',
-            'WUH': 'Wuhan',
-            'CSX': 'Changsha',
-            'CGO': 'Zhengzhou',
-            
-            # Дополнительные исправления
-            'ian': 'Xian',  # Исправление для 001-AIR.png
-            'Viadivostok': 'Vladivostok',
-            'Urumai': 'Urumqi',
-            'Urungi': 'Urumqi',
-            'RMB': 'CNY',
-            'RMB/kg': 'CNY/kg',
-            'usd/kg': 'USD/kg',
-            'usd': 'USD',
-            'yuan': 'CNY',
-            
-            # Исправления для маршрутов
-            'HKG-XIY-SVO1': 'HKG-XIY-SVO',
-            'PEK-VWVO': 'PEK-VVO'
-        }
-        
-        corrected_text = text
-        for wrong, correct in corrections.items():
-            corrected_text = corrected_text.replace(wrong, correct)
-        
-        return corrected_text
+        return _OCR_FIX_RE.sub(_fix_ocr_match, text)
     
     def _extract_enhanced_routes(self, text: str) -> List[Dict[str, Any]]:
         """Извлекает маршруты с улучшенными паттернами."""
         routes = []
+        document = _TariffLines(text)
         
-        # Расширенные паттерны для маршрутов
-        route_patterns = [
-            # Стандартные коды аэропортов
-            r'([A-Z]{3})-([A-Z]{3}(?:-[A-Z0-9]+)?)',
-            r'([A-Z]{3})\s*[-→]\s*([A-Z]{3})',
-            r'([A-Z]{3})\s*TO\s*([A-Z]{3})',
-            r'([A-Z]{3})\s*-\s*([A-Z]{3})',
-            
-            # Маршруты с городами
-            r'(HKG|PEK|CAN|SHA|XIY|SVO|VVO|Moscow|Beijing|Hong Kong|Гонконг|Россия)\s*[-→]\s*(HKG|PEK|CAN|SHA|XIY|SVO|VVO|Moscow|Beijing|Hong Kong|Гонконг|Россия)',
-            r'(HKG|PEK|CAN|SHA|XIY|SVO|VVO|Moscow|Beijing|Hong Kong|Гонконг|Россия)\s*TO\s*(HKG|PEK|CAN|SHA|XIY|SVO|VVO|Moscow|Beijing|Hong Kong|Гонконг|Россия)',
-            
-            # Маршруты с дополнительными кодами
-            r'([A-Z]{3})-([A-Z]{3})\s*([A-Z0-9]+)',
-            r'([A-Z]{3})\s*[-→]\s*([A-Z]{3})\s*([A-Z0-9]+)',
-            
-            # Специальные паттерны для авиационных маршрутов
-            r'([A-Z]{3})-([A-Z]{3})-([A-Z0-9]+)',
-            r'([A-Z]{3})\s*[-→]\s*([A-Z]{3})\s*[-→]\s*([A-Z0-9]+)',
-            
-            # Паттерны для маршрутов с описанием
-            r'([A-Z]{3})\s*[-→]\s*([A-Z]{3})\s*.*?(\d+\.?\d*)',
-            r'([A-Z]{3})-([A-Z]{3})\s*.*?(\d+\.?\d*)',
-            
-            # Новые паттерны для найденных маршрутов
-            r'(Гонконг)\s*-\s*(Россия)',
-            r'(Индонезия.*?Бали)\s*-\s*(Москва)',
-            r'(Дубай)\s*-\s*(Москва)',
-            r'(BEIJING)\s*TO\s*(MOSCOW)',
-            r'(BEIJING)\s*-\s*(MOSCOW)',
-            r'(XINJIANG)\s*TO\s*(MOSCOW)',
-            r'(XINJIANG)\s*-\s*(MOSCOW)',
-            
-            # Специальные паттерны для сложных маршрутов
-            r'(HKG)-([A-Z]{3})-([A-Z0-9]+)',  # HKG-XIY-SVO1
-            r'([A-Z]{3})-([A-Z]{3})-([A-Z0-9]+)',  # PEK-VWVO D146
-        ]
-        
-        for pattern in route_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
+        for pattern in _ROUTE_PATTERNS:
+            matches = pattern.finditer(text)
             for match in matches:
                 origin_code = match.group(1)
                 destination_code = match.group(2)
@@ -179,7 +377,7 @@ class EnhancedAviationAnalyzer:
                     }
                     
                     # Ищем цены для этого маршрута
-                    prices = self._extract_prices_for_route(text, match.group(0))
+                    prices = self._extract_prices_for_route(document, match.group(0))
                     if prices:
                         route.update(prices)
                     
@@ -193,36 +391,13 @@ class EnhancedAviationAnalyzer:
     
     def _get_city_by_code(self, code: str) -> Optional[str]:
         """Определяет город по коду аэропорта."""
-        airport_codes = {
-            "HKG": "Hong Kong",
-            "XIY": "Xian", 
-            "SVO": "Moscow",
-            "PEK": "Beijing",
-            "VVO": "Vladivostok",
-            "CAN": "Guangzhou",
-            "SHA": "Shanghai",
-            "CTU": "Chengdu",
-            "CKG": "Chongqing",
-            "KMG": "Kunming",
-            "XMN": "Xiamen",
-            "TAO": "Qingdao",
-            "DLC": "Dalian",
-            "TSN": "Tianjin",
-            "SHE": "Shenyang",
-            "HGH": "Hangzhou",
-            "NGB": "Ningbo",
-            "WUH": "Wuhan",
-            "CSX": "Changsha",
-            "CGO": "Zhengzhou"
-        }
-        
         # Сначала проверяем точное совпадение
-        if code.upper() in airport_codes:
-            return airport_codes[code.upper()]
+        if code.upper() in AIRPORT_CODES:
+            return AIRPORT_CODES[code.upper()]
         
         # Проверяем частичные совпадения для OCR ошибок
         code_upper = code.upper()
-        for airport_code, city in airport_codes.items():
+        for airport_code, city in AIRPORT_CODES.items():
             if airport_code in code_upper or code_upper in airport_code:
                 return city
         
@@ -246,124 +421,25 @@ class EnhancedAviationAnalyzer:
     
     def _determine_country(self, city: str) -> str:
         """Определяет страну по городу."""
-        chinese_cities = ["Hong Kong", "Beijing", "Shanghai", "Xian", "Guangzhou", "Shenzhen", "Chengdu", "Chongqing", "Kunming", "Xiamen", "Qingdao", "Dalian", "Tianjin", "Shenyang", "Hangzhou", "Ningbo", "Wuhan", "Changsha", "Zhengzhou"]
-        russian_cities = ["Moscow", "Vladivostok", "St. Petersburg", "Novosibirsk", "Yekaterinburg", "Kazan", "Nizhny Novgorod", "Chelyabinsk", "Samara", "Omsk", "Rostov", "Ufa", "Perm", "Volgograd", "Krasnoyarsk", "Saratov", "Voronezh"]
-        
-        if city in chinese_cities:
-            return "China"
-        elif city in russian_cities:
-            return "Russia"
-        else:
-            return "Unknown"
+        return _COUNTRY_BY_CITY.get(city, "Unknown")
     
-    def _extract_prices_for_route(self, text: str, route_text: str) -> Dict[str, Optional[float]]:
+    def _extract_prices_for_route(self, document: "_TariffLines", route_text: str) -> Dict[str, Optional[float]]:
         """Извлекает цены для конкретного маршрута."""
         prices = {"price_usd": None, "price_cny": None, "price_rub": None}
         
-        # Расширенные паттерны для цен
-        price_patterns = [
-            # Стандартные паттерны с валютой
-            r'(\d+\.?\d*)\s*USD',
-            r'(\d+\.?\d*)\s*CNY', 
-            r'(\d+\.?\d*)\s*RUB',
-            r'USD\s*(\d+\.?\d*)',
-            r'CNY\s*(\d+\.?\d*)',
-            r'RUB\s*(\d+\.?\d*)',
-            
-            # Паттерны без валюты (предполагаем USD)
-            r'\|\s*(\d+\.?\d*)',
-            r'(\d+\.?\d*)\s*per',
-            r'(\d+\.?\d*)\s*shpt',
-            r'(\d+\.?\d*)\s*kg',
-            
-            # Табличные данные
-            r'(\d+\.?\d*)\s*\|\s*(\d+\.?\d*)\s*\|\s*(\d+\.?\d*)',
-            r'(\d+\.?\d*)\s*(\d+\.?\d*)\s*(\d+\.?\d*)',
-            
-            # Специальные паттерны для авиационных цен
-            r'(\d+\.?\d*)\s*USD/kg',
-            r'(\d+\.?\d*)\s*CNY/kg',
-            r'(\d+\.?\d*)\s*RUB/kg',
-            
-            # Новые паттерны для найденных цен
-            r'(\d+,\d+)\s*\|',  # 59,00 |
-            r'(\d+\.?\d*)\s*RMB/kg',  # Цены в RMB
-            r'(\d+\.?\d*)\s*usd/kg',  # Цены в usd/kg
-            r'(\d+\.?\d*)\s*kg\+',  # 100 кг+
-            r'(\d+\.?\d*)\s*\+',  # 100+
-            
-            # Паттерны для цен в таблицах
-            r'(\d+\.?\d*)\s*\|\s*(\d+\.?\d*)\s*\|\s*(\d+\.?\d*)\s*\|',  # Табличные цены
-            r'(\d+\.?\d*)\s*(\d+\.?\d*)\s*(\d+\.?\d*)\s*\|',  # Цены без разделителей
-            
-            # Дополнительные паттерны для найденных цен
-            r'(\d+\.?\d*)\s*\|',  # 8.90 |
-            r'(\d+\.?\d*)\s*(\d+\.?\d*)\s*(\d+\.?\d*)\s*(\d+\.?\d*)',  # 8.90 5.50 4.85 4.57
-            r'(\d+\.?\d*)\s*(\d+\.?\d*)\s*(\d+\.?\d*)',  # 1250 1450
-            r'(\d+\.?\d*)\s*(\d+\.?\d*)',  # 1250 1450
-        ]
-        
         # Ищем в строке с маршрутом и соседних строках
-        lines = text.split('\n')
-        for i, line in enumerate(lines):
-            if route_text in line:
-                # Проверяем текущую строку и соседние
-                for j in range(max(0, i-2), min(len(lines), i+3)):
-                    check_line = lines[j]
-                    for pattern in price_patterns:
-                        match = re.search(pattern, check_line, re.IGNORECASE)
-                        if match:
-                            try:
-                                # Обрабатываем разные группы захвата
-                                if len(match.groups()) == 1:
-                                    price_str = match.group(1).replace(',', '.')
-                                    price = float(price_str)
-                                    
-                                    # Определяем валюту по контексту
-                                    if 'USD' in check_line.upper() or 'usd' in check_line.lower():
-                                        prices["price_usd"] = price
-                                    elif 'CNY' in check_line.upper() or 'RMB' in check_line.upper() or 'yuan' in check_line.lower():
-                                        prices["price_cny"] = price
-                                    elif 'RUB' in check_line.upper():
-                                        prices["price_rub"] = price
-                                    else:
-                                        # По умолчанию считаем USD для авиационных тарифов
-                                        prices["price_usd"] = price
-                                        
-                                elif len(match.groups()) >= 2:
-                                    # Для табличных данных берем первое значение
-                                    price_str = match.group(1).replace(',', '.')
-                                    price = float(price_str)
-                                    
-                                    # Определяем валюту по контексту строки
-                                    if 'RMB' in check_line.upper() or 'CNY' in check_line.upper():
-                                        prices["price_cny"] = price
-                                    else:
-                                        prices["price_usd"] = price
-                                        
-                            except ValueError:
-                                continue
+        line_count = len(document.lines)
+        for i in document.route_line_indexes(route_text):
+            # Проверяем текущую строку и соседние
+            for j in range(max(0, i-2), min(line_count, i+3)):
+                for price_key, price in document.line_prices(j):
+                    prices[price_key] = price
         
         # Если цены не найдены, ищем в целом тексте
         if not any(prices.values()):
-            # Ищем цены в целом тексте для этого маршрута
-            for pattern in price_patterns:
-                matches = re.finditer(pattern, text, re.IGNORECASE)
-                for match in matches:
-                    try:
-                        if len(match.groups()) == 1:
-                            price_str = match.group(1).replace(',', '.')
-                            price = float(price_str)
-                            
-                            # Определяем валюту по контексту
-                            if 'RMB' in text.upper() or 'CNY' in text.upper():
-                                if not prices["price_cny"]:  # Берем только первое значение
-                                    prices["price_cny"] = price
-                            else:
-                                if not prices["price_usd"]:  # Берем только первое значение
-                                    prices["price_usd"] = price
-                    except ValueError:
-                        continue
+            for price_key, price in document.text_prices():
+                if not prices[price_key]:  # Берем только первое значение
+                    prices[price_key] = price
         
         return prices
     
@@ -412,3 +488,8 @@ def analyze_aviation_file_enhanced(text: str, use_llm: bool = False, llm_api_key
     """Функция-обертка для улучшенного анализа авиационных файлов."""
     analyzer = EnhancedAviationAnalyzer(use_llm, llm_api_key)
     return analyzer.analyze_aviation_file(text)
+
+def fix_ocr_errors_bulk(texts: List[str]) -> List[str]:
+    """Исправляет OCR ошибки в пакете текстов одним скомпилированным паттерном."""
+    substitute = _OCR_FIX_RE.sub
+    return [substitute(_fix_ocr_match, text) for text in texts]
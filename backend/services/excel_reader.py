@@ -0,0 +1,54 @@
+"""
+Общее чтение Excel через python-calamine для модулей извлечения текста и парсинга
+"""
+
+from datetime import date, datetime
+from typing import Any, Optional
+
+import pandas as pd
+
+# python-calamine (Rust) читает Excel в разы быстрее openpyxl/xlrd;
+# если пакет не установлен, используем движки pandas
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+# Движки pandas, которые пробуются после calamine
+EXCEL_ENGINES = ["openpyxl", "xlrd"]
+
+
+def _convert_cell(cell: Any) -> Any:
+    """Значение ячейки calamine в том виде, в каком его отдает pandas/openpyxl."""
+    # Пустые ячейки -> NaN, целые float -> int
+    if cell == "":
+        return float("nan")
+    if isinstance(cell, float) and cell.is_integer():
+        return int(cell)
+    # openpyxl отдает даты как datetime, calamine - как date
+    if type(cell) is date:
+        return datetime.combine(cell, datetime.min.time())
+    return cell
+
+
+def read_excel_calamine(file_path: str, header: Optional[int] = 0) -> pd.DataFrame:
+    """
+    Чтение первого листа книги через python-calamine, как
+    pd.read_excel(file_path, header=header): header=0 - первая строка листа
+    содержит названия колонок, header=None - все строки листа являются данными.
+    """
+    # skip_empty_area=False: лист читается с ячейки A1, пустые строки и
+    # колонки в начале листа сохраняются, как у движков pandas
+    sheet = CalamineWorkbook.from_path(file_path).get_sheet_by_index(0)
+    rows = [[_convert_cell(cell) for cell in row] for row in sheet.to_python(skip_empty_area=False)]
+    if header is None:
+        return pd.DataFrame(rows)
+    if not rows:
+        return pd.DataFrame()
+
+    # Как и pandas, пустые заголовки получают имена "Unnamed: N"
+    columns = [
+        f"Unnamed: {index}" if isinstance(name, float) and name != name else name
+        for index, name in enumerate(rows[header])
+    ]
+    return pd.DataFrame(rows[header + 1:], columns=columns)
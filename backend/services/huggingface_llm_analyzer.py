@@ -10,11 +10,16 @@ from typing import Dict, List, Any, Optional, Union, TYPE_CHECKING
 from datetime import datetime
 import traceback
 
+from services.context_llm_analyzer import extract_json_object
+
 if TYPE_CHECKING:
     from transformers import Pipeline
 
 logger = logging.getLogger(__name__)
 
+# Паттерн для поиска чисел (цен)
+_PRICE_NUMBER_RE = re.compile(r'\b(\d+(?:[.,]\d+)?)\b')
+
 class HuggingFaceLLMAnalyzer:
     """
     Hugging Face LLM анализатор для понимания контекста и структурирования данных
@@ -512,9 +517,8 @@ Return only valid JSON:
         """Парсинг ответа LLM"""
         try:
             # Ищем JSON в ответе
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
+            json_str = extract_json_object(response)
+            if json_str:
                 data = json.loads(json_str)
                 logger.info(f"Hugging Face LLM вернул структурированные данные: {list(data.keys())}")
                 return data
@@ -750,12 +754,15 @@ Return only valid JSON:
     def _extract_prices_from_text(self, text: str) -> List[float]:
         """Извлечение цен из текста"""
         try:
-            import re
-            # Паттерн для поиска чисел (цен)
-            price_pattern = r'\b(\d+(?:[.,]\d+)?)\b'
-            prices = re.findall(price_pattern, text)
-            # Конвертируем в числа и фильтруем разумные значения
-            return [float(p.replace(',', '.')) for p in prices if 10 <= float(p.replace(',', '.')) <= 1000000][:3]
+            prices = []
+            # Конвертируем в числа один раз и останавливаемся на третьей разумной цене
+            for match in _PRICE_NUMBER_RE.finditer(text):
+                price = float(match.group(1).replace(',', '.'))
+                if 10 <= price <= 1000000:
+                    prices.append(price)
+                    if len(prices) == 3:
+                        break
+            return prices
         except:
             return []
 
@@ -248,6 +248,24 @@ class IntelligentParser:
             logger.error(traceback.format_exc())
             return {'error': str(e), 'success': False}
     
+    def parse_text(self, text: str, transport_type: str = 'auto') -> Dict[str, Any]:
+        """
+        Парсинг уже извлеченного текста без OCR
+        """
+        try:
+            parsed_data = self._parse_with_patterns(text, transport_type)
+            validated_data = self._validate_parsed_data(parsed_data)
+            validated_data.update({
+                'parsed_at': datetime.now().isoformat(),
+                'transport_type': transport_type,
+                'success': True
+            })
+            return validated_data
+            
+        except Exception as e:
+            logger.error(f"Ошибка интеллектуального парсинга текста: {e}")
+            return {'error': str(e), 'success': False}
+    
     def _parse_with_patterns(self, text: str, transport_type: str) -> Dict[str, Any]:
         """Парсинг с использованием паттернов"""
         try:
@@ -1,6 +1,6 @@
 from typing import List, Dict, Any
 import logging
-from services.base_parser import BaseParser
+from services.base_parser import BaseParser, detect_transport_type_by_filename
 from services.enhanced_ocr_service import enhanced_ocr_service
 from services.intelligent_parser import intelligent_parser
 # import ollama  # Отключено для стабильной версии
@@ -51,19 +51,7 @@ class LLMTariffParser(BaseParser):
         """
         Определение типа транспорта по имени файла
         """
-        filename = file_path.lower()
-        
-        # Проверяем ключевые слова в имени файла
-        if any(word in filename for word in ['air', 'авиа', 'воздушн']):
-            return 'air'
-        elif any(word in filename for word in ['sea', 'море', 'морск', 'fcl', 'lcl']):
-            return 'sea'
-        elif any(word in filename for word in ['rail', 'жд', 'железнодорожн', 'railway']):
-            return 'rail'
-        elif any(word in filename for word in ['multimodal', 'мульти', 'комбинированн']):
-            return 'multimodal'
-        else:
-            return 'auto'  # По умолчанию
+        return detect_transport_type_by_filename(file_path)
     
     def get_supported_formats(self) -> List[str]:
         """
@@ -5,20 +5,122 @@
 """
 
 import re
+import sys
 import logging
+import threading
+from functools import lru_cache
 from typing import List, Dict, Any, Optional
 from services.base_parser import BaseParser
 from services.adaptive_analyzer import AdaptiveTariffAnalyzer
 
 logger = logging.getLogger(__name__)
 
+# Паттерны для поиска времени в пути (в порядке приоритета). Квантификаторы
+# захватывающие (*+, ++): после цифр и пробелов откатываться некуда, поэтому
+# на длинных строках с числами движок не тратит время на перебор вариантов
+_TRANSIT_PATTERNS = (
+    r'(\d++)\s*+дней?',
+    r'(\d++)\s*+days?',
+    r'(\d++)\s*+суток?',
+    r'(\d++)\s*+дн',
+    r'(\d++)\s*+сут',
+    r'время\s*+в\s*+пути[:\s]*+(\d++)',
+    r'transit\s*+time[:\s]*+(\d++)',
+    r'(\d++)\s*+дней?\s*+в\s*+пути',
+    r'ETA[:\s]*+(\d++)',
+    r'время\s*+доставки[:\s]*+(\d++)',
+    r'total\s*+time[:\s]*+(\d++)',
+    r'общее\s*+время[:\s]*+(\d++)',
+)
+
+# Все паттерны одной альтернацией: текст просматривается один раз, а группа
+# p<N> показывает, какой паттерн сработал (N - его приоритет). Альтернация
+# обернута в lookahead, чтобы совпадение одного паттерна не "съедало" текст,
+# нужный более приоритетному
+_TRANSIT_RE = re.compile(
+    '(?=' + '|'.join(
+        pattern.replace(r'(\d++)', rf'(?P<p{index}>\d++)', 1)
+        for index, pattern in enumerate(_TRANSIT_PATTERNS)
+    ) + ')',
+    re.IGNORECASE
+)
+
+
+def _keywords_re(*keywords: str, flags: int = 0) -> re.Pattern:
+    """Собирает набор ключевых слов в одно регулярное выражение."""
+    return re.compile('|'.join(re.escape(keyword) for keyword in keywords), flags)
+
+
+# Ключевые слова мультимодальности
+_KW_MULTIMODAL = _keywords_re(
+    'мультимодал', 'multimodal', 'комбинирован', 'combined', 'смешанн',
+    'mixed', 'железнодорожн', 'railway', 'морск', 'sea', 'автомобил',
+    'auto', 'контейнер', 'container', 'перевалк', 'transshipment'
+)
+
+# Ключевые слова отдельных видов транспорта
+_KW_TRANSPORT = (
+    _keywords_re('авто', 'auto', 'грузовик', 'truck'),
+    _keywords_re('жд', 'rail', 'train', 'вагон'),
+    _keywords_re('море', 'sea', 'ship', 'порт'),
+    _keywords_re('авиа', 'air', 'flight'),
+)
+
+
+@lru_cache(maxsize=4096)
+def _is_multimodal_description(description: str) -> bool:
+    """
+    Классифицирует описание тарифа по ключевым словам.
+    
+    Строки тарифа из одного блока часто имеют одинаковое описание,
+    поэтому результат кэшируется по самой строке.
+    """
+    description = description.lower()
+    
+    # Проверяем наличие ключевых слов
+    if _KW_MULTIMODAL.search(description):
+        return True
+        
+    # Если найдено более одного типа транспорта, считаем мультимодальным
+    return sum(1 for keywords in _KW_TRANSPORT if keywords.search(description)) > 1
+
+
+# Базис поставки повторяется в каждой строке тарифа: приводим его к одному
+# объекту строки, чтобы тысячи строк не хранили свои копии
+_INTERNED = {
+    value: sys.intern(value)
+    for value in ('EXW', 'FCA', 'FOB', 'CIF', 'CFR', 'DAP', 'DDP')
+}
+
+# Ключевые слова мультимодального транспорта для произвольного текста;
+# регистр учитывается флагом, без копирования текста в нижнем регистре
+_MULTIMODAL_DETECT_RE = _keywords_re(
+    'мультимодал', 'multimodal', 'комбинирован', 'combined', 'смешанн',
+    'mixed', 'перевалк', 'transshipment', 'intermodal', 'интермодал',
+    'контейнер', 'container', 'комплексн', 'comprehensive',
+    flags=re.IGNORECASE
+)
+
 class MultimodalParser(BaseParser):
     """Специализированный парсер для мультимодальных тарифов."""
     
+    # Анализатор создается при первом обращении, по одному на поток: во время
+    # анализа он сохраняет уверенность в своих стратегиях, поэтому общий
+    # экземпляр пришлось бы защищать блокировкой, и разбор файлов в потоках
+    # (ParserFactory.aparse_many) выполнялся бы по очереди
+    _analyzer_local = threading.local()
+    
     def __init__(self):
         super().__init__()
-        self.analyzer = AdaptiveTariffAnalyzer()
         self.transport_type = "multimodal"
+    
+    @classmethod
+    def _get_analyzer(cls) -> AdaptiveTariffAnalyzer:
+        """Возвращает экземпляр адаптивного анализатора текущего потока."""
+        analyzer = getattr(cls._analyzer_local, 'analyzer', None)
+        if analyzer is None:
+            analyzer = cls._analyzer_local.analyzer = AdaptiveTariffAnalyzer()
+        return analyzer
         
     def parse_tariff_data(self, file_path: str, supplier_id: int) -> List[Dict[str, Any]]:
         """
@@ -40,14 +142,14 @@ class MultimodalParser(BaseParser):
             return []
             
         # Анализируем текст с помощью адаптивного анализатора
-        parsed_data = self.analyzer.analyze_tariff_text_adaptive(text)
-        
-        # Фильтруем только мультимодальные данные
-        multimodal_data = self._filter_multimodal_data(parsed_data)
+        parsed_data = self._get_analyzer().analyze_tariff_text_adaptive(text)
         
-        # Преобразуем данные в стандартный формат
+        # Отбираем мультимодальные данные и сразу преобразуем их в стандартный
+        # формат: один проход по строкам без промежуточного списка
         tariffs = []
-        for data in multimodal_data:
+        for data in parsed_data:
+            if not self._is_multimodal_tariff(data):
+                continue
             tariff = self._convert_to_standard_format(data, supplier_id, file_path)
             if tariff and self.validate_parsed_data(tariff):
                 tariffs.append(tariff)
@@ -55,25 +157,6 @@ class MultimodalParser(BaseParser):
         logger.info(f"Извлечено {len(tariffs)} мультимодальных тарифов")
         return tariffs
     
-    def _filter_multimodal_data(self, parsed_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-        """
-        Фильтрует данные, оставляя только мультимодальные тарифы.
-        
-        Args:
-            parsed_data: Список всех распарсенных данных
-            
-        Returns:
-            Список мультимодальных данных
-        """
-        multimodal_data = []
-        
-        for data in parsed_data:
-            # Проверяем, содержит ли данные признаки мультимодальности
-            if self._is_multimodal_tariff(data):
-                multimodal_data.append(data)
-                
-        return multimodal_data
-    
     def _is_multimodal_tariff(self, data: Dict[str, Any]) -> bool:
         """
         Определяет, является ли тариф мультимодальным.
@@ -84,34 +167,12 @@ class MultimodalParser(BaseParser):
         Returns:
             True если тариф мультимодальный
         """
-        description = data.get('description', '').lower()
-        
-        # Ключевые слова мультимодальности
-        multimodal_keywords = [
-            'мультимодал', 'multimodal', 'комбинирован', 'combined', 'смешанн',
-            'mixed', 'железнодорожн', 'railway', 'морск', 'sea', 'автомобил',
-            'auto', 'контейнер', 'container', 'перевалк', 'transshipment'
-        ]
-        
-        # Проверяем наличие ключевых слов
-        if any(keyword in description for keyword in multimodal_keywords):
-            return True
-            
-        # Проверяем наличие нескольких типов транспорта
-        transport_types = []
-        if any(word in description for word in ['авто', 'auto', 'грузовик', 'truck']):
-            transport_types.append('auto')
-        if any(word in description for word in ['жд', 'rail', 'train', 'вагон']):
-            transport_types.append('rail')
-        if any(word in description for word in ['море', 'sea', 'ship', 'порт']):
-            transport_types.append('sea')
-        if any(word in description for word in ['авиа', 'air', 'flight']):
-            transport_types.append('air')
-            
-        # Если найдено более одного типа транспорта, считаем мультимодальным
-        return len(transport_types) > 1
+        description = data.get('description', '')
+        if not description:
+            return False
+        return _is_multimodal_description(description)
     
-    def _convert_to_standard_format(self, data: Dict[str, Any], supplier_id: int, source_file: str) -> Optional[Dict[str, Any]]:
+    def _convert_to_standard_format(self, data: Dict[str, Any], supplier_id: int, source_file: str) -> Dict[str, Any]:
         """
         Преобразует данные анализатора в стандартный формат тарифа.
         
@@ -123,57 +184,57 @@ class MultimodalParser(BaseParser):
         Returns:
             Словарь с данными тарифа в стандартном формате
         """
-        try:
-            # Извлекаем основные данные
-            origin_city = data.get('origin_city', '')
-            destination_city = data.get('destination_city', '')
-            price = data.get('price', 0.0)
-            currency = data.get('currency', 'USD')
-            
-            # Определяем базис (по умолчанию EXW для мультимодальных)
-            basis = data.get('basis', 'EXW')
-            
-            # Извлекаем тип контейнера/услуги
-            vehicle_type = data.get('vehicle_type', '')
-            if not vehicle_type:
-                # Пытаемся определить по контексту
-                if any(keyword in data.get('description', '').lower() for keyword in ['20', '40', 'контейнер']):
-                    vehicle_type = '20DC' if '20' in data.get('description', '') else '40HC'
-                else:
-                    vehicle_type = 'multimodal'
-            
-            # Извлекаем время в пути
-            transit_time = self.extract_transit_time(data.get('description', ''))
-            
-            # Создаем стандартный тариф
-            tariff = {
-                'supplier_id': supplier_id,
-                'transport_type': self.transport_type,
-                'basis': basis,
-                'origin_city': origin_city,
-                'destination_city': destination_city,
-                'vehicle_type': vehicle_type,
-                'price_usd': price if currency.upper() == 'USD' else None,
-                'price_rub': price if currency.upper() == 'RUB' else None,
-                'transit_time_days': transit_time,
-                'source_file': source_file,
-                # Специфичные для мультимодальных поля
-                'transit_port': data.get('transit_port', ''),
-                'departure_station': data.get('departure_station', ''),
-                'arrival_station': data.get('arrival_station', ''),
-                'rail_tariff_rub': data.get('rail_tariff_rub'),
-                'cbx_cost': data.get('cbx_cost'),
-                'terminal_handling_cost': data.get('terminal_handling_cost'),
-                'auto_pickup_cost': data.get('auto_pickup_cost'),
-                'security_cost': data.get('security_cost'),
-                'precarriage_cost': data.get('precarriage_cost')
-            }
-            
-            return tariff
-            
-        except Exception as e:
-            logger.error(f"Ошибка преобразования данных мультимодального тарифа: {e}")
-            return None
+        # Извлекаем основные данные
+        origin_city = data.get('origin_city', '')
+        destination_city = data.get('destination_city', '')
+        price = data.get('price', 0.0)
+        currency = (data.get('currency') or 'USD').upper()
+        
+        # Определяем базис (по умолчанию EXW для мультимодальных)
+        basis = data.get('basis', 'EXW')
+        basis = _INTERNED.get(basis, basis)
+        
+        description = data.get('description') or ''
+        
+        # Извлекаем тип контейнера/услуги
+        vehicle_type = data.get('vehicle_type', '')
+        if not vehicle_type:
+            # Пытаемся определить по контексту
+            if '20' in description:
+                vehicle_type = '20DC'
+            elif '40' in description or 'контейнер' in description.lower():
+                vehicle_type = '40HC'
+            else:
+                vehicle_type = 'multimodal'
+        
+        # Извлекаем время в пути
+        transit_time = self.extract_transit_time(description)
+        
+        # Создаем стандартный тариф
+        tariff = {
+            'supplier_id': supplier_id,
+            'transport_type': self.transport_type,
+            'basis': basis,
+            'origin_city': origin_city,
+            'destination_city': destination_city,
+            'vehicle_type': vehicle_type,
+            'price_usd': price if currency == 'USD' else None,
+            'price_rub': price if currency == 'RUB' else None,
+            'transit_time_days': transit_time,
+            'source_file': source_file,
+            # Специфичные для мультимодальных поля
+            'transit_port': data.get('transit_port', ''),
+            'departure_station': data.get('departure_station', ''),
+            'arrival_station': data.get('arrival_station', ''),
+            'rail_tariff_rub': data.get('rail_tariff_rub'),
+            'cbx_cost': data.get('cbx_cost'),
+            'terminal_handling_cost': data.get('terminal_handling_cost'),
+            'auto_pickup_cost': data.get('auto_pickup_cost'),
+            'security_cost': data.get('security_cost'),
+            'precarriage_cost': data.get('precarriage_cost')
+        }
+        
+        return tariff
     
     def extract_transit_time(self, text: str) -> Optional[int]:
         """
@@ -188,31 +249,18 @@ class MultimodalParser(BaseParser):
         if not text:
             return None
             
-        # Паттерны для поиска времени в пути
-        patterns = [
-            r'(\d+)\s*дней?',
-            r'(\d+)\s*days?',
-            r'(\d+)\s*суток?',
-            r'(\d+)\s*дн',
-            r'(\d+)\s*сут',
-            r'время\s*в\s*пути[:\s]*(\d+)',
-            r'transit\s*time[:\s]*(\d+)',
-            r'(\d+)\s*дней?\s*в\s*пути',
-            r'ETA[:\s]*(\d+)',
-            r'время\s*доставки[:\s]*(\d+)',
-            r'total\s*time[:\s]*(\d+)',
-            r'общее\s*время[:\s]*(\d+)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                try:
-                    return int(match.group(1))
-                except (ValueError, IndexError):
-                    continue
-                    
-        return None
+        # Из всех совпадений берем первое у паттерна с наивысшим приоритетом
+        best_priority, best_match = len(_TRANSIT_PATTERNS), None
+        for match in _TRANSIT_RE.finditer(text):
+            priority = int(match.lastgroup[1:])
+            if priority < best_priority:
+                best_priority, best_match = priority, match
+                if priority == 0:
+                    break
+        
+        if best_match is None:
+            return None
+        return int(best_match.group(best_match.lastgroup))
     
     def detect_multimodal_keywords(self, text: str) -> bool:
         """
@@ -224,12 +272,5 @@ class MultimodalParser(BaseParser):
         Returns:
             True если текст содержит мультимодальные ключевые слова
         """
-        multimodal_keywords = [
-            'мультимодал', 'multimodal', 'комбинирован', 'combined', 'смешанн',
-            'mixed', 'перевалк', 'transshipment', 'intermodal', 'интермодал',
-            'контейнер', 'container', 'комплексн', 'comprehensive'
-        ]
-        
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in multimodal_keywords)
+        return _MULTIMODAL_DETECT_RE.search(text) is not None
 
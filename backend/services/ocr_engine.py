@@ -0,0 +1,46 @@
+"""
+Общий движок OCR (rus+eng) для модулей извлечения текста и парсинга
+"""
+
+import re
+import threading
+
+from PIL import Image
+import pytesseract
+
+# tesserocr вызывает Tesseract внутри процесса: языковые модели загружаются
+# один раз, а не при каждом запуске CLI через pytesseract
+try:
+    from tesserocr import PyTessBaseAPI, PSM
+except ImportError:
+    PyTessBaseAPI = None
+
+# Минимум значимых символов, при котором результат OCR считается достаточным
+OCR_MIN_CHARS = 20
+
+# Общий на процесс экземпляр tesserocr (создается при первом OCR);
+# API не потокобезопасен, поэтому вызовы выполняются под блокировкой
+_TESS_API = None
+_TESS_LOCK = threading.Lock()
+_PSM_RE = re.compile(r"--psm\s+(\d+)")
+
+
+def image_to_string(image: Image.Image, config: str = "") -> str:
+    """
+    Распознавание изображения (rus+eng). Через tesserocr, если он установлен,
+    иначе через pytesseract. Для tesserocr из config учитывается только --psm
+    (без него - автоматическая сегментация): движок (--oem) выбирается
+    при создании экземпляра.
+    """
+    if PyTessBaseAPI is None:
+        return pytesseract.image_to_string(image, lang="rus+eng", config=config)
+
+    global _TESS_API
+    psm_match = _PSM_RE.search(config)
+    with _TESS_LOCK:
+        if _TESS_API is None:
+            _TESS_API = PyTessBaseAPI(lang="rus+eng")
+        _TESS_API.SetPageSegMode(int(psm_match.group(1)) if psm_match else PSM.AUTO)
+        # SetImage сбрасывает результат предыдущего распознавания
+        _TESS_API.SetImage(image)
+        return _TESS_API.GetUTF8Text()
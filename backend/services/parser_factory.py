@@ -1,4 +1,11 @@
-from typing import Dict, Type
+import asyncio
+import codecs
+import mmap
+import os
+import re
+import threading
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional, Type
 from services.base_parser import BaseParser
 from services.auto_parser import AutoParser
 from services.railway_parser import RailwayParser
@@ -7,6 +14,128 @@ from services.air_parser import AirParser
 from services.multimodal_parser import MultimodalParser
 from services.llm_parser import LLMTariffParser
 
+# Сколько файлов пакета разбирается одновременно в aparse_many
+PARSE_CONCURRENCY = int(os.getenv("PARSE_CONCURRENCY", "4"))
+
+# Aho-Corasick находит все ключевые слова за один проход по тексту;
+# если pyahocorasick не установлен, используем регулярные выражения
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Ключевые слова для определения типа транспорта
+TRANSPORT_INDICATORS = {
+    'auto': (
+        'автомобиль', 'авто', 'машина', 'грузовик', 'фура',
+        'ftl', 'ltl', 'дверь-дверь', 'дверь до двери',
+        'автовывоз', 'автодоставка', 'автоперевозка'
+    ),
+    'rail': (
+        'железнодорожный', 'жд', 'вагон', 'контейнер',
+        'железная дорога', 'жд перевозка', 'ж/д',
+        'контейнерный вагон', 'платформа', 'крытый вагон'
+    ),
+    'sea': (
+        'морской', 'море', 'судно', 'корабль', 'контейнеровоз',
+        'fcl', 'lcl', 'bulk', 'порт', 'причал', 'доки',
+        'коносамент', 'фрахт', 'демередж'
+    ),
+    'air': (
+        'авиа', 'самолет', 'воздушный', 'аэропорт',
+        'авианакладная', 'авиаперевозка', 'авиадоставка',
+        'express', 'charter', 'cargo'
+    ),
+    'multimodal': (
+        'мультимодальный', 'мульти', 'комбинированный',
+        'перегрузка', 'трансшипмент', 'интермодальный'
+    )
+}
+
+if ahocorasick is not None:
+    _INDICATOR_AUTOMATON = ahocorasick.Automaton()
+    for _transport_type, _indicators in TRANSPORT_INDICATORS.items():
+        for _indicator in _indicators:
+            _INDICATOR_AUTOMATON.add_word(_indicator, (_transport_type, _indicator))
+    _INDICATOR_AUTOMATON.make_automaton()
+else:
+    _INDICATOR_AUTOMATON = None
+
+# Без pyahocorasick поиск идет по UTF-8 байтам: побайтовое сравнение быстрее,
+# чем сравнение строк с кириллицей, а совпадения те же самые
+_INDICATOR_BYTES = {
+    transport_type: tuple(indicator.encode('utf-8') for indicator in indicators)
+    for transport_type, indicators in TRANSPORT_INDICATORS.items()
+}
+
+# Одно выражение на тип: если оно не нашло ни одного слова, тип пропускается
+# без проверки каждого ключевого слова по отдельности
+_INDICATOR_PATTERNS = {
+    transport_type: re.compile(b'|'.join(re.escape(indicator) for indicator in indicators))
+    for transport_type, indicators in _INDICATOR_BYTES.items()
+}
+
+# Текст просматривается фрагментами; соседние фрагменты перекрываются,
+# чтобы не потерять ключевое слово на их границе
+_SCAN_CHUNK_SIZE = 64 * 1024
+_SCAN_OVERLAP = max(len(indicator) for indicators in TRANSPORT_INDICATORS.values() for indicator in indicators) - 1
+
+# Большие текстовые файлы просматриваются через mmap, без загрузки целиком
+_MMAP_EXTENSIONS = ('.csv', '.txt')
+_MMAP_MIN_SIZE = 256 * 1024
+
+
+def _find_indicators(chunk_lower: str, found: set) -> None:
+    """Добавляет в found пары (тип транспорта, ключевое слово), найденные во фрагменте."""
+    if _INDICATOR_AUTOMATON is not None:
+        found.update(value for _, value in _INDICATOR_AUTOMATON.iter(chunk_lower))
+        return
+    
+    chunk_bytes = chunk_lower.encode('utf-8', 'surrogatepass')
+    for transport_type, indicators in TRANSPORT_INDICATORS.items():
+        if _INDICATOR_PATTERNS[transport_type].search(chunk_bytes):
+            found.update(
+                (transport_type, indicator)
+                for indicator, indicator_bytes in zip(indicators, _INDICATOR_BYTES[transport_type])
+                if indicator_bytes in chunk_bytes
+            )
+
+
+def _iter_text_chunks(content: str) -> Iterator[str]:
+    """Делит текст на фрагменты по _SCAN_CHUNK_SIZE символов."""
+    for start in range(0, len(content), _SCAN_CHUNK_SIZE):
+        yield content[start:start + _SCAN_CHUNK_SIZE]
+
+
+def _iter_file_chunks(file_path: str) -> Iterator[str]:
+    """Читает текстовый файл фрагментами через mmap, декодируя UTF-8 по ходу чтения."""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        for start in range(0, len(mapped), _SCAN_CHUNK_SIZE):
+            yield decoder.decode(mapped[start:start + _SCAN_CHUNK_SIZE])
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _score_transport_indicators(chunks: Iterable[str]) -> Dict[str, int]:
+    """
+    Считает число различных ключевых слов каждого типа транспорта в тексте,
+    переданном фрагментами. Текст просматривается целиком.
+    """
+    found = set()
+    tail = ''
+    
+    for chunk in chunks:
+        text = tail + chunk
+        _find_indicators(text.lower(), found)
+        tail = text[-_SCAN_OVERLAP:]
+    
+    scores = dict.fromkeys(TRANSPORT_INDICATORS, 0)
+    for transport_type, _ in found:
+        scores[transport_type] += 1
+    return scores
+
 class ParserFactory:
     """
     Фабрика для создания специализированных парсеров
@@ -21,16 +150,31 @@ class ParserFactory:
         'llm': LLMTariffParser,  # LLM парсер для универсальной обработки
     }
     
+    # Созданные парсеры: между вызовами они не хранят состояния, поэтому
+    # анализаторы и паттерны инициализируются один раз на тип транспорта
+    _instances: Dict[str, BaseParser] = {}
+    _instances_lock = threading.Lock()
+    
     @classmethod
     def get_parser(cls, transport_type: str) -> BaseParser:
         """
         Получение парсера для указанного типа транспорта
         """
-        parser_class = cls._parsers.get(transport_type.lower())
+        key = transport_type.lower()
+        parser = cls._instances.get(key)
+        if parser is not None:
+            return parser
+        
+        parser_class = cls._parsers.get(key)
         if not parser_class:
             raise ValueError(f"Парсер для типа транспорта '{transport_type}' не найден")
         
-        return parser_class()
+        with cls._instances_lock:
+            parser = cls._instances.get(key)
+            if parser is None:
+                parser = parser_class()
+                cls._instances[key] = parser
+        return parser
     
     @classmethod
     def get_available_transport_types(cls) -> list:
@@ -44,61 +188,38 @@ class ParserFactory:
         """
         Автоматическое определение типа транспорта по содержимому файла
         """
-        if not content:
+        if content:
+            chunks = _iter_text_chunks(content)
+        elif (file_path.lower().endswith(_MMAP_EXTENSIONS)
+              and os.path.isfile(file_path)
+              and os.path.getsize(file_path) >= _MMAP_MIN_SIZE):
+            # Большой текстовый файл просматриваем прямо с диска
+            chunks = _iter_file_chunks(file_path)
+        else:
             # Если контент не передан, пытаемся извлечь из файла
             try:
                 from parsers import extract_text_from_file
                 content = extract_text_from_file(file_path)
             except Exception:
                 return 'auto'  # По умолчанию
-        
-        if not content:
-            return 'auto'
-        
-        content_lower = content.lower()
-        
-        # Определяем тип транспорта по ключевым словам
-        transport_indicators = {
-            'auto': [
-                'автомобиль', 'авто', 'машина', 'грузовик', 'фура',
-                'ftl', 'ltl', 'дверь-дверь', 'дверь до двери',
-                'автовывоз', 'автодоставка', 'автоперевозка'
-            ],
-            'rail': [
-                'железнодорожный', 'жд', 'вагон', 'контейнер',
-                'железная дорога', 'жд перевозка', 'ж/д',
-                'контейнерный вагон', 'платформа', 'крытый вагон'
-            ],
-            'sea': [
-                'морской', 'море', 'судно', 'корабль', 'контейнеровоз',
-                'fcl', 'lcl', 'bulk', 'порт', 'причал', 'доки',
-                'коносамент', 'фрахт', 'демередж'
-            ],
-            'air': [
-                'авиа', 'самолет', 'воздушный', 'аэропорт',
-                'авианакладная', 'авиаперевозка', 'авиадоставка',
-                'express', 'charter', 'cargo'
-            ],
-            'multimodal': [
-                'мультимодальный', 'мульти', 'комбинированный',
-                'перегрузка', 'трансшипмент', 'интермодальный'
-            ]
-        }
+            
+            if not content:
+                return 'auto'
+            chunks = _iter_text_chunks(content)
         
         # Подсчитываем совпадения для каждого типа
-        scores = {}
-        for transport_type, indicators in transport_indicators.items():
-            score = sum(1 for indicator in indicators if indicator in content_lower)
-            scores[transport_type] = score
-        
-        # Возвращаем тип с наибольшим количеством совпадений
-        if scores:
-            best_type = max(scores, key=scores.get)
-            if scores[best_type] > 0:
-                return best_type
+        try:
+            scores = _score_transport_indicators(chunks)
+        except (OSError, ValueError):
+            return 'auto'
         
-        # Если не удалось определить, возвращаем авто по умолчанию
-        return 'auto'
+        # Возвращаем тип с наибольшим количеством совпадений; если совпадений
+        # нет, возвращаем авто по умолчанию
+        best_type, best_score = 'auto', 0
+        for transport_type, score in scores.items():
+            if score > best_score:
+                best_type, best_score = transport_type, score
+        return best_type
     
     @classmethod
     def parse_with_auto_detection(cls, file_path: str, supplier_id: int) -> list:
@@ -114,9 +235,43 @@ class ParserFactory:
         # Парсим данные
         return parser.parse_tariff_data(file_path, supplier_id)
     
+    @classmethod
+    def parse_many(cls, file_paths: List[str], supplier_id: int, workers: Optional[int] = None) -> list:
+        """
+        Парсинг нескольких файлов параллельно в отдельных процессах
+        
+        Делегирует parsers.parse_tariff_files (общий пул процессов и кэш
+        разбора) и объединяет записи файлов в один список в порядке
+        входных файлов.
+        """
+        from services.parsers import parse_tariff_files
+        return list(chain.from_iterable(parse_tariff_files(file_paths, supplier_id, workers)))
+    
+    @classmethod
+    async def aparse_many(cls, file_paths: List[str], supplier_id: int) -> list:
+        """
+        Асинхронный парсинг пакета файлов
+        
+        Каждый файл разбирается в отдельном потоке, так что чтение и
+        извлечение текста одного файла перекрываются с разбором другого,
+        а event loop не блокируется. Одновременно обрабатывается не более
+        PARSE_CONCURRENCY файлов.
+        """
+        semaphore = asyncio.Semaphore(PARSE_CONCURRENCY)
+        
+        async def parse_one(file_path: str) -> list:
+            async with semaphore:
+                return await asyncio.to_thread(cls.parse_with_auto_detection, file_path, supplier_id)
+        
+        results = await asyncio.gather(*(parse_one(file_path) for file_path in file_paths))
+        return list(chain.from_iterable(results))
+    
     @classmethod
     def register_parser(cls, transport_type: str, parser_class: Type[BaseParser]):
         """
         Регистрация нового парсера
         """
-        cls._parsers[transport_type.lower()] = parser_class
+        key = transport_type.lower()
+        with cls._instances_lock:
+            cls._parsers[key] = parser_class
+            cls._instances.pop(key, None)
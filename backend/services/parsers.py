@@ -3,17 +3,88 @@ import os
 import re
 import logging
 from datetime import datetime
+from functools import lru_cache, partial
+from itertools import chain
+import hashlib
+import json
 import traceback
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
 import pdfplumber
-from PIL import Image
+from PIL import Image, ImageOps
 import pytesseract
 from docx import Document
+from lxml import etree
 import io
 
 logger = logging.getLogger(__name__)
 
+# Excel читается общим с text_extractor способом: calamine, если установлен
+from services.excel_reader import CalamineWorkbook, EXCEL_ENGINES as _EXCEL_ENGINES, read_excel_calamine
+
+# OCR через общий с text_extractor движок (tesserocr или pytesseract)
+from services.ocr_engine import OCR_MIN_CHARS as _OCR_MIN_CHARS, PyTessBaseAPI, image_to_string as _image_to_string
+
+# PyMuPDF (MuPDF, C) извлекает текстовый слой PDF и рендерит страницы для OCR
+# на порядок быстрее pdfplumber; таблицы по-прежнему ищет pdfplumber
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz  # PyMuPDF < 1.24.3
+    except ImportError:
+        fitz = None
+
+# pyarrow ускоряет чтение CSV, если установлен
+try:
+    import pyarrow  # noqa: F401
+    _CSV_ENGINES = ["pyarrow", "c"]
+except ImportError:
+    _CSV_ENGINES = ["c"]
+
+
+# Кэш результатов разбора по содержимому файла: один и тот же тариф часто
+# загружают повторно. PARSE_CACHE=0 отключает кэш
+PARSE_CACHE_ENABLED = os.getenv("PARSE_CACHE", "1") != "0"
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", os.path.abspath(os.path.join(BASE_DIR, "data", "parse_cache")))
+# Наибольшее число записей в кэше; при превышении удаляются давно не
+# использованные записи
+PARSE_CACHE_MAX_ENTRIES = int(os.getenv("PARSE_CACHE_MAX_ENTRIES", "2000"))
+# Версия формата кэша: увеличивается при изменении логики разбора
+_PARSE_CACHE_VERSION = "1"
+# Размер блока при хешировании содержимого файла
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+# Пакетный разбор файлов (parse_tariff_files): число процессов общего пула
+PARSE_FILE_WORKERS = int(os.getenv("PARSE_FILE_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+# Общий пул процессов для пакетного разбора; создается при первом обращении,
+# чтобы не запускать процессы заново для каждого пакета
+_FILE_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_FILE_EXECUTOR_LOCK = threading.Lock()
+
+# Признак процесса пакетного разбора: файлы уже распределены по процессам,
+# поэтому страницы PDF внутри такого процесса обрабатываются последовательно
+_IN_BATCH_WORKER = False
+
+# OCR изображений: сначала одна конфигурация с автоматической сегментацией,
+# остальные пробуются, только если распознано слишком мало текста
+_OCR_PRIMARY_CONFIG = '--oem 3 --psm 3'
+
+# Предобработка перед OCR: крупные изображения уменьшаются до _OCR_MAX_SIDE,
+# затем переводятся в ч/б по порогу _OCR_THRESHOLD
+_OCR_MAX_SIDE = 2000
+_OCR_THRESHOLD = 128
+_OCR_BINARIZE_TABLE = [255 if value > _OCR_THRESHOLD else 0 for value in range(256)]
+# Разрешение рендеринга страниц PDF для OCR
+_PDF_OCR_DPI = 200
+
 # Настройка OCR (опционально). Оставьте как есть, если путь отличается в вашей системе.
 try:
     # Попробуем несколько возможных путей к Tesseract
@@ -35,13 +106,107 @@ except Exception as e:
     logger.error(f"Ошибка настройки Tesseract: {e}")
 
 
-def parse_tariff_file(file_path: str, supplier_id: int) -> List[Dict[str, Any]]:
+def _file_fingerprint(file_path: str) -> str:
+    """
+    Хеш всего содержимого файла для ключа кэша: правка в середине файла
+    того же размера должна давать новый ключ. Хеширование намного дешевле
+    самого разбора.
+    """
+    digest = hashlib.sha256(f"{_PARSE_CACHE_VERSION}:{os.path.splitext(file_path)[1].lower()}".encode())
+    with open(file_path, "rb") as file:
+        for block in iter(partial(file.read, _HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(kind: str, key: str) -> str:
+    return os.path.join(PARSE_CACHE_DIR, f"{kind}_{key}.json")
+
+
+def _cache_load(kind: str, key: str) -> Any:
+    """Читает результат из кэша; None, если записи нет или она повреждена."""
+    path = _cache_path(kind, key)
+    try:
+        with open(path, "r", encoding="utf-8") as cache_file:
+            value = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    try:
+        # Время изменения отмечает последнее использование записи
+        os.utime(path)
+    except OSError:
+        pass
+    return value
+
+
+def _cache_prune() -> None:
+    """Удаляет давно не использованные записи сверх PARSE_CACHE_MAX_ENTRIES."""
+    try:
+        with os.scandir(PARSE_CACHE_DIR) as entries:
+            cache_files = [
+                (entry.stat().st_mtime, entry.path)
+                for entry in entries
+                if entry.is_file() and entry.name.endswith(".json")
+            ]
+    except OSError:
+        return
+    excess = len(cache_files) - PARSE_CACHE_MAX_ENTRIES
+    if excess <= 0:
+        return
+    cache_files.sort()
+    for _, path in cache_files[:excess]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _cache_store(kind: str, key: str, value: Any) -> None:
+    """Сохраняет результат в кэш (атомарно, через временный файл)."""
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        path = _cache_path(kind, key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as cache_file:
+            json.dump(value, cache_file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        _cache_prune()
+    except (OSError, TypeError, ValueError) as e:
+        # Например, в результате есть значения, не сериализуемые в JSON
+        logger.debug(f"Не удалось сохранить результат в кэш: {e}")
+
+
+def _cache_key(file_path: str, *extra: Any) -> Optional[str]:
+    """Ключ кэша для файла или None, если кэш отключен или файл недоступен."""
+    if not PARSE_CACHE_ENABLED:
+        return None
+    try:
+        fingerprint = _file_fingerprint(file_path)
+    except OSError:
+        return None
+    return "_".join([fingerprint] + [str(part) for part in extra])
+
+
+def parse_tariff_file(file_path: str, supplier_id: int, use_cache: bool = True) -> List[Dict[str, Any]]:
     """
     Парсинг файлов тарифов с автоматическим определением типа транспорта.
     Поддерживает: XLS, XLSX, CSV, DOCX, PDF (текст), PDF (скан), JPG, PNG.
+    Результат кэшируется по содержимому файла (use_cache=False - без кэша).
     """
     logger.info(f"Начинаем парсинг файла: {file_path}")
     
+    cache_key = _cache_key(file_path, supplier_id) if use_cache else None
+    if cache_key:
+        cached = _cache_load("rows", cache_key)
+        if cached is not None:
+            logger.info(f"Результат парсинга взят из кэша: {len(cached)} записей")
+            # Ключ кэша не зависит от имени файла: записи должны ссылаться
+            # на текущую загрузку, а не на ту, с которой они были сохранены
+            for row in cached:
+                if isinstance(row, dict) and "source_file" in row:
+                    row["source_file"] = file_path
+            return cached
+    
     try:
         # Используем фабрику парсеров для автоматического определения типа транспорта
         from parser_factory import ParserFactory
@@ -50,6 +215,8 @@ def parse_tariff_file(file_path: str, supplier_id: int) -> List[Dict[str, Any]]:
         result = ParserFactory.parse_with_auto_detection(file_path, supplier_id)
         
         logger.info(f"Парсинг завершен. Извлечено {len(result)} записей")
+        if cache_key and result:
+            _cache_store("rows", cache_key, result)
         return result
         
     except Exception as e:
@@ -58,11 +225,60 @@ def parse_tariff_file(file_path: str, supplier_id: int) -> List[Dict[str, Any]]:
         return []
 
 
-def extract_text_from_file(file_path: str) -> str:
+def _init_batch_worker() -> None:
+    """Инициализатор процессов пакетного разбора."""
+    global _IN_BATCH_WORKER
+    _IN_BATCH_WORKER = True
+
+
+def _get_file_executor() -> ProcessPoolExecutor:
+    """Возвращает общий пул процессов для пакетного разбора файлов."""
+    global _FILE_EXECUTOR
+    if _FILE_EXECUTOR is None:
+        with _FILE_EXECUTOR_LOCK:
+            if _FILE_EXECUTOR is None:
+                _FILE_EXECUTOR = ProcessPoolExecutor(max_workers=PARSE_FILE_WORKERS, initializer=_init_batch_worker)
+    return _FILE_EXECUTOR
+
+
+def parse_tariff_files(file_paths: List[str], supplier_id: int, workers: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Парсинг пакета файлов тарифов в отдельных процессах.
+    Возвращает записи каждого файла в порядке входных путей. Без workers
+    используется общий пул из PARSE_FILE_WORKERS процессов.
+    """
+    if not file_paths:
+        return []
+    if len(file_paths) == 1:
+        return [parse_tariff_file(file_paths[0], supplier_id)]
+    
+    worker = partial(parse_tariff_file, supplier_id=supplier_id)
+    if workers is not None:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker) as executor:
+            return list(executor.map(worker, file_paths, chunksize=1))
+    return list(_get_file_executor().map(worker, file_paths, chunksize=1))
+
+
+def extract_text_from_file(file_path: str, use_cache: bool = True) -> str:
     """
     Универсальная функция для извлечения текста из файлов различных форматов.
     Возвращает извлеченный текст в виде строки.
+    Результат кэшируется по содержимому файла (use_cache=False - без кэша).
     """
+    cache_key = _cache_key(file_path) if use_cache else None
+    if cache_key:
+        cached = _cache_load("text", cache_key)
+        if isinstance(cached, str):
+            return cached
+    
+    text = _extract_text_by_type(file_path)
+    if cache_key and text:
+        _cache_store("text", cache_key, text)
+    return text
+
+
+def _extract_text_by_type(file_path: str) -> str:
+    """Извлечение текста в зависимости от расширения файла."""
     ext = os.path.splitext(file_path)[1].lower()
     
     try:
@@ -82,88 +298,345 @@ def extract_text_from_file(file_path: str) -> str:
         return ""
 
 
-def _extract_text_from_excel(file_path: str) -> str:
-    """Извлечение текста из Excel/CSV файлов."""
-    try:
-        logger.info(f"Извлекаем текст из Excel файла: {file_path}")
-        
-        # Пробуем разные движки для чтения Excel
-        df = None
-        engines = ["openpyxl", "xlrd"]
-        
+def _read_table_file(file_path: str) -> Optional[pd.DataFrame]:
+    """
+    Чтение Excel/CSV файла в DataFrame.
+    Порядок движков: calamine (если установлен), openpyxl, xlrd, затем CSV.
+    """
+    is_csv = file_path.lower().endswith(".csv")
+    
+    if not is_csv:
+        engines = (["calamine"] if CalamineWorkbook is not None else []) + _EXCEL_ENGINES
         for engine in engines:
             try:
-                df = pd.read_excel(file_path, engine=engine)
+                logger.info(f"Пробуем движок: {engine}")
+                if engine == "calamine":
+                    df = read_excel_calamine(file_path)
+                else:
+                    df = pd.read_excel(file_path, engine=engine)
                 logger.info(f"Успешно прочитан файл с движком {engine}")
-                break
+                return df
             except Exception as e:
                 logger.warning(f"Ошибка с движком {engine}: {e}")
                 continue
+    
+    # Если Excel не удался, пробуем CSV
+    for engine in _CSV_ENGINES:
+        try:
+            df = pd.read_csv(file_path, engine=engine)
+            logger.info("Успешно прочитан как CSV")
+            return df
+        except Exception as e:
+            logger.error(f"Ошибка чтения CSV ({engine}): {e}")
+    
+    return None
+
+
+def _extract_text_from_excel(file_path: str) -> str:
+    """Извлечение текста из Excel/CSV файлов."""
+    try:
+        logger.info(f"Извлекаем текст из Excel файла: {file_path}")
         
-        # Если Excel не удался, пробуем CSV
-        if df is None:
-            try:
-                df = pd.read_csv(file_path)
-                logger.info("Успешно прочитан как CSV")
-            except Exception as e:
-                logger.error(f"Ошибка чтения CSV: {e}")
-                return ""
-        
+        df = _read_table_file(file_path)
         if df is None or df.empty:
             return ""
         
-        # Конвертируем DataFrame в текст
-        text_lines = []
-        
-        # Добавляем заголовки
-        headers = [str(col) for col in df.columns]
-        text_lines.append(" | ".join(headers))
-        
-        # Добавляем данные
-        for _, row in df.iterrows():
-            row_text = " | ".join([str(val) if pd.notna(val) else "" for val in row])
-            text_lines.append(row_text)
-        
-        return "\n".join(text_lines)
+        # Конвертируем DataFrame в текст: пропуски заменяем и приводим к строкам
+        # сразу по колонкам, а текст собираем одним join без промежуточного
+        # списка строк. df.to_csv здесь не подходит: он экранирует значения
+        # с разделителем и иначе форматирует даты
+        headers = " | ".join(str(col) for col in df.columns)
+        values = df.astype(object).where(df.notna(), "").astype(str).values.tolist()
+        return "\n".join(chain((headers,), map(" | ".join, values)))
         
     except Exception as e:
         logger.error(f"Ошибка извлечения текста из Excel: {e}")
         return ""
 
 
-def _extract_text_from_pdf(file_path: str) -> str:
-    """Извлечение текста из PDF файлов."""
-    text_lines = []
+def _pdf_page_count(file_path: str) -> int:
+    """Количество страниц PDF."""
+    if fitz is not None:
+        with fitz.open(file_path) as doc:
+            return doc.page_count
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def _pdf_workers(page_count: int) -> int:
+    """Число параллельных обработчиков страниц PDF (1 - без параллелизма)."""
+    if _IN_BATCH_WORKER:
+        return 1
+    return max(1, min(os.cpu_count() or 1, page_count))
+
+
+def _ocr_available() -> bool:
+    """Проверяет, доступен ли Tesseract (через tesserocr или CLI)."""
+    if PyTessBaseAPI is not None:
+        return True
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception as e:
+        logger.error(f"Tesseract недоступен: {e}")
+        return False
+
+
+def _preprocess_for_ocr(image: Image.Image) -> Image.Image:
+    """
+    Подготовка изображения к OCR: оттенки серого, уменьшение слишком крупных
+    изображений, автоконтраст и бинаризация. Tesseract получает одноканальное
+    ч/б изображение и пропускает собственную бинаризацию.
+    """
+    image = image.convert("L")
+    if max(image.size) > _OCR_MAX_SIDE:
+        image.thumbnail((_OCR_MAX_SIDE, _OCR_MAX_SIDE))
+    image = ImageOps.autocontrast(image)
+    return image.point(_OCR_BINARIZE_TABLE, mode="1")
+
+
+def _ocr_batch(images: List[Image.Image]) -> List[str]:
+    """
+    OCR нескольких изображений одним запуском tesseract.
+    Изображения сохраняются во временную папку, а tesseract получает файл со
+    списком путей: языковые модели загружаются один раз на весь пакет.
+    В выводе tesseract страницы разделены символом \\f.
+    """
+    if not images:
+        return []
+    if len(images) == 1 or PyTessBaseAPI is not None:
+        # tesserocr не запускает процессов - пакет ему не нужен
+        return [_image_to_string(image) for image in images]
     
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_paths = []
+        for idx, image in enumerate(images):
+            image_path = os.path.join(tmp_dir, f"page_{idx}.png")
+            image.save(image_path)
+            image_paths.append(image_path)
+        
+        list_path = os.path.join(tmp_dir, "images.txt")
+        with open(list_path, "w", encoding="utf-8") as list_file:
+            list_file.write("\n".join(image_paths))
+        
+        output = pytesseract.image_to_string(list_path, lang="rus+eng")
+    
+    texts = output.split("\f")
+    if len(texts) < len(images):
+        # Не удалось сопоставить вывод со страницами - распознаем по одной
+        logger.warning("Пакетный OCR вернул меньше страниц, чем ожидалось; распознаем по одной")
+        return [_image_to_string(image) for image in images]
+    return texts[:len(images)]
+
+
+def _render_pdf_page(page) -> Image.Image:
+    """Рендеринг страницы PyMuPDF в изображение PIL (оттенки серого)."""
+    pixmap = page.get_pixmap(dpi=_PDF_OCR_DPI, colorspace=fitz.csGRAY, alpha=False)
+    return Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def _render_pdfplumber_page(page) -> Image.Image:
+    """
+    Рендеринг страницы pdfplumber в изображение PIL. Новые версии pdfplumber
+    уже хранят растр как изображение PIL - оно используется без копирования.
+    """
+    original = page.to_image(resolution=_PDF_OCR_DPI).original
+    if isinstance(original, Image.Image):
+        return original
+    return Image.fromarray(original)
+
+
+def _pdf_cache_key(file_path: str) -> Tuple[str, int, int]:
+    """
+    Ключ кэшей PDF: абсолютный путь, время изменения и размер файла.
+    Измененный файл получает новый ключ и разбирается заново.
+    """
+    stat = os.stat(file_path)
+    return os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size
+
+
+def _ocr_pdf_pages(file_path: str, page_nums: List[int]) -> Dict[int, str]:
+    """
+    OCR отсканированных страниц PDF одним пакетом. Возвращает {номер страницы: текст}.
+    Результат кэшируется: извлечение текста и парсинг одного и того же файла
+    распознают сканы один раз.
+    """
+    if not page_nums:
+        return {}
     try:
+        return dict(_ocr_pdf_pages_cached(*_pdf_cache_key(file_path), tuple(page_nums)))
+    except Exception as e:
+        logger.warning(f"Ошибка OCR для страниц {[page_num + 1 for page_num in page_nums]}: {e}")
+        return {}
+
+
+@lru_cache(maxsize=32)
+def _ocr_pdf_pages_cached(file_path: str, mtime_ns: int, size: int, page_nums: Tuple[int, ...]) -> Dict[int, str]:
+    """OCR страниц PDF; mtime_ns и size нужны только для ключа кэша."""
+    if fitz is not None:
+        with fitz.open(file_path) as doc:
+            images = [_preprocess_for_ocr(_render_pdf_page(doc[page_num])) for page_num in page_nums]
+    else:
         with pdfplumber.open(file_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                logger.info(f"Обрабатываем страницу {page_num + 1}")
-                
-                # Пробуем извлечь текст
-                text = page.extract_text()
-                
-                if text:
-                    text_lines.append(f"=== Страница {page_num + 1} ===")
-                    text_lines.append(text)
-                else:
-                    # OCR для сканов
-                    try:
-                        im = page.to_image()
-                        pil_image = Image.fromarray(im.original)
-                        ocr_text = pytesseract.image_to_string(pil_image, lang="rus+eng")
-                        if ocr_text:
-                            text_lines.append(f"=== Страница {page_num + 1} (OCR) ===")
-                            text_lines.append(ocr_text)
-                    except Exception as e:
-                        logger.warning(f"Ошибка OCR для страницы {page_num + 1}: {e}")
-                        
+            images = [_preprocess_for_ocr(_render_pdfplumber_page(pdf.pages[page_num])) for page_num in page_nums]
+    return dict(zip(page_nums, _ocr_batch(images)))
+
+
+def _extract_text_from_pdf_page(file_path: str, page_num: int) -> Optional[str]:
+    """
+    Извлечение текстового слоя одной страницы PDF.
+    Возвращает None для сканов без текста - они распознаются OCR отдельно.
+    PDF открывается заново: объекты pdfplumber нельзя разделять между потоками.
+    """
+    # Открывается только нужная страница: pdfplumber не создает объекты
+    # остальных страниц документа
+    with pdfplumber.open(file_path, pages=[page_num + 1]) as pdf:
+        logger.info(f"Обрабатываем страницу {page_num + 1}")
+        return pdf.pages[0].extract_text() or None
+
+
+def _extract_text_from_pdf(file_path: str) -> str:
+    """
+    Извлечение текста из PDF файлов.
+    Текстовый слой читается через PyMuPDF, если он установлен; иначе
+    страницы обрабатываются pdfplumber в потоках. Результат кэшируется
+    по пути, времени изменения и размеру файла.
+    """
+    try:
+        return _extract_text_from_pdf_cached(*_pdf_cache_key(file_path))
     except Exception as e:
         logger.error(f"Ошибка извлечения текста из PDF: {e}")
+        return ""
+
+
+@lru_cache(maxsize=32)
+def _extract_text_from_pdf_cached(file_path: str, mtime_ns: int, size: int) -> str:
+    """Извлечение текста из PDF; mtime_ns и size нужны только для ключа кэша."""
+    if fitz is not None:
+        # MuPDF извлекает текст быстрее, чем распределение страниц по потокам
+        with fitz.open(file_path) as doc:
+            page_texts = [page.get_text("text").strip() or None for page in doc]
+    else:
+        page_count = _pdf_page_count(file_path)
+        workers = _pdf_workers(page_count)
+        if workers == 1:
+            page_texts = [_extract_text_from_pdf_page(file_path, page_num) for page_num in range(page_count)]
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                page_texts = list(executor.map(
+                    lambda page_num: _extract_text_from_pdf_page(file_path, page_num), range(page_count)
+                ))
+    
+    # OCR для сканов - одним пакетом
+    ocr_texts = _ocr_pdf_pages(file_path, [n for n, text in enumerate(page_texts) if text is None])
+    
+    text_lines = []
+    for page_num, text in enumerate(page_texts):
+        if text:
+            text_lines.append(f"=== Страница {page_num + 1} ===")
+            text_lines.append(text)
+        elif ocr_texts.get(page_num):
+            text_lines.append(f"=== Страница {page_num + 1} (OCR) ===")
+            text_lines.append(ocr_texts[page_num])
     
     return "\n".join(text_lines)
 
 
+# Пространство имен WordprocessingML и теги, нужные для чтения document.xml
+_W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+_W_BODY = f"{{{_W_NS}}}body"
+_W_P = f"{{{_W_NS}}}p"
+_W_TBL = f"{{{_W_NS}}}tbl"
+_W_TR = f"{{{_W_NS}}}tr"
+_W_TC = f"{{{_W_NS}}}tc"
+_W_T = f"{{{_W_NS}}}t"
+_W_TAB = f"{{{_W_NS}}}tab"
+_W_BR = f"{{{_W_NS}}}br"
+_W_CR = f"{{{_W_NS}}}cr"
+_W_GRID_SPAN = f"{{{_W_NS}}}tcPr/{{{_W_NS}}}gridSpan"
+_W_VMERGE = f"{{{_W_NS}}}tcPr/{{{_W_NS}}}vMerge"
+_W_VAL = f"{{{_W_NS}}}val"
+
+
+def _docx_paragraph_text(paragraph) -> str:
+    """Текст параграфа WordprocessingML (как Paragraph.text в python-docx)."""
+    parts = []
+    for node in paragraph.iter(_W_T, _W_TAB, _W_BR, _W_CR):
+        if node.tag == _W_T:
+            parts.append(node.text or "")
+        elif node.tag == _W_TAB:
+            parts.append("\t")
+        else:
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _docx_table_rows(table) -> List[List[str]]:
+    """
+    Тексты ячеек таблицы по строкам. Как и в python-docx, объединенная по
+    горизонтали ячейка повторяется для каждой колонки сетки, а продолжение
+    вертикального объединения берет текст ячейки из строки выше.
+    """
+    rows = []
+    previous: List[str] = []
+    for tr in table.iterfind(_W_TR):
+        cells = []
+        for tc in tr.iterfind(_W_TC):
+            span = tc.find(_W_GRID_SPAN)
+            span = int(span.get(_W_VAL, 1)) if span is not None else 1
+            vmerge = tc.find(_W_VMERGE)
+            if vmerge is not None and vmerge.get(_W_VAL, "continue") == "continue" and len(cells) < len(previous):
+                text = previous[len(cells)]
+            else:
+                text = "\n".join(_docx_paragraph_text(p) for p in tc.iterfind(_W_P))
+            cells.extend([text] * span)
+        rows.append(cells)
+        previous = cells
+    return rows
+
+
+def _fast_docx_content(file_path: str) -> Tuple[List[str], List[List[List[str]]]]:
+    """
+    Потоковое чтение word/document.xml через lxml: параграфы и таблицы
+    верхнего уровня документа, без построения объектной модели python-docx.
+    Разобранные элементы сразу удаляются из дерева, поэтому память не растет
+    с размером документа.
+    """
+    paragraphs: List[str] = []
+    tables: List[List[List[str]]] = []
+    with zipfile.ZipFile(file_path) as archive, archive.open("word/document.xml") as xml:
+        # Документ загружен пользователем: внешние сущности и DTD не
+        # загружаются (защита от XXE), как в парсере python-docx
+        for _, element in etree.iterparse(
+            xml, events=("end",), tag=(_W_P, _W_TBL),
+            resolve_entities=False, load_dtd=False, no_network=True,
+        ):
+            parent = element.getparent()
+            if parent is None or parent.tag != _W_BODY:
+                # Параграфы и вложенные таблицы внутри ячеек разбираются вместе с таблицей
+                continue
+            if element.tag == _W_TBL:
+                tables.append(_docx_table_rows(element))
+            else:
+                paragraphs.append(_docx_paragraph_text(element))
+            element.clear()
+            while element.getprevious() is not None:
+                del parent[0]
+    return paragraphs, tables
+
+
+def _read_docx_content(file_path: str) -> Tuple[List[str], List[List[List[str]]]]:
+    """Параграфы и таблицы DOCX; при ошибке разбора XML - через python-docx."""
+    try:
+        return _fast_docx_content(file_path)
+    except (zipfile.BadZipFile, KeyError, etree.XMLSyntaxError, ValueError) as e:
+        logger.warning(f"Не удалось прочитать DOCX напрямую, используем python-docx: {e}")
+    doc = Document(file_path)
+    paragraphs = [p.text for p in doc.paragraphs]
+    tables = [[[cell.text for cell in row.cells] for row in table.rows] for table in doc.tables]
+    return paragraphs, tables
+
+
 def _extract_text_from_docx(file_path: str) -> str:
     """Извлечение текста из DOCX файлов."""
     text_lines = []
@@ -171,19 +644,19 @@ def _extract_text_from_docx(file_path: str) -> str:
     try:
         logger.info(f"Извлекаем текст из DOCX файла: {file_path}")
         
-        doc = Document(file_path)
+        paragraphs, tables = _read_docx_content(file_path)
         
         # Извлекаем текст из параграфов
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text_lines.append(para.text)
+        for para in paragraphs:
+            if para.strip():
+                text_lines.append(para)
         
         # Извлекаем текст из таблиц
-        for table_idx, table in enumerate(doc.tables):
+        for table_idx, table in enumerate(tables):
             text_lines.append(f"=== Таблица {table_idx + 1} ===")
             
-            for row in table.rows:
-                row_text = " | ".join([cell.text.strip() for cell in row.cells])
+            for row in table:
+                row_text = " | ".join([cell.strip() for cell in row])
                 if row_text.strip():
                     text_lines.append(row_text)
         
@@ -194,40 +667,47 @@ def _extract_text_from_docx(file_path: str) -> str:
         return ""
 
 
+def _ocr_image(image: Image.Image, fallback_configs: List[str]) -> str:
+    """
+    Распознавание изображения: основная конфигурация, а запасные - только
+    если в результате меньше _OCR_MIN_CHARS значимых символов.
+    Из всех попыток возвращается самый длинный текст.
+    """
+    image = _preprocess_for_ocr(image)
+    best_text = ""
+    for config in [_OCR_PRIMARY_CONFIG] + fallback_configs:
+        try:
+            text = _image_to_string(image, config)
+            if text and len(text.strip()) > len(best_text.strip()):
+                best_text = text
+                logger.info(f"Успешное распознавание с конфигурацией: {config}")
+        except Exception as e:
+            logger.warning(f"Ошибка OCR с конфигурацией {config}: {e}")
+        
+        if len("".join(best_text.split())) >= _OCR_MIN_CHARS:
+            break
+    
+    return best_text
+
+
 def _extract_text_from_image(file_path: str) -> str:
     """Извлечение текста из изображений с помощью OCR."""
     try:
         logger.info(f"Извлекаем текст из изображения: {file_path}")
         
         # Проверяем, доступен ли Tesseract
-        try:
-            pytesseract.get_tesseract_version()
-        except Exception as e:
-            logger.error(f"Tesseract недоступен: {e}")
+        if not _ocr_available():
             return ""
         
         image = Image.open(file_path)
         
-        # Пробуем разные настройки OCR для лучшего распознавания
-        configs = [
+        # Запасные настройки OCR, если основная распознала слишком мало
+        return _ocr_image(image, [
             '--oem 3 --psm 6',  # Стандартные настройки
-            '--oem 3 --psm 3',  # Автоматическое определение страницы
             '--oem 1 --psm 6',  # Legacy OCR engine
             '--oem 3 --psm 8',  # Одна строка текста
             '--oem 3 --psm 13', # Необработанная строка
-        ]
-        
-        best_text = ""
-        for config in configs:
-            try:
-                text = pytesseract.image_to_string(image, lang="rus+eng", config=config)
-                if text and len(text.strip()) > len(best_text.strip()):
-                    best_text = text
-                    logger.info(f"Успешное распознавание с конфигурацией: {config}")
-            except Exception as e:
-                logger.warning(f"Ошибка OCR с конфигурацией {config}: {e}")
-        
-        return best_text
+        ])
         
     except Exception as e:
         logger.error(f"Ошибка OCR для изображения {file_path}: {e}")
@@ -239,30 +719,7 @@ def _parse_excel(file_path: str) -> List[Dict[str, Any]]:
     try:
         logger.info(f"Начинаем парсинг Excel файла: {file_path}")
         
-        # Пробуем разные движки для чтения Excel
-        df = None
-        engines = ["openpyxl", "xlrd"]
-        
-        for engine in engines:
-            try:
-                logger.info(f"Пробуем движок: {engine}")
-                df = pd.read_excel(file_path, engine=engine)
-                logger.info(f"Успешно прочитан файл с движком {engine}")
-                break
-            except Exception as e:
-                logger.warning(f"Ошибка с движком {engine}: {e}")
-                continue
-        
-        # Если Excel не удался, пробуем CSV
-        if df is None:
-            try:
-                logger.info("Пробуем прочитать как CSV")
-                df = pd.read_csv(file_path)
-                logger.info("Успешно прочитан как CSV")
-            except Exception as e:
-                logger.error(f"Ошибка чтения CSV: {e}")
-                return []
-        
+        df = _read_table_file(file_path)
         if df is None or df.empty:
             logger.warning("Файл пустой или не содержит данных")
             return []
@@ -274,15 +731,8 @@ def _parse_excel(file_path: str) -> List[Dict[str, Any]]:
         df.columns = [str(c).strip().lower() for c in df.columns]
         logger.info(f"Нормализованные колонки: {list(df.columns)}")
         
-        rows: List[Dict[str, Any]] = []
-        for idx, r in df.iterrows():
-            logger.debug(f"Обрабатываем строку {idx + 1}: {r.to_dict()}")
-            row = _normalize_row_from_dict(r.to_dict())
-            if row:
-                rows.append(row)
-                logger.debug(f"Добавлена строка: {row}")
-            else:
-                logger.debug(f"Строка {idx + 1} пропущена (пустая)")
+        # Нормализуем всю таблицу по колонкам
+        rows = _normalize_dataframe(df)
         
         logger.info(f"Извлечено {len(rows)} записей из Excel файла")
         return rows
@@ -292,47 +742,85 @@ def _parse_excel(file_path: str) -> List[Dict[str, Any]]:
         return []
 
 
-def _parse_pdf(file_path: str) -> List[Dict[str, Any]]:
-    """Парсинг PDF (таблицы + OCR fallback)."""
+def _parse_pdf_page(file_path: str, page_num: int) -> Optional[List[Dict[str, Any]]]:
+    """
+    Парсинг одной страницы PDF (таблица или свободный текст).
+    Возвращает None для сканов без текста - они распознаются OCR отдельно.
+    PDF открывается заново: объекты pdfplumber нельзя разделять между потоками.
+    """
     rows: List[Dict[str, Any]] = []
-    try:
-        with pdfplumber.open(file_path) as pdf:
-            for page_num, page in enumerate(pdf.pages):
-                text = None
+    # Открывается только нужная страница: pdfplumber не создает объекты
+    # остальных страниц документа
+    with pdfplumber.open(file_path, pages=[page_num + 1]) as pdf:
+        page = pdf.pages[0]
+        text = None
+        try:
+            text = page.extract_text()
+        except Exception:
+            text = None
+
+        if text:
+            # Пробуем таблицу. Стратегия извлечения таблиц по умолчанию строит
+            # ячейки по линиям разметки: на странице без линий, прямоугольников
+            # и кривых таблицы быть не может, и ее поиск пропускается
+            table = None
+            if page.lines or page.rects or page.curves:
                 try:
-                    text = page.extract_text()
+                    table = page.extract_table()
                 except Exception:
-                    text = None
+                    table = None
 
-                if text:
-                    # Пробуем таблицу
-                    try:
-                        table = page.extract_table()
-                    except Exception:
-                        table = None
-
-                    if table and len(table) > 1:
-                        headers = [str(h).strip().lower() for h in table[0]]
-                        for line in table[1:]:
-                            r = {headers[i]: line[i] for i in range(min(len(headers), len(line)))}
-                            row = _normalize_row_from_dict(r)
-                            if row:
-                                rows.append(row)
-                    else:
-                        rows.extend(_extract_freestyle_text(text))
-                else:
-                    # OCR для сканов
-                    try:
-                        im = page.to_image()
-                        pil_image = Image.fromarray(im.original)
-                        text = pytesseract.image_to_string(pil_image, lang="rus+eng")
-                        if text:
-                            rows.extend(_extract_freestyle_text(text))
-                    except Exception:
-                        pass
+            if table and len(table) > 1:
+                headers = [str(h).strip().lower() for h in table[0]]
+                for line in table[1:]:
+                    r = {headers[i]: line[i] for i in range(min(len(headers), len(line)))}
+                    row = _normalize_row_from_dict(r)
+                    if row:
+                        rows.append(row)
+            else:
+                rows.extend(_extract_freestyle_text(text))
+        else:
+            return None
+    return rows
+
+
+def _parse_pdf(file_path: str) -> List[Dict[str, Any]]:
+    """
+    Парсинг PDF (таблицы + OCR fallback).
+    Страницы независимы, поэтому многостраничные файлы разбираются
+    в пуле потоков; результаты собираются в порядке страниц.
+    Результат кэшируется по пути, времени изменения и размеру файла.
+    """
+    try:
+        return [dict(row) for row in _parse_pdf_cached(*_pdf_cache_key(file_path))]
     except Exception as e:
         logger.error(f"Ошибка парсинга PDF: {e}")
-    return rows
+        return []
+
+
+@lru_cache(maxsize=32)
+def _parse_pdf_cached(file_path: str, mtime_ns: int, size: int) -> Tuple[Dict[str, Any], ...]:
+    """Парсинг PDF; mtime_ns и size нужны только для ключа кэша."""
+    page_count = _pdf_page_count(file_path)
+    workers = _pdf_workers(page_count)
+    if workers == 1:
+        page_results = [_parse_pdf_page(file_path, page_num) for page_num in range(page_count)]
+    else:
+        # Потоки, а не процессы: разбор вызывается из потоков сервера,
+        # и запуск пула процессов на каждую загрузку обходится дороже
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            page_results = list(executor.map(partial(_parse_pdf_page, file_path), range(page_count)))
+    
+    # OCR для сканов - одним пакетом
+    ocr_texts = _ocr_pdf_pages(file_path, [n for n, page_rows in enumerate(page_results) if page_rows is None])
+    
+    rows: List[Dict[str, Any]] = []
+    for page_num, page_rows in enumerate(page_results):
+        if page_rows is not None:
+            rows.extend(page_rows)
+        elif ocr_texts.get(page_num):
+            rows.extend(_extract_freestyle_text(ocr_texts[page_num]))
+    return tuple(rows)
 
 
 def _parse_docx(file_path: str) -> List[Dict[str, Any]]:
@@ -341,38 +829,41 @@ def _parse_docx(file_path: str) -> List[Dict[str, Any]]:
     try:
         logger.info(f"Начинаем парсинг DOCX файла: {file_path}")
         
-        doc = Document(file_path)
-        logger.info(f"Документ загружен, количество таблиц: {len(doc.tables)}")
+        paragraphs, tables = _read_docx_content(file_path)
+        logger.info(f"Документ загружен, количество таблиц: {len(tables)}")
+        debug = logger.isEnabledFor(logging.DEBUG)
         
         # Парсим таблицы
-        for table_idx, tbl in enumerate(doc.tables):
+        for table_idx, tbl in enumerate(tables):
             logger.info(f"Обрабатываем таблицу {table_idx + 1}")
             
-            if not tbl.rows:
+            if not tbl:
                 logger.warning(f"Таблица {table_idx + 1} пустая")
                 continue
                 
             # Извлекаем заголовки
-            headers = [cell.text.strip().lower() for cell in tbl.rows[0].cells]
+            headers = [cell.strip().lower() for cell in tbl[0]]
             logger.info(f"Заголовки таблицы: {headers}")
             
             # Обрабатываем строки данных
-            for row_idx, row in enumerate(tbl.rows[1:], 1):
-                data = [cell.text.strip() for cell in row.cells]
-                logger.debug(f"Строка {row_idx}: {data}")
+            for row_idx, row in enumerate(tbl[1:], 1):
+                data = [cell.strip() for cell in row]
+                if debug:
+                    logger.debug("Строка %s: %s", row_idx, data)
                 
                 # Создаем словарь данных
                 d = {headers[i]: data[i] for i in range(min(len(headers), len(data)))}
                 row_data = _normalize_row_from_dict(d)
                 if row_data:
                     rows.append(row_data)
-                    logger.debug(f"Добавлена строка из таблицы: {row_data}")
-                else:
-                    logger.debug(f"Строка {row_idx} из таблицы пропущена")
+                    if debug:
+                        logger.debug("Добавлена строка из таблицы: %s", row_data)
+                elif debug:
+                    logger.debug("Строка %s из таблицы пропущена", row_idx)
 
         # Парсим свободный текст
         logger.info("Обрабатываем свободный текст")
-        text = "\n".join(p.text for p in doc.paragraphs)
+        text = "\n".join(paragraphs)
         logger.info(f"Длина текста: {len(text)} символов")
         
         if text.strip():
@@ -394,31 +885,17 @@ def _parse_image(file_path: str) -> List[Dict[str, Any]]:
         logger.info(f"Начинаем парсинг изображения: {file_path}")
         
         # Проверяем, доступен ли Tesseract
-        try:
-            pytesseract.get_tesseract_version()
-        except Exception as e:
-            logger.error(f"Tesseract недоступен: {e}")
+        if not _ocr_available():
             return rows
         
         image = Image.open(file_path)
         logger.info(f"Изображение загружено: {image.size} пикселей")
         
-        # Пробуем разные настройки OCR для лучшего распознавания
-        configs = [
+        # Запасные настройки OCR, если основная распознала слишком мало
+        best_text = _ocr_image(image, [
             '--oem 3 --psm 6',  # Стандартные настройки
-            '--oem 3 --psm 3',  # Автоматическое определение страницы
             '--oem 1 --psm 6',  # Legacy OCR engine
-        ]
-        
-        best_text = ""
-        for config in configs:
-            try:
-                text = pytesseract.image_to_string(image, lang="rus+eng", config=config)
-                if text and len(text.strip()) > len(best_text.strip()):
-                    best_text = text
-                    logger.info(f"Успешное распознавание с конфигурацией: {config}")
-            except Exception as e:
-                logger.warning(f"Ошибка OCR с конфигурацией {config}: {e}")
+        ])
         
         if best_text:
             logger.info(f"Распознанный текст (первые 200 символов): {best_text[:200]}...")
@@ -434,6 +911,31 @@ def _parse_image(file_path: str) -> List[Dict[str, Any]]:
     return rows
 
 
+# Поля тарифа, колонки-синонимы (в порядке приоритета) и значение по умолчанию.
+# Как и в _normalize_row_from_dict, берется первое непустое значение; если
+# значения по умолчанию нет (None), остается значение последней колонки
+_FIELD_ALIASES = (
+    ("transport_type", ("transport", "mode", "тип", "transport_type", "вид_транспорта"), "auto"),
+    ("basis", ("basis", "incoterm", "базис", "incoterms"), "EXW"),
+    ("origin_country", ("origin_country", "страна_отправления", "country_from", "from_country"), ""),
+    ("origin_city", ("origin_city", "from", "origin", "город_отправления", "city_from", "from_city", "origin_city"), ""),
+    ("destination_country", ("destination_country", "страна_назначения", "country_to", "to_country"), ""),
+    ("destination_city", ("destination_city", "to", "destination", "город_назначения", "city_to", "to_city"), ""),
+    ("vehicle_type", ("vehicle_type", "container", "тип_тс", "vehicle", "транспорт"), ""),
+    ("price_rub", ("price_rub", "rub", "руб", "price", "стоимость"), None),
+    ("price_usd", ("price_usd", "usd", "доллар", "price_usd", "стоимость_usd"), None),
+    ("validity_date", ("validity", "valid_to", "date", "дата", "срок_действия"), None),
+    ("transit_time_days", ("transit_days", "tt", "срок", "время_в_пути", "transit_time"), None),
+)
+
+# Колонка-синоним -> (поле тарифа, приоритет синонима): строка просматривается
+# один раз, а не цепочкой d.get(...) по всем синонимам каждого поля
+_ALIAS_TO_CANONICAL: Dict[str, Tuple[str, int]] = {}
+for _field, _aliases, _ in _FIELD_ALIASES:
+    for _priority, _alias in enumerate(_aliases):
+        _ALIAS_TO_CANONICAL.setdefault(_alias, (_field, _priority))
+
+
 def _normalize_row_from_dict(d: Dict[str, Any]) -> Dict[str, Any]:
     """Приведение данных строки к единому формату."""
     if not isinstance(d, dict):
@@ -446,44 +948,36 @@ def _normalize_row_from_dict(d: Dict[str, Any]) -> Dict[str, Any]:
         logger.debug("Строка пустая, пропускаем")
         return {}
     
-    logger.debug(f"Нормализуем данные: {d}")
-    
-    # Ищем данные в разных возможных полях
-    transport_type = _map_transport(
-        d.get("transport") or d.get("mode") or d.get("тип") or 
-        d.get("transport_type") or d.get("вид_транспорта") or "auto"
-    )
-    
-    basis = str(d.get("basis") or d.get("incoterm") or d.get("базис") or 
-                d.get("incoterms") or "EXW").upper()
+    logger.debug("Нормализуем данные: %s", d)
     
-    origin_country = (d.get("origin_country") or d.get("страна_отправления") or 
-                     d.get("country_from") or d.get("from_country") or "")
-    
-    origin_city = (d.get("origin_city") or d.get("from") or d.get("origin") or 
-                  d.get("город_отправления") or d.get("city_from") or d.get("from_city") or 
-                  d.get("origin_city") or "")
-    
-    destination_country = (d.get("destination_country") or d.get("страна_назначения") or 
-                          d.get("country_to") or d.get("to_country") or "")
-    
-    destination_city = (d.get("destination_city") or d.get("to") or d.get("destination") or 
-                       d.get("город_назначения") or d.get("city_to") or d.get("to_city") or "")
-    
-    vehicle_type = (d.get("vehicle_type") or d.get("container") or d.get("тип_тс") or 
-                   d.get("vehicle") or d.get("транспорт") or "")
-    
-    price_rub = _float_or_none(d.get("price_rub") or d.get("rub") or d.get("руб") or 
-                              d.get("price") or d.get("стоимость"))
-    
-    price_usd = _float_or_none(d.get("price_usd") or d.get("usd") or d.get("доллар") or 
-                              d.get("price_usd") or d.get("стоимость_usd"))
+    # Для каждого поля - первое по приоритету непустое значение синонимов
+    found: Dict[str, Tuple[int, Any]] = {}
+    for key, value in d.items():
+        alias = _ALIAS_TO_CANONICAL.get(key)
+        if alias is None or not value:
+            continue
+        field, priority = alias
+        if field not in found or priority < found[field][0]:
+            found[field] = (priority, value)
     
-    validity_date = _date_or_none(d.get("validity") or d.get("valid_to") or d.get("date") or 
-                                 d.get("дата") or d.get("срок_действия"))
+    # Если непустых значений нет, берется значение по умолчанию, а без него -
+    # значение последнего синонима (как в цепочке d.get(a) or d.get(b))
+    fields = {
+        field: found[field][1] if field in found else (default if default is not None else d.get(aliases[-1]))
+        for field, aliases, default in _FIELD_ALIASES
+    }
     
-    transit_time_days = _int_or_none(d.get("transit_days") or d.get("tt") or d.get("срок") or 
-                                   d.get("время_в_пути") or d.get("transit_time"))
+    transport_type = _map_transport(fields["transport_type"])
+    basis = str(fields["basis"]).upper()
+    origin_country = fields["origin_country"]
+    origin_city = fields["origin_city"]
+    destination_country = fields["destination_country"]
+    destination_city = fields["destination_city"]
+    vehicle_type = fields["vehicle_type"]
+    price_rub = _float_or_none(fields["price_rub"])
+    price_usd = _float_or_none(fields["price_usd"])
+    validity_date = _date_or_none(fields["validity_date"])
+    transit_time_days = _int_or_none(fields["transit_time_days"])
     
     result = {
         "transport_type": transport_type,
@@ -502,10 +996,197 @@ def _normalize_row_from_dict(d: Dict[str, Any]) -> Dict[str, Any]:
     # Убираем пустые значения
     result = {k: v for k, v in result.items() if v is not None and v != ""}
     
-    logger.debug(f"Результат нормализации: {result}")
+    logger.debug("Результат нормализации: %s", result)
     return result
 
 
+def _coalesce_columns(df: pd.DataFrame, aliases: Tuple[str, ...], default: Any) -> np.ndarray:
+    """
+    Первое непустое значение из колонок-синонимов для каждой строки
+    (то же, что цепочка d.get(a) or d.get(b) or ... or default).
+    """
+    result = np.full(len(df), default, dtype=object)
+    for position, alias in enumerate(reversed(aliases)):
+        if alias not in df.columns:
+            continue
+        column = df[alias].to_numpy(dtype=object)
+        if position == 0 and default is None:
+            result = column.copy()
+        else:
+            result = np.where(column.astype(bool), column, result)
+    return result
+
+
+def _map_unique(values: np.ndarray, func) -> np.ndarray:
+    """Применяет func к каждому различному значению один раз."""
+    # factorize считает равными 1, 1.0 и True, а все пропуски объединяет,
+    # поэтому значения различаются еще и по типу (None и NaN - разные типы)
+    value_codes, value_uniques = pd.factorize(values)
+    value_codes = np.where(value_codes == -1, len(value_uniques), value_codes)
+    type_codes, type_uniques = pd.factorize(np.array([type(value) for value in values], dtype=object))
+    keys = value_codes * len(type_uniques) + type_codes
+    unique_keys, first_index, codes = np.unique(keys, return_index=True, return_inverse=True)
+    mapped = np.empty(len(unique_keys), dtype=object)
+    mapped[:] = [func(values[index]) for index in first_index]
+    return mapped[codes]
+
+
+def _floats_or_none(values: np.ndarray) -> np.ndarray:
+    """Векторный вариант _float_or_none для колонки значений."""
+    text = pd.Series(values, dtype=object).astype(str).str.replace(" ", "", regex=False).str.replace(",", ".", regex=False)
+    parsed = pd.to_numeric(text, errors="coerce").notna().to_numpy()
+    result = np.empty(len(values), dtype=object)
+    try:
+        result[parsed] = text[parsed].astype(float).tolist()
+    except ValueError:
+        parsed[:] = False
+    # Значения, которые pandas не распознал, проверяются поштучно
+    result[~parsed] = [_float_or_none(value) for value in values[~parsed]]
+    return result
+
+
+def _ints_or_none(floats: np.ndarray) -> np.ndarray:
+    """Векторный вариант _int_or_none по результату _floats_or_none."""
+    result = np.empty(len(floats), dtype=object)
+    result[:] = [
+        int(value) if value is not None and np.isfinite(value) else None
+        for value in floats
+    ]
+    return result
+
+
+def _normalize_dataframe(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Нормализация всей таблицы по колонкам: результат тот же, что у
+    _normalize_row_from_dict для каждой строки, но синонимы полей
+    и преобразования типов обрабатываются целыми колонками.
+    """
+    if df.columns.duplicated().any():
+        # В словаре строки повторяющаяся колонка перекрывается последней
+        df = df.loc[:, ~df.columns.duplicated(keep="last")]
+    
+    # Строка пустая, если в ней нет ни одного значения с непустым текстом.
+    # Числа, даты и NaN всегда дают непустой текст, поэтому при наличии
+    # таких колонок пустых строк нет, а иначе проверяются текстовые колонки
+    if (df.dtypes == object).all():
+        not_none = df.to_numpy(dtype=object) != None  # noqa: E711 - поэлементное сравнение
+        not_blank = df.astype(str).apply(lambda column: column.str.strip().ne("")).to_numpy()
+        has_data = (not_none & not_blank).any(axis=1)
+    else:
+        has_data = np.ones(len(df), dtype=bool)
+    
+    fields = {field: _coalesce_columns(df, aliases, default) for field, aliases, default in _FIELD_ALIASES}
+    fields["transport_type"] = _map_unique(fields["transport_type"], _map_transport)
+    fields["basis"] = pd.Series(fields["basis"], dtype=object).astype(str).str.upper().to_numpy(dtype=object)
+    fields["price_rub"] = _floats_or_none(fields["price_rub"])
+    fields["price_usd"] = _floats_or_none(fields["price_usd"])
+    fields["validity_date"] = _map_unique(fields["validity_date"], _date_or_none)
+    fields["transit_time_days"] = _ints_or_none(_floats_or_none(fields["transit_time_days"]))
+    
+    names = list(fields)
+    rows = []
+    for index, row_values in enumerate(zip(*fields.values())):
+        if has_data[index]:
+            # Убираем пустые значения
+            rows.append({k: v for k, v in zip(names, row_values) if v is not None and v != ""})
+    return rows
+
+
+# Паттерны цен для свободного текста (в порядке приоритета) и валюта цены
+_PRICE_PATTERN_SOURCES = (
+    # USD цены
+    (r"USD\s*(\d+(?:[.,]\d+)?)", "USD"),  # USD 1000
+    (r"(\d+(?:[.,]\d+)?)\s*USD", "USD"),  # 1000 USD
+    (r"(\d+(?:[.,]\d+)?)\s*\$", "USD"),   # 1000 $
+    (r"\$\s*(\d+(?:[.,]\d+)?)", "USD"),   # $ 1000
+    (r"(\d+(?:[.,]\d+)?)\s*доллар", "USD"), # 1000 доллар
+    (r"price.*?(\d+(?:[.,]\d+)?)", "USD"), # price 1000
+    (r"rate.*?(\d+(?:[.,]\d+)?)", "USD"),  # rate 1000
+    (r"(\d+(?:[.,]\d+)?)\s*/\s*(?:40|20|container|bl)", "USD"), # 1000/40HC
+    
+    # Рублевые цены
+    (r"(\d+(?:[.,]\d+)?)\s*руб", "RUB"),   # 1000 руб
+    (r"(\d+(?:[.,]\d+)?)\s*₽", "RUB"),     # 1000 ₽
+    (r"(\d+(?:[.,]\d+)?)\s*RUB", "RUB"),   # 1000 RUB
+    
+    # RMB цены
+    (r"(\d+(?:[.,]\d+)?)\s*RMB", "RMB"),   # 1000 RMB
+    (r"RMB\s*(\d+(?:[.,]\d+)?)", "RMB"),   # RMB 1000
+)
+_PRICE_PATTERNS = tuple((re.compile(pattern, re.IGNORECASE), currency) for pattern, currency in _PRICE_PATTERN_SOURCES)
+_PRICE_ANY_RE = re.compile("|".join(f"(?:{pattern})" for pattern, _ in _PRICE_PATTERN_SOURCES), re.IGNORECASE)
+
+# Каждый паттерн цены содержит хотя бы один из этих маркеров: строки без них
+# отсекаются поиском по литералам, до сравнительно дорогих паттернов с \d
+_PRICE_MARKER_RE = re.compile(r"usd|\$|доллар|price|rate|/|руб|₽|rub|rmb", re.IGNORECASE)
+
+# Паттерны маршрутов для свободного текста (в порядке приоритета)
+_ROUTE_PATTERN_SOURCES = (
+    # Русские города
+    r"([А-Яа-я\s]+)\s*[-–—]\s*([А-Яа-я\s]+)",  # Москва - Санкт-Петербург
+    r"([А-Яа-я\s]+)\s*→\s*([А-Яа-я\s]+)",      # Москва → Санкт-Петербург
+    r"([А-Яа-я\s]+)\s*>\s*([А-Яа-я\s]+)",      # Москва > Санкт-Петербург
+    r"([А-Яа-я\s]+)\s*до\s*([А-Яа-я\s]+)",     # Москва до Санкт-Петербург
+    
+    # Английские города
+    r"([A-Za-z\s]+)\s*[-–—]\s*([A-Za-z\s]+)",  # Beijing - Moscow
+    r"([A-Za-z\s]+)\s*→\s*([A-Za-z\s]+)",      # Beijing → Moscow
+    r"([A-Za-z\s]+)\s*>\s*([A-Za-z\s]+)",      # Beijing > Moscow
+    r"([A-Za-z\s]+)\s*to\s*([A-Za-z\s]+)",     # Beijing to Moscow
+    
+    # Специфичные паттерны для логистики
+    r"from\s+([A-Za-z\s]+)\s+to\s+([A-Za-z\s]+)",  # from Beijing to Moscow
+    r"([A-Za-z\s]+)\s*-\s*([A-Za-z\s]+)\s*route",  # Beijing-Moscow route
+    r"([A-Za-z\s]+)\s*/\s*([A-Za-z\s]+)",      # Beijing/Moscow
+)
+_ROUTE_PATTERNS = tuple(re.compile(pattern) for pattern in _ROUTE_PATTERN_SOURCES)
+_ROUTE_ANY_RE = re.compile("|".join(f"(?:{pattern})" for pattern in _ROUTE_PATTERN_SOURCES))
+
+# Разделители, без которых не срабатывает ни один паттерн маршрута; классы
+# [А-Яа-я\s]+ в самих паттернах дают много возвратов на длинных строках
+_ROUTE_MARKER_RE = re.compile(r"[-–—→>/]|до|to")
+
+# Общие слова, которые убираются из названий городов маршрута
+_ROUTE_EXCLUDE_WORDS = frozenset(['route', 'from', 'to', 'до', 'от', 'маршрут', 'путь'])
+
+# Все паттерны цен требуют цифру, а маршрут дает запись, только если в
+# названиях городов есть буквы: строки без цифр и букв пропускаются сразу
+_DIGIT_RE = re.compile(r"\d")
+_LETTER_RE = re.compile(r"[A-Za-zА-Яа-я]")
+
+# Ключевые слова типов транспорта в порядке приоритета: если в строке есть
+# слова нескольких типов, выбирается тип, идущий раньше. Строки без ключевых
+# слов относятся к автоперевозкам
+_TRANSPORT_KEYWORDS = (
+    ("rail", ['жд', 'железнодорожный', 'rail', 'fob.rail', 'lcl.rail', 'station', 'coc']),
+    ("sea", ['море', 'морской', 'sea', 'fcl', 'pol', 'pop', 'port', 'carrier', 'feeder']),
+    ("air", ['авиа', 'воздушный', 'air', 'peking', 'pek', 'svo', 'quotation']),
+    ("multimodal", ['мульти', 'multimodal', 'mmp']),
+)
+_TRANSPORT_PRIORITY = {transport_type: index for index, (transport_type, _) in enumerate(_TRANSPORT_KEYWORDS)}
+
+# Все ключевые слова одним выражением: имя сработавшей группы - тип транспорта.
+# Lookahead позволяет увидеть совпадения, перекрывающиеся с уже найденными
+_TRANSPORT_RE = re.compile(
+    '(?=' + '|'.join(
+        f"(?P<{transport_type}>" + '|'.join(re.escape(word) for word in words) + ')'
+        for transport_type, words in _TRANSPORT_KEYWORDS
+    ) + ')'
+)
+
+
+def _detect_line_transport(line_lower: str) -> str:
+    """Тип транспорта строки по ключевым словам (за один проход по строке)."""
+    transport_type, best_priority = "auto", len(_TRANSPORT_KEYWORDS)
+    for match in _TRANSPORT_RE.finditer(line_lower):
+        priority = _TRANSPORT_PRIORITY[match.lastgroup]
+        if priority < best_priority:
+            transport_type, best_priority = match.lastgroup, priority
+            if priority == 0:
+                break
+    return transport_type
+
+
 def _extract_freestyle_text(text: str) -> List[Dict[str, Any]]:
     """Улучшенное извлечение из свободного текста (эвристики)."""
     rows: List[Dict[str, Any]] = []
@@ -518,125 +1199,80 @@ def _extract_freestyle_text(text: str) -> List[Dict[str, Any]]:
     lines = text.splitlines()
     logger.info(f"Найдено {len(lines)} строк текста")
     
+    # Уровень логирования проверяется один раз: при INFO отладочные
+    # сообщения по строкам не форматируются
+    debug = logger.isEnabledFor(logging.DEBUG)
+    
     for i, line in enumerate(lines):
         l = line.strip()
         if not l or len(l) < 5:  # Пропускаем слишком короткие строки
             continue
+        
+        has_digit = _DIGIT_RE.search(l) is not None
+        has_letter = _LETTER_RE.search(l) is not None
+        if not has_digit and not has_letter:
+            continue
 
-        logger.debug(f"Анализируем строку {i+1}: {l[:100]}...")
-        
-        # Ищем цены в разных форматах
-        price_patterns = [
-            # USD цены
-            r"USD\s*(\d+(?:[.,]\d+)?)",  # USD 1000
-            r"(\d+(?:[.,]\d+)?)\s*USD",  # 1000 USD
-            r"(\d+(?:[.,]\d+)?)\s*\$",   # 1000 $
-            r"\$\s*(\d+(?:[.,]\d+)?)",   # $ 1000
-            r"(\d+(?:[.,]\d+)?)\s*доллар", # 1000 доллар
-            r"price.*?(\d+(?:[.,]\d+)?)", # price 1000
-            r"rate.*?(\d+(?:[.,]\d+)?)",  # rate 1000
-            r"(\d+(?:[.,]\d+)?)\s*/\s*(?:40|20|container|bl)", # 1000/40HC
-            
-            # Рублевые цены
-            r"(\d+(?:[.,]\d+)?)\s*руб",   # 1000 руб
-            r"(\d+(?:[.,]\d+)?)\s*₽",     # 1000 ₽
-            r"(\d+(?:[.,]\d+)?)\s*RUB",   # 1000 RUB
-            
-            # RMB цены
-            r"(\d+(?:[.,]\d+)?)\s*RMB",   # 1000 RMB
-            r"RMB\s*(\d+(?:[.,]\d+)?)",   # RMB 1000
-        ]
+        if debug:
+            logger.debug("Анализируем строку %s: %s...", i + 1, l[:100])
         
+        # Ищем цены в разных форматах; общий паттерн отсекает строки без цен
+        # за один проход, не перебирая все паттерны
         price_usd = None
         price_rub = None
         
-        for pattern in price_patterns:
-            match = re.search(pattern, l, re.IGNORECASE)
-            if match:
-                try:
-                    price_str = match.group(1).replace(',', '.').replace(' ', '')
-                    price = float(price_str)
-                    
-                    # Фильтруем слишком маленькие цены (менее 1)
-                    if price < 1:
-                        continue
+        if has_digit and _PRICE_MARKER_RE.search(l) and _PRICE_ANY_RE.search(l):
+            for pattern, currency in _PRICE_PATTERNS:
+                match = pattern.search(l)
+                if match:
+                    try:
+                        price_str = match.group(1).replace(',', '.').replace(' ', '')
+                        price = float(price_str)
                         
-                    if 'руб' in pattern or '₽' in pattern or 'RUB' in pattern:
-                        price_rub = price
-                    elif 'RMB' in pattern:
-                        # Конвертируем RMB в USD (примерный курс)
-                        price_usd = price / 7.2
-                    else:
-                        price_usd = price
-                    logger.debug(f"Найдена цена: {price} (USD: {price_usd}, RUB: {price_rub})")
-                    break
-                except ValueError:
-                    continue
+                        # Фильтруем слишком маленькие цены (менее 1)
+                        if price < 1:
+                            continue
+                            
+                        if currency == "RUB":
+                            price_rub = price
+                        elif currency == "RMB":
+                            # Конвертируем RMB в USD (примерный курс)
+                            price_usd = price / 7.2
+                        else:
+                            price_usd = price
+                        if debug:
+                            logger.debug("Найдена цена: %s (USD: %s, RUB: %s)", price, price_usd, price_rub)
+                        break
+                    except ValueError:
+                        continue
         
         # Ищем маршруты в разных форматах
-        route_patterns = [
-            # Русские города
-            r"([А-Яа-я\s]+)\s*[-–—]\s*([А-Яа-я\s]+)",  # Москва - Санкт-Петербург
-            r"([А-Яа-я\s]+)\s*→\s*([А-Яа-я\s]+)",      # Москва → Санкт-Петербург
-            r"([А-Яа-я\s]+)\s*>\s*([А-Яа-я\s]+)",      # Москва > Санкт-Петербург
-            r"([А-Яа-я\s]+)\s*до\s*([А-Яа-я\s]+)",     # Москва до Санкт-Петербург
-            
-            # Английские города
-            r"([A-Za-z\s]+)\s*[-–—]\s*([A-Za-z\s]+)",  # Beijing - Moscow
-            r"([A-Za-z\s]+)\s*→\s*([A-Za-z\s]+)",      # Beijing → Moscow
-            r"([A-Za-z\s]+)\s*>\s*([A-Za-z\s]+)",      # Beijing > Moscow
-            r"([A-Za-z\s]+)\s*to\s*([A-Za-z\s]+)",     # Beijing to Moscow
-            
-            # Специфичные паттерны для логистики
-            r"from\s+([A-Za-z\s]+)\s+to\s+([A-Za-z\s]+)",  # from Beijing to Moscow
-            r"([A-Za-z\s]+)\s*-\s*([A-Za-z\s]+)\s*route",  # Beijing-Moscow route
-            r"([A-Za-z\s]+)\s*/\s*([A-Za-z\s]+)",      # Beijing/Moscow
-        ]
-        
         origin = None
         destination = None
         
-        for pattern in route_patterns:
-            match = re.search(pattern, l)
-            if match:
-                origin = match.group(1).strip()
-                destination = match.group(2).strip()
-                
-                # Фильтруем слишком короткие или нерелевантные названия
-                if len(origin) > 2 and len(destination) > 2:
-                    # Убираем общие слова
-                    exclude_words = ['route', 'from', 'to', 'до', 'от', 'маршрут', 'путь']
-                    origin_clean = ' '.join([word for word in origin.split() if word.lower() not in exclude_words])
-                    destination_clean = ' '.join([word for word in destination.split() if word.lower() not in exclude_words])
+        if has_letter and _ROUTE_MARKER_RE.search(l) and _ROUTE_ANY_RE.search(l):
+            for pattern in _ROUTE_PATTERNS:
+                match = pattern.search(l)
+                if match:
+                    origin = match.group(1).strip()
+                    destination = match.group(2).strip()
                     
-                    if origin_clean and destination_clean:
-                        origin = origin_clean
-                        destination = destination_clean
-                        logger.debug(f"Найден маршрут: {origin} -> {destination}")
-                        break
-        
-        # Ищем тип транспорта
-        transport_type = "auto"  # по умолчанию
-        l_lower = l.lower()
-        
-        # Железнодорожный транспорт
-        if any(word in l_lower for word in ['жд', 'железнодорожный', 'rail', 'fob.rail', 'lcl.rail', 'station', 'coc']):
-            transport_type = "rail"
-        # Морской транспорт
-        elif any(word in l_lower for word in ['море', 'морской', 'sea', 'fcl', 'pol', 'pop', 'port', 'carrier', 'feeder']):
-            transport_type = "sea"
-        # Авиатранспорт
-        elif any(word in l_lower for word in ['авиа', 'воздушный', 'air', 'peking', 'pek', 'svo', 'quotation']):
-            transport_type = "air"
-        # Мультимодальный
-        elif any(word in l_lower for word in ['мульти', 'multimodal', 'mmp']):
-            transport_type = "multimodal"
-        # Автомобильный (по умолчанию)
-        elif any(word in l_lower for word in ['авто', 'автомобильный', 'truck', 'ftl', 'ltl', 'trucking', 'door-to-door']):
-            transport_type = "auto"
+                    # Фильтруем слишком короткие или нерелевантные названия
+                    if len(origin) > 2 and len(destination) > 2:
+                        # Убираем общие слова
+                        origin_clean = ' '.join([word for word in origin.split() if word.lower() not in _ROUTE_EXCLUDE_WORDS])
+                        destination_clean = ' '.join([word for word in destination.split() if word.lower() not in _ROUTE_EXCLUDE_WORDS])
+                        
+                        if origin_clean and destination_clean:
+                            origin = origin_clean
+                            destination = destination_clean
+                            if debug:
+                                logger.debug("Найден маршрут: %s -> %s", origin, destination)
+                            break
         
         # Если нашли хотя бы цену или маршрут, создаем запись
         if price_usd or price_rub or (origin and destination):
+            transport_type = _detect_line_transport(l.lower())
             row = {
                 "transport_type": transport_type,
                 "basis": "EXW",
@@ -658,38 +1294,49 @@ def _extract_freestyle_text(text: str) -> List[Dict[str, Any]]:
     return rows
 
 
+# Ключевые слова вида транспорта; порядок важен для частичного совпадения
+_TRANSPORT_MAPPING = {
+    # Автомобильный транспорт
+    "авто": "auto", "автомобильный": "auto", "автомобиль": "auto", "truck": "auto", "автомобильная": "auto",
+    "ftl": "auto", "ltl": "auto", "trucking": "auto", "door-to-door": "auto",
+    
+    # Железнодорожный транспорт
+    "жд": "rail", "железнодорожный": "rail", "железная дорога": "rail", "rail": "rail", "railway": "rail", 
+    "железнодорожная": "rail", "fob.rail": "rail", "lcl.rail": "rail", "station": "rail", "coc": "rail",
+    
+    # Морской транспорт
+    "море": "sea", "морской": "sea", "морская": "sea", "sea": "sea", "ocean": "sea",
+    "fcl": "sea", "pol": "sea", "pop": "sea", "port": "sea", "carrier": "sea", "feeder": "sea",
+    
+    # Мультимодальный транспорт
+    "мульти": "multimodal", "мультимодальный": "multimodal", "мультимодальная": "multimodal", 
+    "multimodal": "multimodal", "mmp": "multimodal",
+    
+    # Авиатранспорт
+    "авиа": "air", "авиационный": "air", "авиационная": "air", "air": "air", "airfreight": "air",
+    "peking": "air", "pek": "air", "svo": "air", "quotation": "air",
+}
+
+
 def _map_transport(transport: str) -> str:
     if not transport:
         return "auto"
-    t = str(transport).lower().strip()
-    mapping = {
-        # Автомобильный транспорт
-        "авто": "auto", "автомобильный": "auto", "автомобиль": "auto", "truck": "auto", "автомобильная": "auto",
-        "ftl": "auto", "ltl": "auto", "trucking": "auto", "door-to-door": "auto",
-        
-        # Железнодорожный транспорт
-        "жд": "rail", "железнодорожный": "rail", "железная дорога": "rail", "rail": "rail", "railway": "rail", 
-        "железнодорожная": "rail", "fob.rail": "rail", "lcl.rail": "rail", "station": "rail", "coc": "rail",
-        
-        # Морской транспорт
-        "море": "sea", "морской": "sea", "морская": "sea", "sea": "sea", "ocean": "sea",
-        "fcl": "sea", "pol": "sea", "pop": "sea", "port": "sea", "carrier": "sea", "feeder": "sea",
-        
-        # Мультимодальный транспорт
-        "мульти": "multimodal", "мультимодальный": "multimodal", "мультимодальная": "multimodal", 
-        "multimodal": "multimodal", "mmp": "multimodal",
-        
-        # Авиатранспорт
-        "авиа": "air", "авиационный": "air", "авиационная": "air", "air": "air", "airfreight": "air",
-        "peking": "air", "pek": "air", "svo": "air", "quotation": "air",
-    }
-    
+    return _map_transport_value(str(transport).lower().strip())
+
+
+@lru_cache(maxsize=1024)
+def _map_transport_value(t: str) -> str:
+    """
+    Сопоставление нормализованного значения с видом транспорта.
+    Значения в колонке повторяются из строки в строку, поэтому результат
+    кэшируется и перебор ключей выполняется один раз на значение.
+    """
     # Проверяем точное совпадение
-    if t in mapping:
-        return mapping[t]
+    if t in _TRANSPORT_MAPPING:
+        return _TRANSPORT_MAPPING[t]
     
     # Проверяем частичное совпадение
-    for key, value in mapping.items():
+    for key, value in _TRANSPORT_MAPPING.items():
         if key in t or t in key:
             return value
     
@@ -714,6 +1361,43 @@ def _int_or_none(v) -> int:
         return None
 
 
+# Форматы дат "%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d", "%d.%m.%y", "%d/%m/%y" и
+# "%y-%m-%d" одним выражением. Поля записаны так же, как их разбирает
+# datetime.strptime; форматы различаются разделителем и длиной года,
+# поэтому строка подходит не более чем к одному из них
+_DATE_DAY = r"(?P<d{0}>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])"
+_DATE_MONTH = r"(?P<m{0}>1[0-2]|0[1-9]|[1-9])"
+_DATE_RE = re.compile("|".join(
+    "(?:" + pattern.format(index) + ")"
+    for index, pattern in enumerate((
+        _DATE_DAY + r"\." + _DATE_MONTH + r"\.(?P<Y{0}>\d\d\d\d)",
+        _DATE_DAY + "/" + _DATE_MONTH + r"/(?P<Y{0}>\d\d\d\d)",
+        r"(?P<Y{0}>\d\d\d\d)-" + _DATE_MONTH + "-" + _DATE_DAY,
+        _DATE_DAY + r"\." + _DATE_MONTH + r"\.(?P<y{0}>\d\d)",
+        _DATE_DAY + "/" + _DATE_MONTH + r"/(?P<y{0}>\d\d)",
+        r"(?P<y{0}>\d\d)-" + _DATE_MONTH + "-" + _DATE_DAY,
+    ))
+), re.IGNORECASE)
+
+
+def _parse_date_string(s: str) -> Optional[datetime]:
+    """Дата из строки одного из форматов _DATE_RE; None, если строка не подходит."""
+    match = _DATE_RE.fullmatch(s)
+    if match is None:
+        return None
+    groups = {name[0]: value for name, value in match.groupdict().items() if value is not None}
+    if "Y" in groups:
+        year = int(groups["Y"])
+    else:
+        # Двузначный год - по правилам strptime: 69-99 -> 19xx, 00-68 -> 20xx
+        year = int(groups["y"])
+        year += 2000 if year <= 68 else 1900
+    try:
+        return datetime(year, int(groups["m"]), int(groups["d"]))
+    except ValueError:
+        return None
+
+
 def _date_or_none(v) -> str:
     if v is None:
         return None
@@ -722,14 +1406,9 @@ def _date_or_none(v) -> str:
             s = v.strip()
             if not s:
                 return None
-            for fmt in ("%d.%m.%Y", "%d/%m/%Y", "%Y-%m-%d", "%d.%m.%y", "%d/%m/%y", "%y-%m-%d"):
-                try:
-                    return datetime.strptime(s, fmt).strftime("%Y-%m-%d")
-                except ValueError:
-                    continue
-            return s
+            date = _parse_date_string(s)
+            return date.strftime("%Y-%m-%d") if date is not None else s
         # На всякий случай возвращаем строковое представление
         return str(v)
     except Exception:
         return None
-
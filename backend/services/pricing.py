@@ -1,15 +1,38 @@
 from __future__ import annotations
 
 from math import ceil
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Пакетный расчет компилируется numba, если она установлена;
+# без нее используются векторные операции NumPy
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+# Значения, которые считаются пустыми (нет данных)
+_EMPTY = frozenset((None, "", "None"))
+
+# Ошибки преобразования значения в число
+_CONVERSION_ERRORS = (TypeError, ValueError, OverflowError)
+
+
+def _is_empty(value: Any) -> bool:
+    try:
+        return value in _EMPTY
+    except TypeError:  # нехешируемое значение не бывает пустым
+        return False
 
 
 def to_float(value: Any, default: float = 0.0) -> float:
     try:
-        if value in (None, "", "None"):
+        if value in _EMPTY:
             return default
         return float(value)
-    except Exception:
+    except _CONVERSION_ERRORS:
         return default
 
 
@@ -19,21 +42,21 @@ def format_number(n: Optional[float], digits: int = 0) -> str:
     try:
         fmt = f"{n:,.{digits}f}"
         return fmt.replace(",", " ")
-    except Exception:
+    except (TypeError, ValueError):  # строки и прочие нечисловые значения
         return str(n)
 
 
 def coerce_days(value: Any) -> str:
     """Return transit days as integer string; ceil fractional positive values."""
     try:
-        if value in (None, "", "None"):
+        if value in _EMPTY:
             return ""
         v = float(value)
         if v <= 0:
             return ""
         d = int(ceil(v)) if v % 1 != 0 else int(v)
         return str(d)
-    except Exception:
+    except _CONVERSION_ERRORS:
         return ""
 
 
@@ -61,7 +84,21 @@ def calc_air_costs(
     air_usd = pre + t * vw
     rub = th + ap
 
-    # Формировать формулы без нулевых слагаемых
+    air_usd_formula, rub_rub_formula = _air_formulas(pre, t, vw, air_usd, th, ap, rub)
+
+    return {
+        "volumetric_weight": vw,
+        "air_cost_usd": air_usd,
+        "rub_cost_rub": rub,
+        "air_usd_formula": air_usd_formula,
+        "rub_rub_formula": rub_rub_formula,
+    }
+
+
+def _air_formulas(
+    pre: float, t: float, vw: float, air_usd: float, th: float, ap: float, rub: float
+) -> Tuple[str, str]:
+    """Формулы расчета авиаперевозки (USD и RUB) без нулевых слагаемых."""
     usd_parts = []
     if pre > 0:
         usd_parts.append(format_number(pre))
@@ -76,23 +113,98 @@ def calc_air_costs(
         rub_parts.append(format_number(ap))
     rub_rub_formula = f"{' + '.join(rub_parts)} = {format_number(rub)}" if rub_parts else ""
 
+    return air_usd_formula, rub_rub_formula
+
+
+if njit is not None:
+    @njit(cache=True, parallel=True)
+    def _air_kernel(w, v, pre, t, th, ap):
+        """Объемный вес, стоимость в USD и RUB за один проход по строкам."""
+        n = w.shape[0]
+        vw = np.empty(n)
+        air_usd = np.empty(n)
+        rub = np.empty(n)
+        for i in prange(n):
+            volume_weight = v[i] * 167.0
+            # Как max(w, v): v берется, только если оно строго больше
+            vw[i] = volume_weight if volume_weight > w[i] else w[i]
+            air_usd[i] = pre[i] + t[i] * vw[i]
+            rub[i] = th[i] + ap[i]
+        return vw, air_usd, rub
+else:
+    def _air_kernel(w, v, pre, t, th, ap):
+        """Объемный вес, стоимость в USD и RUB векторными операциями."""
+        volume_weight = v * 167.0
+        # Как max(w, v): v берется, только если оно строго больше
+        vw = np.where(volume_weight > w, volume_weight, w)
+        return vw, pre + t * vw, th + ap
+
+
+def _to_float_array(values: Sequence[Any]) -> np.ndarray:
+    """Колонка значений в массив float64; пустые и нечисловые значения - 0.0, как в to_float."""
+    # None NumPy молча превращает в NaN, а to_float - в 0.0; такие колонки
+    # преобразуем поэлементно, чтобы пакетный расчет совпадал со скалярным
+    if not any(v is None for v in values):
+        try:
+            return np.asarray(values, dtype=np.float64)
+        except _CONVERSION_ERRORS:
+            pass
+    return np.fromiter((to_float(v) for v in values), dtype=np.float64, count=len(values))
+
+
+def calc_air_costs_batch(
+    weights_kg: Sequence[Any],
+    volumes_m3: Sequence[Any],
+    precarriage_costs: Sequence[Any],
+    air_tariffs: Sequence[Any],
+    terminal_handling_costs: Sequence[Any],
+    auto_pickup_costs: Sequence[Any],
+) -> Dict[str, np.ndarray]:
+    """
+    Расчет авиаперевозки для многих строк сразу (колонки одинаковой длины).
+    Возвращает массивы volumetric_weight, air_cost_usd и rub_cost_rub;
+    формулы не строятся - для нужных строк их дает render_air_formulas.
+    """
+    w = _to_float_array(weights_kg)
+    v = _to_float_array(volumes_m3)
+    pre = _to_float_array(precarriage_costs)
+    t = _to_float_array(air_tariffs)
+    th = _to_float_array(terminal_handling_costs)
+    ap = _to_float_array(auto_pickup_costs)
+    vw, air_usd, rub = _air_kernel(w, v, pre, t, th, ap)
     return {
         "volumetric_weight": vw,
         "air_cost_usd": air_usd,
         "rub_cost_rub": rub,
-        "air_usd_formula": air_usd_formula,
-        "rub_rub_formula": rub_rub_formula,
+        "precarriage_cost": pre,
+        "air_tariff": t,
+        "terminal_handling_cost": th,
+        "auto_pickup_cost": ap,
     }
 
 
+def render_air_formulas(batch: Dict[str, np.ndarray], index: int) -> Dict[str, str]:
+    """Формулы строки index результата calc_air_costs_batch (только для отображаемых строк)."""
+    air_usd_formula, rub_rub_formula = _air_formulas(
+        float(batch["precarriage_cost"][index]),
+        float(batch["air_tariff"][index]),
+        float(batch["volumetric_weight"][index]),
+        float(batch["air_cost_usd"][index]),
+        float(batch["terminal_handling_cost"][index]),
+        float(batch["auto_pickup_cost"][index]),
+        float(batch["rub_cost_rub"][index]),
+    )
+    return {"air_usd_formula": air_usd_formula, "rub_rub_formula": rub_rub_formula}
+
+
 # Заглушки/сумматоры для других типов при отсутствии разбиения на составляющие в данных
 def calc_sum_rub(*parts: Any) -> float:
-    return sum(to_float(p) for p in parts if p not in (None, "", "None"))
+    return sum(to_float(p) for p in parts if not _is_empty(p))
 
 
 def build_formula(parts: Any, total: Optional[float]) -> str:
     """Строит строку вида: a + b + c = total, пропуская пустые части."""
-    nums = [to_float(p) for p in parts if p not in (None, "", "None")]
+    nums = [to_float(p) for p in parts if not _is_empty(p)]
     if not nums:
         return ""
     left = " + ".join(format_number(n) for n in nums)
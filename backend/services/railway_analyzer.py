@@ -5,9 +5,91 @@
 """
 
 import re
-from typing import Dict, List, Optional, Any
+import threading
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Any
 from services.adaptive_analyzer import analyze_tariff_text_adaptive
 
+# Aho-Corasick находит все названия городов за один проход по тексту;
+# если pyahocorasick не установлен, используем регулярное выражение
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Сколько маршрутов возвращает extract_railway_routes: как только они
+# набраны, остальной текст не просматривается
+_MAX_ROUTES = 10
+
+# Город -> страна для маршрутов ЖД
+_CITY_TO_COUNTRY = {
+    **dict.fromkeys([
+        'Шанхай', 'Гуанчжоу', 'Шэньчжэнь', 'Нинбо', 'Тяньцзинь', 'Циндао', 'Далянь', 'Пекин',
+        'Чунцин', 'Чэнду', 'Сиань', 'Чжэнчжоу', 'Хэфэй', 'Вэньчжоу', 'Вэйфан', 'Вэйхай',
+        'Сямэнь', 'Сучжоу', 'Шицзячжуан', 'Датянь', 'Чанша', 'Цзэнчэн', 'Шэньян', 'Датун',
+        'Цзяочжоу', 'Цзинань', 'Цзыбо', 'Дэцин', 'Уцзян'
+    ], 'Китай'),
+    **dict.fromkeys([
+        'Москва', 'Санкт-Петербург', 'Екатеринбург', 'Новосибирск', 'Красноярск', 'Ростов',
+        'Владивосток', 'Находка'
+    ], 'Россия'),
+    **dict.fromkeys(['Алматы', 'Астана'], 'Казахстан'),
+    **dict.fromkeys(['Эрлянь', 'Алашанькоу', 'Хоргос'], 'Граница'),
+}
+
+# Число с валютой (USD, RUB или ₽) после или перед ним: "1500 USD",
+# "USD 1500". Валюта после числа важнее валюты перед ним. Одно выражение
+# вместо отдельного поиска каждого вида - ячейка просматривается один раз
+_PRICE_RE = re.compile(
+    r'(?:(?P<prefix>USD|RUB|₽)\s*)?(?P<amount>\d+)(?:\s*(?P<suffix>USD|RUB|₽))?',
+    re.IGNORECASE
+)
+
+
+def _scan_price(part: str) -> tuple:
+    """
+    Возвращает (usd, rub) из ячейки - первые найденные цены каждого вида
+    или None. Цена со знаком ₽ имеет приоритет над ценой с RUB.
+    """
+    usd = rub = rub_symbol = None
+    for match in _PRICE_RE.finditer(part):
+        currency = match.group('suffix') or match.group('prefix')
+        if not currency:
+            continue
+        currency = currency.upper()
+        if currency == 'USD':
+            if usd is None:
+                usd = float(match.group('amount'))
+        elif currency == 'RUB':
+            if rub is None:
+                rub = float(match.group('amount'))
+        elif rub_symbol is None:
+            rub_symbol = float(match.group('amount'))
+        if usd is not None and rub_symbol is not None:
+            break
+    return usd, rub_symbol if rub_symbol is not None else rub
+
+
+def _iter_pipe_lines(text: str) -> Iterator[str]:
+    """
+    Перебирает строки текста, в которых есть '|'.
+    
+    Строки без разделителя колонок пропускаются поиском по тексту,
+    без разбиения всего текста на список строк.
+    """
+    pos = 0
+    while True:
+        pipe = text.find('|', pos)
+        if pipe < 0:
+            return
+        start = text.rfind('\n', 0, pipe) + 1
+        end = text.find('\n', pipe)
+        if end < 0:
+            end = len(text)
+        yield text[start:end]
+        pos = end + 1
+
+
 class RailwayAnalyzer:
     """Специализированный анализатор для железнодорожных тарифов."""
     
@@ -94,42 +176,102 @@ class RailwayAnalyzer:
             'Алашанькоу': ['Alashankou', 'ALASHANKOU'],
             'Хоргос': ['Khorgos', 'KHORGOS']
         }
+        
+        # Скомпилированные паттерны: поиск идет по ним, без обращения
+        # к кэшу модуля re при каждом вызове
+        self.railway_patterns_compiled = {
+            key: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for key, patterns in self.railway_patterns.items()
+        }
+        self._container_res = self.railway_patterns_compiled['containers']
+        
+        # Вариант написания (в нижнем регистре) -> нормализованный город.
+        # Варианты добавляются в порядке словарей, поэтому при совпадении
+        # побеждает город, который раньше проверялся в цикле по словарям
+        self._variant_to_canonical = {}
+        for canonical, variants in list(self.railway_stations.items()) + list(self.borders.items()):
+            for variant in variants:
+                self._variant_to_canonical.setdefault(variant.lower(), canonical)
+            self._variant_to_canonical.setdefault(canonical.lower(), canonical)
+        self._stopwords = frozenset([
+            'loading', 'departure', 'destination', 'station', 'place',
+            'location', 'door', 'to', 'from', 'via', 'border'
+        ])
+        
+        # В таблицах одни и те же названия повторяются из строки в строку,
+        # поэтому нормализация кэшируется. Кэш принадлежит экземпляру:
+        # lru_cache на методе класса удерживал бы self
+        self._normalize_city_name = lru_cache(maxsize=4096)(self._normalize_city_name_uncached)
+        
+        # Названия городов, затем станций (в нижнем регистре) в порядке
+        # приоритета -> город. Одно выражение находит их за один проход по
+        # тексту; lookahead позволяет видеть перекрывающиеся названия
+        self._city_tokens = {}
+        for canonical in self.railway_stations:
+            self._city_tokens.setdefault(canonical.lower(), canonical)
+        for canonical, stations in self.railway_stations.items():
+            for station in stations:
+                self._city_tokens.setdefault(station.lower(), canonical)
+        self._city_token_priority = {token: index for index, token in enumerate(self._city_tokens)}
+        self._city_tokens_re = re.compile(
+            '(?=(' + '|'.join(re.escape(token) for token in self._city_tokens) + '))'
+        )
+        if ahocorasick is not None:
+            self._city_automaton = ahocorasick.Automaton()
+            for token, canonical in self._city_tokens.items():
+                self._city_automaton.add_word(token, (self._city_token_priority[token], canonical))
+            self._city_automaton.make_automaton()
+        else:
+            self._city_automaton = None
     
     def extract_railway_routes(self, text: str) -> List[Dict]:
         """Извлекает железнодорожные маршруты."""
         routes = []
+        # Пары (откуда, куда), уже попавшие в результат: повторный маршрут
+        # пропускается до поиска цен и определения стран
+        seen = set()
         
-        # Обрабатываем табличные данные
-        lines = text.split('\n')
-        for line in lines:
-            if '|' in line:
-                # Табличная строка
+        # Обрабатываем табличные данные (строки хотя бы с тремя колонками)
+        if '|' in text:
+            for line in _iter_pipe_lines(text):
+                if line.count('|') < 2:
+                    continue
                 parts = [p.strip() for p in line.split('|')]
-                if len(parts) >= 3:
-                    # Ищем города в первых колонках
-                    origin = self._extract_city_from_text(parts[0])
-                    destination = self._extract_city_from_text(parts[1])
+                
+                # Ищем города в первых колонках; в колонке из цифр или короче
+                # трех символов города быть не может
+                if len(parts[0]) < 3 or parts[0].isdigit():
+                    continue
+                origin = self._extract_city_from_text(parts[0])
+                if not origin:
+                    continue
+                destination = self._extract_city_from_text(parts[1])
+                
+                if destination and origin != destination:
+                    if (origin, destination) in seen:
+                        continue
+                    seen.add((origin, destination))
                     
-                    if origin and destination and origin != destination:
-                        # Ищем цены в остальных колонках
-                        prices = self._extract_prices_from_parts(parts[2:])
-                        
-                        route = {
-                            'origin_city': origin,
-                            'origin_country': self._get_country_by_city(origin),
-                            'destination_city': destination,
-                            'destination_country': self._get_country_by_city(destination),
-                            'transport_type': 'rail',
-                            'price_usd': prices.get('usd'),
-                            'price_rub': prices.get('rub'),
-                            'container_type': self._extract_container_type(line)
-                        }
-                        routes.append(route)
+                    # Ищем цены в остальных колонках
+                    prices = self._extract_prices_from_parts(parts[2:])
+                    
+                    route = {
+                        'origin_city': origin,
+                        'origin_country': self._get_country_by_city(origin),
+                        'destination_city': destination,
+                        'destination_country': self._get_country_by_city(destination),
+                        'transport_type': 'rail',
+                        'price_usd': prices.get('usd'),
+                        'price_rub': prices.get('rub'),
+                        'container_type': self._extract_container_type(line)
+                    }
+                    routes.append(route)
+                    if len(routes) >= _MAX_ROUTES:
+                        return routes
         
         # Обрабатываем текстовые маршруты
-        for pattern in self.railway_patterns['routes']:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
+        for pattern in self.railway_patterns_compiled['routes']:
+            for match in pattern.finditer(text):
                 origin = match.group(1).strip()
                 destination = match.group(2).strip()
                 
@@ -139,6 +281,10 @@ class RailwayAnalyzer:
                     destination = self._normalize_city_name(destination)
                     
                     if origin and destination and origin != destination:
+                        if (origin, destination) in seen:
+                            continue
+                        seen.add((origin, destination))
+                        
                         route = {
                             'origin_city': origin,
                             'origin_country': self._get_country_by_city(origin),
@@ -150,49 +296,55 @@ class RailwayAnalyzer:
                             'container_type': None
                         }
                         routes.append(route)
+                        if len(routes) >= _MAX_ROUTES:
+                            return routes
         
-        return routes[:10]  # Ограничиваем количество
+        return routes
     
-    def _normalize_city_name(self, city: str) -> Optional[str]:
+    def _normalize_city_name_uncached(self, city: str) -> Optional[str]:
         """Нормализует название города."""
-        if not city or city.strip() == '':
+        city = city.strip() if city else city
+        if not city:
             return None
+        city_lower = city.lower()
         
-        city = city.strip()
-        
-        # Проверяем известные города
-        for normalized_city, variants in self.railway_stations.items():
-            if city.lower() in [v.lower() for v in variants] or city.lower() == normalized_city.lower():
-                return normalized_city
-        
-        # Проверяем границы
-        for border, variants in self.borders.items():
-            if city.lower() in [v.lower() for v in variants] or city.lower() == border.lower():
-                return border
+        # Проверяем известные города и границы
+        normalized_city = self._variant_to_canonical.get(city_lower)
+        if normalized_city:
+            return normalized_city
         
         # Если не нашли, возвращаем как есть (если это похоже на город)
-        if len(city) > 2 and not city.isdigit() and not city.lower() in ['loading', 'departure', 'destination', 'station', 'place', 'location', 'door', 'to', 'from', 'via', 'border']:
+        if len(city) > 2 and not city.isdigit() and city_lower not in self._stopwords:
             return city
         
         return None
     
     def _extract_city_from_text(self, text: str) -> Optional[str]:
         """Извлекает название города из текста."""
-        if not text or text.strip() == '':
+        text = text.strip() if text else text
+        if not text:
             return None
+        text_lower = text.lower()
         
-        text = text.strip()
-        
-        # Проверяем известные города
-        for city in self.railway_stations.keys():
-            if city.lower() in text.lower():
-                return city
-        
-        # Проверяем станции
-        for city, stations in self.railway_stations.items():
-            for station in stations:
-                if station.lower() in text.lower():
-                    return city
+        # Ищем известные города, затем станции: из всех найденных названий
+        # берется первое по приоритету
+        best_priority, best_city = len(self._city_tokens), None
+        if self._city_automaton is not None:
+            for _, (priority, city) in self._city_automaton.iter(text_lower):
+                if priority < best_priority:
+                    best_priority, best_city = priority, city
+                    if priority == 0:
+                        break
+        else:
+            for match in self._city_tokens_re.finditer(text_lower):
+                token = match.group(1)
+                priority = self._city_token_priority[token]
+                if priority < best_priority:
+                    best_priority, best_city = priority, self._city_tokens[token]
+                    if priority == 0:
+                        break
+        if best_city:
+            return best_city
         
         # Если не нашли, возвращаем как есть (если это похоже на город)
         if len(text) > 2 and not text.isdigit():
@@ -209,31 +361,23 @@ class RailwayAnalyzer:
             if not part:
                 continue
             
-            # Ищем USD
-            usd_match = re.search(r'(\d+)\s*USD', part, re.IGNORECASE)
-            if usd_match:
-                prices['usd'] = float(usd_match.group(1))
-            
-            # Ищем RUB
-            rub_match = re.search(r'(\d+)\s*RUB', part, re.IGNORECASE)
-            if rub_match:
-                prices['rub'] = float(rub_match.group(1))
+            # Ищем USD, RUB и ₽ за один проход
+            usd, rub = _scan_price(part)
+            if usd is not None:
+                prices['usd'] = usd
+            if rub is not None:
+                prices['rub'] = rub
             
-            # Ищем ₽
-            rub_symbol_match = re.search(r'(\d+)\s*₽', part)
-            if rub_symbol_match:
-                prices['rub'] = float(rub_symbol_match.group(1))
-            
-            # Если это просто число, предполагаем RUB
-            if part.isdigit() and not prices['rub']:
+            # Если это просто число и цены в рублях еще нет, предполагаем RUB
+            if part.isdigit() and prices['rub'] is None:
                 prices['rub'] = float(part)
         
         return prices
     
     def _extract_container_type(self, text: str) -> Optional[str]:
         """Извлекает тип контейнера."""
-        for pattern in self.railway_patterns['containers']:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in self._container_res:
+            match = pattern.search(text)
             if match:
                 return match.group(0).strip()
         return None
@@ -243,25 +387,7 @@ class RailwayAnalyzer:
         if not city:
             return 'Неизвестно'
         
-        # Китайские города
-        chinese_cities = ['Шанхай', 'Гуанчжоу', 'Шэньчжэнь', 'Нинбо', 'Тяньцзинь', 'Циндао', 'Далянь', 'Пекин', 'Чунцин', 'Чэнду', 'Сиань', 'Чжэнчжоу', 'Хэфэй', 'Вэньчжоу', 'Вэйфан', 'Вэйхай', 'Сямэнь', 'Сучжоу', 'Шицзячжуан', 'Датянь', 'Чанша', 'Цзэнчэн', 'Шэньян', 'Датун', 'Цзяочжоу', 'Цзинань', 'Цзыбо', 'Дэцин', 'Уцзян']
-        if city in chinese_cities:
-            return 'Китай'
-        
-        # Российские города
-        russian_cities = ['Москва', 'Санкт-Петербург', 'Екатеринбург', 'Новосибирск', 'Красноярск', 'Ростов', 'Владивосток', 'Находка']
-        if city in russian_cities:
-            return 'Россия'
-        
-        # Казахстан
-        if city in ['Алматы', 'Астана']:
-            return 'Казахстан'
-        
-        # Границы
-        if city in ['Эрлянь', 'Алашанькоу', 'Хоргос']:
-            return 'Граница'
-        
-        return 'Неизвестно'
+        return _CITY_TO_COUNTRY.get(city, 'Неизвестно')
     
     def analyze_railway_file(self, text: str, file_path: str) -> Dict[str, Any]:
         """Анализирует железнодорожный файл."""
@@ -309,7 +435,23 @@ class RailwayAnalyzer:
         
         return cleaned[:10]
 
+# Общий анализатор для analyze_railway_file: таблицы городов и регулярные
+# выражения строятся один раз, а не при каждом вызове. Между вызовами
+# анализатор не меняет своего состояния
+_ANALYZER: Optional[RailwayAnalyzer] = None
+_ANALYZER_LOCK = threading.Lock()
+
+
+def _get_analyzer() -> RailwayAnalyzer:
+    """Возвращает общий экземпляр анализатора ЖД тарифов."""
+    global _ANALYZER
+    if _ANALYZER is None:
+        with _ANALYZER_LOCK:
+            if _ANALYZER is None:
+                _ANALYZER = RailwayAnalyzer()
+    return _ANALYZER
+
+
 def analyze_railway_file(text: str, file_path: str) -> Dict[str, Any]:
     """Универсальная функция анализа железнодорожного файла."""
-    analyzer = RailwayAnalyzer()
-    return analyzer.analyze_railway_file(text, file_path)
+    return _get_analyzer().analyze_railway_file(text, file_path)
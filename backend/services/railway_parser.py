@@ -12,6 +12,14 @@ from services.railway_analyzer import RailwayAnalyzer
 
 logger = logging.getLogger(__name__)
 
+# Ключевые слова ЖД транспорта одним выражением: текст просматривается
+# один раз вместо отдельного поиска каждого слова
+_RAILWAY_KEYWORDS_RE = re.compile('|'.join(re.escape(keyword) for keyword in (
+    'железнодорожн', 'жд', 'railway', 'rail', 'train', 'вагон', 'контейнер',
+    'станция', 'station', '20dc', '40hc', '20gp', '40gp', 'экспресс', 'express',
+    'электричка', 'локомотив', 'поезд', 'рельс', 'путь', 'перегон'
+)))
+
 class RailwayParser(BaseParser):
     """Специализированный парсер для железнодорожных тарифов."""
     
@@ -69,22 +77,26 @@ class RailwayParser(BaseParser):
             origin_city = data.get('origin_city', '')
             destination_city = data.get('destination_city', '')
             price = data.get('price', 0.0)
-            currency = data.get('currency', 'USD')
+            currency = data.get('currency', 'USD').upper()
             
             # Определяем базис (по умолчанию EXW для ЖД)
             basis = data.get('basis', 'EXW')
             
+            description = data.get('description', '')
+            
             # Извлекаем тип вагона/контейнера
             vehicle_type = data.get('vehicle_type', '')
             if not vehicle_type:
                 # Пытаемся определить по контексту
-                if any(keyword in data.get('description', '').lower() for keyword in ['20', '40', 'контейнер']):
-                    vehicle_type = '20DC' if '20' in data.get('description', '') else '40HC'
+                if '20' in description:
+                    vehicle_type = '20DC'
+                elif '40' in description or 'контейнер' in description.lower():
+                    vehicle_type = '40HC'
                 else:
                     vehicle_type = 'вагон'
             
             # Извлекаем время в пути
-            transit_time = self.extract_transit_time(data.get('description', ''))
+            transit_time = self.extract_transit_time(description)
             
             # Создаем стандартный тариф
             tariff = {
@@ -94,8 +106,8 @@ class RailwayParser(BaseParser):
                 'origin_city': origin_city,
                 'destination_city': destination_city,
                 'vehicle_type': vehicle_type,
-                'price_usd': price if currency.upper() == 'USD' else None,
-                'price_rub': price if currency.upper() == 'RUB' else None,
+                'price_usd': price if currency == 'USD' else None,
+                'price_rub': price if currency == 'RUB' else None,
                 'transit_time_days': transit_time,
                 'source_file': source_file,
                 # Специфичные для ЖД поля
@@ -160,30 +172,7 @@ class RailwayParser(BaseParser):
         Returns:
             True если текст содержит ЖД ключевые слова
         """
-        railway_keywords = [
-            'железнодорожн', 'жд', 'railway', 'rail', 'train', 'вагон', 'контейнер',
-            'станция', 'station', '20dc', '40hc', '20gp', '40gp', 'экспресс', 'express',
-            'электричка', 'локомотив', 'поезд', 'рельс', 'путь', 'перегон'
-        ]
-        
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in railway_keywords)
-
-    def detect_rail_keywords(self, text: str) -> bool:
-        """
-        Определяет, содержит ли текст ключевые слова железнодорожного транспорта.
-        
-        Args:
-            text: Текст для анализа
-            
-        Returns:
-            True если текст содержит ЖД ключевые слова
-        """
-        railway_keywords = [
-            'железнодорожн', 'жд', 'railway', 'rail', 'train', 'вагон', 'контейнер',
-            'станция', 'station', '20dc', '40hc', '20gp', '40gp', 'экспресс', 'express',
-            'электричка', 'локомотив', 'поезд', 'рельс', 'путь', 'перегон'
-        ]
-        
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in railway_keywords)
+        return _RAILWAY_KEYWORDS_RE.search(text.lower()) is not None
+    
+    # Прежнее имя метода
+    detect_rail_keywords = detect_railway_keywords
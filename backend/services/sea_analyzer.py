@@ -5,12 +5,245 @@
 """
 
 import re
-from typing import Dict, List, Optional, Any
+import threading
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Any
 from services.adaptive_analyzer import analyze_tariff_text_adaptive
 
+# Aho-Corasick находит все названия портов за один проход по тексту;
+# если pyahocorasick не установлен, используем регулярное выражение
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Число с валютой после него: USD, CNY/RMB или RUB/₽. Одно выражение вместо
+# отдельного поиска каждой валюты - ячейка просматривается один раз, а
+# сработавшая группа (lastgroup) показывает валюту
+_PRICE_RE = re.compile(
+    r'(?P<amount>\d+(?:\.\d+)?)\s*(?:(?P<usd>USD)|(?P<cny>CNY|RMB)|(?P<rub>RUB|₽))',
+    re.IGNORECASE
+)
+
+# Город/порт -> страна для морских маршрутов
+_CITY_TO_COUNTRY = {
+    **dict.fromkeys([
+        'Шанхай', 'Shanghai', 'Нинбо', 'Ningbo', 'Циндао', 'Qingdao', 'Тяньцзинь', 'Tianjin',
+        'Далянь', 'Dalian', 'Синган', 'Xingang', 'Яньтянь', 'Yantian', 'Шэкоу', 'Shekou',
+        'Наньша', 'Nansha', 'Гуанчжоу', 'Guangzhou', 'Шэньчжэнь', 'Shenzhen', 'Сямэнь', 'Xiamen',
+        'Фучжоу', 'Fuzhou', 'Вэньчжоу', 'Wenzhou', 'Наньтун', 'Nantong', 'Чжанцзяган', 'Zhangjiagang',
+        'Ляньюньган', 'Lianyungang', 'Яньтай', 'Yantai', 'Вэйхай', 'Weihai', 'Циньхуандао', 'Qinhuangdao',
+        'Гонконг', 'Hong Kong'
+    ], 'Китай'),
+    **dict.fromkeys([
+        'Владивосток', 'Vladivostok', 'Восточный', 'Vostochny', 'Находка', 'Nakhodka',
+        'Санкт-Петербург', 'St. Petersburg', 'Калининград', 'Kaliningrad', 'Новороссийск', 'Novorossiysk',
+        'Ростов-на-Дону', 'Rostov', 'Астрахань', 'Astrakhan', 'Мурманск', 'Murmansk',
+        'Архангельск', 'Arkhangelsk'
+    ], 'Россия'),
+    **dict.fromkeys(['Пусан', 'Busan'], 'Южная Корея'),
+    **dict.fromkeys(['Сингапур', 'Singapore'], 'Сингапур'),
+    **dict.fromkeys(['Роттердам', 'Rotterdam'], 'Нидерланды'),
+    **dict.fromkeys(['Гамбург', 'Hamburg'], 'Германия'),
+    **dict.fromkeys(['Антверпен', 'Antwerp'], 'Бельгия'),
+    **dict.fromkeys(['Феликстоу', 'Felixstowe'], 'Великобритания'),
+    **dict.fromkeys([
+        'Лос-Анджелес', 'Los Angeles', 'Лонг-Бич', 'Long Beach', 'Нью-Йорк', 'New York',
+        'Саванна', 'Savannah'
+    ], 'США'),
+}
+
+# Сколько маршрутов возвращает extract_sea_routes: как только они
+# набраны, остальной текст не просматривается
+_MAX_ROUTES = 10
+
+# Слова, которые не могут быть названием порта
+_PORT_STOPWORDS = frozenset(['from', 'to', 'via', 'through', 'route', 'port', 'terminal'])
+
+
+def _iter_pipe_lines(text: str) -> Iterator[str]:
+    """
+    Перебирает строки текста, в которых есть '|'.
+    
+    Строки без разделителя колонок пропускаются поиском по тексту,
+    без разбиения всего текста на список строк.
+    """
+    pos = 0
+    while True:
+        pipe = text.find('|', pos)
+        if pipe < 0:
+            return
+        start = text.rfind('\n', 0, pipe) + 1
+        end = text.find('\n', pipe)
+        if end < 0:
+            end = len(text)
+        yield text[start:end]
+        pos = end + 1
+
+
 class SeaAnalyzer:
     """Специализированный анализатор для морских тарифов."""
     
+    # Морские порты и города. Таблицы общие для всех экземпляров: они
+    # создаются один раз при определении класса и не изменяются
+    sea_ports = {
+        # Китайские порты
+        'SHANGHAI': 'Шанхай',
+        'NINGBO': 'Нинбо',
+        'QINGDAO': 'Циндао',
+        'TIANJIN': 'Тяньцзинь',
+        'DALIAN': 'Далянь',
+        'XINGANG': 'Синган',
+        'YANTIAN': 'Яньтянь',
+        'SHEKOU': 'Шэкоу',
+        'NANSHA': 'Наньша',
+        'GUANGZHOU': 'Гуанчжоу',
+        'SHENZHEN': 'Шэньчжэнь',
+        'XIAMEN': 'Сямэнь',
+        'FUZHOU': 'Фучжоу',
+        'WENZHOU': 'Вэньчжоу',
+        'NANTONG': 'Наньтун',
+        'ZHANGJIAGANG': 'Чжанцзяган',
+        'LIANYUNGANG': 'Ляньюньган',
+        'YANTAI': 'Яньтай',
+        'WEIHAI': 'Вэйхай',
+        'QINHUANGDAO': 'Циньхуандао',
+        
+        # Российские порты
+        'VVO': 'Владивосток',
+        'Vladivostok': 'Владивосток',
+        'VYP': 'Восточный',
+        'Vostochny': 'Восточный',
+        'NLE': 'Находка',
+        'Nakhodka': 'Находка',
+        'SPB': 'Санкт-Петербург',
+        'St. Petersburg': 'Санкт-Петербург',
+        'FCT': 'Санкт-Петербург',
+        'PLP': 'Санкт-Петербург',
+        'KALININGRAD': 'Калининград',
+        'Kaliningrad': 'Калининград',
+        'NOVOROSSIYSK': 'Новороссийск',
+        'Novorossiysk': 'Новороссийск',
+        'ROSTOV': 'Ростов-на-Дону',
+        'Rostov': 'Ростов-на-Дону',
+        'ASTRAKHAN': 'Астрахань',
+        'Astrakhan': 'Астрахань',
+        'MURMANSK': 'Мурманск',
+        'Murmansk': 'Мурманск',
+        'ARKHANGELSK': 'Архангельск',
+        'Arkhangelsk': 'Архангельск',
+        
+        # Международные порты
+        'BUSAN': 'Пусан',
+        'Busan': 'Пусан',
+        'SINGAPORE': 'Сингапур',
+        'Singapore': 'Сингапур',
+        'HONG KONG': 'Гонконг',
+        'Hong Kong': 'Гонконг',
+        'ROTTERDAM': 'Роттердам',
+        'Rotterdam': 'Роттердам',
+        'HAMBURG': 'Гамбург',
+        'Hamburg': 'Гамбург',
+        'ANTWERP': 'Антверпен',
+        'Antwerp': 'Антверпен',
+        'FELIXSTOWE': 'Феликстоу',
+        'Felixstowe': 'Феликстоу',
+        'LOS ANGELES': 'Лос-Анджелес',
+        'Los Angeles': 'Лос-Анджелес',
+        'LONG BEACH': 'Лонг-Бич',
+        'Long Beach': 'Лонг-Бич',
+        'NEW YORK': 'Нью-Йорк',
+        'New York': 'Нью-Йорк',
+        'SAVANNAH': 'Саванна',
+        'Savannah': 'Саванна',
+    }
+    
+    # Города и их порты
+    city_ports = {
+        'Шанхай': 'SHANGHAI',
+        'Shanghai': 'SHANGHAI',
+        'Нинбо': 'NINGBO',
+        'Ningbo': 'NINGBO',
+        'Циндао': 'QINGDAO',
+        'Qingdao': 'QINGDAO',
+        'Тяньцзинь': 'TIANJIN',
+        'Tianjin': 'TIANJIN',
+        'Далянь': 'DALIAN',
+        'Dalian': 'DALIAN',
+        'Синган': 'XINGANG',
+        'Xingang': 'XINGANG',
+        'Яньтянь': 'YANTIAN',
+        'Yantian': 'YANTIAN',
+        'Шэкоу': 'SHEKOU',
+        'Shekou': 'SHEKOU',
+        'Наньша': 'NANSHA',
+        'Nansha': 'NANSHA',
+        'Гуанчжоу': 'GUANGZHOU',
+        'Guangzhou': 'GUANGZHOU',
+        'Шэньчжэнь': 'SHENZHEN',
+        'Shenzhen': 'SHENZHEN',
+        'Сямэнь': 'XIAMEN',
+        'Xiamen': 'XIAMEN',
+        'Фучжоу': 'FUZHOU',
+        'Fuzhou': 'FUZHOU',
+        'Вэньчжоу': 'WENZHOU',
+        'Wenzhou': 'WENZHOU',
+        'Наньтун': 'NANTONG',
+        'Nantong': 'NANTONG',
+        'Чжанцзяган': 'ZHANGJIAGANG',
+        'Zhangjiagang': 'ZHANGJIAGANG',
+        'Ляньюньган': 'LIANYUNGANG',
+        'Lianyungang': 'LIANYUNGANG',
+        'Яньтай': 'YANTAI',
+        'Yantai': 'YANTAI',
+        'Вэйхай': 'WEIHAI',
+        'Weihai': 'WEIHAI',
+        'Циньхуандао': 'QINHUANGDAO',
+        'Qinhuangdao': 'QINHUANGDAO',
+        'Владивосток': 'VVO',
+        'Vladivostok': 'VVO',
+        'Восточный': 'VYP',
+        'Vostochny': 'VYP',
+        'Находка': 'NLE',
+        'Nakhodka': 'NLE',
+        'Санкт-Петербург': 'SPB',
+        'St. Petersburg': 'SPB',
+        'Калининград': 'KALININGRAD',
+        'Kaliningrad': 'KALININGRAD',
+        'Новороссийск': 'NOVOROSSIYSK',
+        'Novorossiysk': 'NOVOROSSIYSK',
+        'Ростов-на-Дону': 'ROSTOV',
+        'Rostov': 'ROSTOV',
+        'Астрахань': 'ASTRAKHAN',
+        'Astrakhan': 'ASTRAKHAN',
+        'Мурманск': 'MURMANSK',
+        'Murmansk': 'MURMANSK',
+        'Архангельск': 'ARKHANGELSK',
+        'Arkhangelsk': 'ARKHANGELSK',
+        'Пусан': 'BUSAN',
+        'Busan': 'BUSAN',
+        'Сингапур': 'SINGAPORE',
+        'Singapore': 'SINGAPORE',
+        'Гонконг': 'HONG KONG',
+        'Hong Kong': 'HONG KONG',
+        'Роттердам': 'ROTTERDAM',
+        'Rotterdam': 'ROTTERDAM',
+        'Гамбург': 'HAMBURG',
+        'Hamburg': 'HAMBURG',
+        'Антверпен': 'ANTWERP',
+        'Antwerp': 'ANTWERP',
+        'Феликстоу': 'FELIXSTOWE',
+        'Felixstowe': 'FELIXSTOWE',
+        'Лос-Анджелес': 'LOS ANGELES',
+        'Los Angeles': 'LOS ANGELES',
+        'Лонг-Бич': 'LONG BEACH',
+        'Long Beach': 'LONG BEACH',
+        'Нью-Йорк': 'NEW YORK',
+        'New York': 'NEW YORK',
+        'Саванна': 'SAVANNAH',
+        'Savannah': 'SAVANNAH',
+    }
+    
     def __init__(self):
         # Специфичные для моря паттерны
         self.sea_patterns = {
@@ -53,201 +286,95 @@ class SeaAnalyzer:
             ]
         }
         
-        # Морские порты и города
-        self.sea_ports = {
-            # Китайские порты
-            'SHANGHAI': 'Шанхай',
-            'NINGBO': 'Нинбо',
-            'QINGDAO': 'Циндао',
-            'TIANJIN': 'Тяньцзинь',
-            'DALIAN': 'Далянь',
-            'XINGANG': 'Синган',
-            'YANTIAN': 'Яньтянь',
-            'SHEKOU': 'Шэкоу',
-            'NANSHA': 'Наньша',
-            'GUANGZHOU': 'Гуанчжоу',
-            'SHENZHEN': 'Шэньчжэнь',
-            'XIAMEN': 'Сямэнь',
-            'FUZHOU': 'Фучжоу',
-            'WENZHOU': 'Вэньчжоу',
-            'NANTONG': 'Наньтун',
-            'ZHANGJIAGANG': 'Чжанцзяган',
-            'LIANYUNGANG': 'Ляньюньган',
-            'YANTAI': 'Яньтай',
-            'WEIHAI': 'Вэйхай',
-            'QINHUANGDAO': 'Циньхуандао',
-            
-            # Российские порты
-            'VVO': 'Владивосток',
-            'Vladivostok': 'Владивосток',
-            'VYP': 'Восточный',
-            'Vostochny': 'Восточный',
-            'NLE': 'Находка',
-            'Nakhodka': 'Находка',
-            'SPB': 'Санкт-Петербург',
-            'St. Petersburg': 'Санкт-Петербург',
-            'FCT': 'Санкт-Петербург',
-            'PLP': 'Санкт-Петербург',
-            'KALININGRAD': 'Калининград',
-            'Kaliningrad': 'Калининград',
-            'NOVOROSSIYSK': 'Новороссийск',
-            'Novorossiysk': 'Новороссийск',
-            'ROSTOV': 'Ростов-на-Дону',
-            'Rostov': 'Ростов-на-Дону',
-            'ASTRAKHAN': 'Астрахань',
-            'Astrakhan': 'Астрахань',
-            'MURMANSK': 'Мурманск',
-            'Murmansk': 'Мурманск',
-            'ARKHANGELSK': 'Архангельск',
-            'Arkhangelsk': 'Архангельск',
-            
-            # Международные порты
-            'BUSAN': 'Пусан',
-            'Busan': 'Пусан',
-            'SINGAPORE': 'Сингапур',
-            'Singapore': 'Сингапур',
-            'HONG KONG': 'Гонконг',
-            'Hong Kong': 'Гонконг',
-            'ROTTERDAM': 'Роттердам',
-            'Rotterdam': 'Роттердам',
-            'HAMBURG': 'Гамбург',
-            'Hamburg': 'Гамбург',
-            'ANTWERP': 'Антверпен',
-            'Antwerp': 'Антверпен',
-            'FELIXSTOWE': 'Феликстоу',
-            'Felixstowe': 'Феликстоу',
-            'LOS ANGELES': 'Лос-Анджелес',
-            'Los Angeles': 'Лос-Анджелес',
-            'LONG BEACH': 'Лонг-Бич',
-            'Long Beach': 'Лонг-Бич',
-            'NEW YORK': 'Нью-Йорк',
-            'New York': 'Нью-Йорк',
-            'SAVANNAH': 'Саванна',
-            'Savannah': 'Саванна',
+        # Скомпилированные паттерны: поиск идет по ним, без обращения
+        # к кэшу модуля re при каждом вызове
+        self.sea_patterns_compiled = {
+            key: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for key, patterns in self.sea_patterns.items()
         }
+        self._container_res = self.sea_patterns_compiled['containers']
         
-        # Города и их порты
-        self.city_ports = {
-            'Шанхай': 'SHANGHAI',
-            'Shanghai': 'SHANGHAI',
-            'Нинбо': 'NINGBO',
-            'Ningbo': 'NINGBO',
-            'Циндао': 'QINGDAO',
-            'Qingdao': 'QINGDAO',
-            'Тяньцзинь': 'TIANJIN',
-            'Tianjin': 'TIANJIN',
-            'Далянь': 'DALIAN',
-            'Dalian': 'DALIAN',
-            'Синган': 'XINGANG',
-            'Xingang': 'XINGANG',
-            'Яньтянь': 'YANTIAN',
-            'Yantian': 'YANTIAN',
-            'Шэкоу': 'SHEKOU',
-            'Shekou': 'SHEKOU',
-            'Наньша': 'NANSHA',
-            'Nansha': 'NANSHA',
-            'Гуанчжоу': 'GUANGZHOU',
-            'Guangzhou': 'GUANGZHOU',
-            'Шэньчжэнь': 'SHENZHEN',
-            'Shenzhen': 'SHENZHEN',
-            'Сямэнь': 'XIAMEN',
-            'Xiamen': 'XIAMEN',
-            'Фучжоу': 'FUZHOU',
-            'Fuzhou': 'FUZHOU',
-            'Вэньчжоу': 'WENZHOU',
-            'Wenzhou': 'WENZHOU',
-            'Наньтун': 'NANTONG',
-            'Nantong': 'NANTONG',
-            'Чжанцзяган': 'ZHANGJIAGANG',
-            'Zhangjiagang': 'ZHANGJIAGANG',
-            'Ляньюньган': 'LIANYUNGANG',
-            'Lianyungang': 'LIANYUNGANG',
-            'Яньтай': 'YANTAI',
-            'Yantai': 'YANTAI',
-            'Вэйхай': 'WEIHAI',
-            'Weihai': 'WEIHAI',
-            'Циньхуандао': 'QINHUANGDAO',
-            'Qinhuangdao': 'QINHUANGDAO',
-            'Владивосток': 'VVO',
-            'Vladivostok': 'VVO',
-            'Восточный': 'VYP',
-            'Vostochny': 'VYP',
-            'Находка': 'NLE',
-            'Nakhodka': 'NLE',
-            'Санкт-Петербург': 'SPB',
-            'St. Petersburg': 'SPB',
-            'Калининград': 'KALININGRAD',
-            'Kaliningrad': 'KALININGRAD',
-            'Новороссийск': 'NOVOROSSIYSK',
-            'Novorossiysk': 'NOVOROSSIYSK',
-            'Ростов-на-Дону': 'ROSTOV',
-            'Rostov': 'ROSTOV',
-            'Астрахань': 'ASTRAKHAN',
-            'Astrakhan': 'ASTRAKHAN',
-            'Мурманск': 'MURMANSK',
-            'Murmansk': 'MURMANSK',
-            'Архангельск': 'ARKHANGELSK',
-            'Arkhangelsk': 'ARKHANGELSK',
-            'Пусан': 'BUSAN',
-            'Busan': 'BUSAN',
-            'Сингапур': 'SINGAPORE',
-            'Singapore': 'SINGAPORE',
-            'Гонконг': 'HONG KONG',
-            'Hong Kong': 'HONG KONG',
-            'Роттердам': 'ROTTERDAM',
-            'Rotterdam': 'ROTTERDAM',
-            'Гамбург': 'HAMBURG',
-            'Hamburg': 'HAMBURG',
-            'Антверпен': 'ANTWERP',
-            'Antwerp': 'ANTWERP',
-            'Феликстоу': 'FELIXSTOWE',
-            'Felixstowe': 'FELIXSTOWE',
-            'Лос-Анджелес': 'LOS ANGELES',
-            'Los Angeles': 'LOS ANGELES',
-            'Лонг-Бич': 'LONG BEACH',
-            'Long Beach': 'LONG BEACH',
-            'Нью-Йорк': 'NEW YORK',
-            'New York': 'NEW YORK',
-            'Саванна': 'SAVANNAH',
-            'Savannah': 'SAVANNAH',
-        }
+        # Название города или код его порта (в нижнем регистре) -> город.
+        # Города добавляются в порядке словаря, поэтому при совпадении
+        # побеждает город, который раньше проверялся в цикле по словарю
+        self._city_by_name_or_code = {}
+        for city, code in self.city_ports.items():
+            self._city_by_name_or_code.setdefault(city.lower(), city)
+            self._city_by_name_or_code.setdefault(code.lower(), city)
+        
+        # Названия городов, затем коды портов (в нижнем регистре) в порядке
+        # приоритета -> порт. Одно выражение находит их за один проход по
+        # тексту; lookahead позволяет видеть перекрывающиеся названия
+        self._port_tokens = {}
+        for city in self.city_ports:
+            self._port_tokens.setdefault(city.lower(), city)
+        for code, port in self.sea_ports.items():
+            self._port_tokens.setdefault(code.lower(), port)
+        self._port_token_priority = {token: index for index, token in enumerate(self._port_tokens)}
+        self._port_tokens_re = re.compile(
+            '(?=(' + '|'.join(re.escape(token) for token in self._port_tokens) + '))'
+        )
+        if ahocorasick is not None:
+            self._port_automaton = ahocorasick.Automaton()
+            for token, port in self._port_tokens.items():
+                self._port_automaton.add_word(token, (self._port_token_priority[token], port))
+            self._port_automaton.make_automaton()
+        else:
+            self._port_automaton = None
+        
+        # В таблицах одни и те же порты повторяются из строки в строку,
+        # поэтому их распознавание кэшируется. Кэш принадлежит экземпляру:
+        # lru_cache на методе класса удерживал бы self
+        self._normalize_port_name = lru_cache(maxsize=4096)(self._normalize_port_name_uncached)
+        self._extract_port_from_text = lru_cache(maxsize=4096)(self._extract_port_from_text_uncached)
     
     def extract_sea_routes(self, text: str) -> List[Dict]:
         """Извлекает морские маршруты."""
         routes = []
+        # Пары (откуда, куда), уже попавшие в результат: повторный маршрут
+        # пропускается до поиска цен и определения стран
+        seen = set()
         
-        # Обрабатываем табличные данные
-        lines = text.split('\n')
-        for line in lines:
-            if '|' in line:
-                # Табличная строка
-                parts = [p.strip() for p in line.split('|')]
-                if len(parts) >= 3:
-                    # Ищем порты в первых колонках
-                    origin = self._extract_port_from_text(parts[0])
-                    destination = self._extract_port_from_text(parts[1])
+        # Обрабатываем табличные данные (строки хотя бы с тремя колонками)
+        if '|' in text:
+            for line in _iter_pipe_lines(text):
+                if line.count('|') < 2:
+                    continue
+                # Ячейки с ценами очищаются от пробелов при разборе цен
+                parts = line.split('|')
+                
+                # Ищем порты в первых колонках
+                origin = self._extract_port_from_text(parts[0].strip())
+                if not origin:
+                    continue
+                destination = self._extract_port_from_text(parts[1].strip())
+                
+                if destination and origin != destination:
+                    if (origin, destination) in seen:
+                        continue
+                    seen.add((origin, destination))
                     
-                    if origin and destination and origin != destination:
-                        # Ищем цены в остальных колонках
-                        prices = self._extract_prices_from_parts(parts[2:])
-                        
-                        route = {
-                            'origin_city': origin,
-                            'origin_country': self._get_country_by_city(origin),
-                            'destination_city': destination,
-                            'destination_country': self._get_country_by_city(destination),
-                            'transport_type': 'sea',
-                            'price_usd': prices.get('usd'),
-                            'price_cny': prices.get('cny'),
-                            'price_rub': prices.get('rub'),
-                            'container_type': self._extract_container_type(line)
-                        }
-                        routes.append(route)
+                    # Ищем цены в остальных колонках
+                    prices = self._extract_prices_from_parts(parts[2:])
+                    
+                    route = {
+                        'origin_city': origin,
+                        'origin_country': self._get_country_by_city(origin),
+                        'destination_city': destination,
+                        'destination_country': self._get_country_by_city(destination),
+                        'transport_type': 'sea',
+                        'price_usd': prices.get('usd'),
+                        'price_cny': prices.get('cny'),
+                        'price_rub': prices.get('rub'),
+                        'container_type': self._extract_container_type(line)
+                    }
+                    routes.append(route)
+                    if len(routes) >= _MAX_ROUTES:
+                        return routes
         
         # Обрабатываем текстовые маршруты
-        for pattern in self.sea_patterns['routes']:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
+        for pattern in self.sea_patterns_compiled['routes']:
+            for match in pattern.finditer(text):
                 origin = match.group(1).strip()
                 destination = match.group(2).strip()
                 
@@ -257,6 +384,10 @@ class SeaAnalyzer:
                     destination = self._normalize_port_name(destination)
                     
                     if origin and destination and origin != destination:
+                        if (origin, destination) in seen:
+                            continue
+                        seen.add((origin, destination))
+                        
                         route = {
                             'origin_city': origin,
                             'origin_country': self._get_country_by_city(origin),
@@ -269,10 +400,12 @@ class SeaAnalyzer:
                             'container_type': None
                         }
                         routes.append(route)
+                        if len(routes) >= _MAX_ROUTES:
+                            return routes
         
-        return routes[:10]  # Ограничиваем количество
+        return routes
     
-    def _normalize_port_name(self, port: str) -> Optional[str]:
+    def _normalize_port_name_uncached(self, port: str) -> Optional[str]:
         """Нормализует название порта."""
         if not port or port.strip() == '':
             return None
@@ -280,36 +413,49 @@ class SeaAnalyzer:
         port = port.strip()
         
         # Проверяем коды портов
-        if port.upper() in self.sea_ports:
-            return self.sea_ports[port.upper()]
+        normalized_port = self.sea_ports.get(port.upper())
+        if normalized_port is not None:
+            return normalized_port
         
         # Проверяем города
-        for normalized_city, code in self.city_ports.items():
-            if port.lower() == normalized_city.lower() or port.lower() == code.lower():
-                return normalized_city
+        port_lower = port.lower()
+        normalized_city = self._city_by_name_or_code.get(port_lower)
+        if normalized_city is not None:
+            return normalized_city
         
         # Если не нашли, возвращаем как есть (если это похоже на порт)
-        if len(port) > 2 and not port.isdigit() and not port.lower() in ['from', 'to', 'via', 'through', 'route', 'port', 'terminal']:
+        if len(port) > 2 and not port.isdigit() and port_lower not in _PORT_STOPWORDS:
             return port
         
         return None
     
-    def _extract_port_from_text(self, text: str) -> Optional[str]:
+    def _extract_port_from_text_uncached(self, text: str) -> Optional[str]:
         """Извлекает название порта из текста."""
         if not text or text.strip() == '':
             return None
         
         text = text.strip()
+        text_lower = text.lower()
         
-        # Проверяем известные порты
-        for port in self.city_ports.keys():
-            if port.lower() in text.lower():
-                return port
-        
-        # Проверяем коды портов
-        for code, port in self.sea_ports.items():
-            if code.lower() in text.lower():
-                return port
+        # Ищем известные города, затем коды портов: из всех найденных
+        # названий берется первое по приоритету
+        best_priority, best_port = len(self._port_tokens), None
+        if self._port_automaton is not None:
+            for _, (priority, port) in self._port_automaton.iter(text_lower):
+                if priority < best_priority:
+                    best_priority, best_port = priority, port
+                    if priority == 0:
+                        break
+        else:
+            for match in self._port_tokens_re.finditer(text_lower):
+                token = match.group(1)
+                priority = self._port_token_priority[token]
+                if priority < best_priority:
+                    best_priority, best_port = priority, self._port_tokens[token]
+                    if priority == 0:
+                        break
+        if best_port is not None:
+            return best_port
         
         # Если не нашли, возвращаем как есть (если это похоже на порт)
         if len(text) > 2 and not text.isdigit():
@@ -326,27 +472,27 @@ class SeaAnalyzer:
             if not part:
                 continue
             
-            # Ищем USD
-            usd_match = re.search(r'(\d+(?:\.\d+)?)\s*USD', part, re.IGNORECASE)
-            if usd_match:
-                prices['usd'] = float(usd_match.group(1))
-            
-            # Ищем CNY/RMB
-            cny_match = re.search(r'(\d+(?:\.\d+)?)\s*(?:CNY|RMB)', part, re.IGNORECASE)
-            if cny_match:
-                prices['cny'] = float(cny_match.group(1))
-            
-            # Ищем RUB
-            rub_match = re.search(r'(\d+(?:\.\d+)?)\s*(?:RUB|₽)', part, re.IGNORECASE)
-            if rub_match:
-                prices['rub'] = float(rub_match.group(1))
+            # Ищем USD, CNY/RMB и RUB за один проход: в ячейке берется
+            # первая цена каждой валюты
+            found = set()
+            for match in _PRICE_RE.finditer(part):
+                currency = match.lastgroup
+                if currency not in found:
+                    found.add(currency)
+                    prices[currency] = float(match.group('amount'))
+                    if len(found) == 3:
+                        break
         
         return prices
     
     def _extract_container_type(self, text: str) -> Optional[str]:
         """Извлекает тип контейнера."""
-        for pattern in self.sea_patterns['containers']:
-            match = re.search(pattern, text, re.IGNORECASE)
+        # Все типы контейнеров начинаются с размера 20 или 40: если его
+        # в тексте нет, регулярные выражения не запускаются
+        if '20' not in text and '40' not in text:
+            return None
+        for pattern in self._container_res:
+            match = pattern.search(text)
             if match:
                 return match.group(0).strip()
         return None
@@ -356,35 +502,7 @@ class SeaAnalyzer:
         if not city:
             return 'Неизвестно'
         
-        # Китайские города
-        chinese_cities = ['Шанхай', 'Shanghai', 'Нинбо', 'Ningbo', 'Циндао', 'Qingdao', 'Тяньцзинь', 'Tianjin', 'Далянь', 'Dalian', 'Синган', 'Xingang', 'Яньтянь', 'Yantian', 'Шэкоу', 'Shekou', 'Наньша', 'Nansha', 'Гуанчжоу', 'Guangzhou', 'Шэньчжэнь', 'Shenzhen', 'Сямэнь', 'Xiamen', 'Фучжоу', 'Fuzhou', 'Вэньчжоу', 'Wenzhou', 'Наньтун', 'Nantong', 'Чжанцзяган', 'Zhangjiagang', 'Ляньюньган', 'Lianyungang', 'Яньтай', 'Yantai', 'Вэйхай', 'Weihai', 'Циньхуандао', 'Qinhuangdao']
-        if city in chinese_cities:
-            return 'Китай'
-        
-        # Российские города
-        russian_cities = ['Владивосток', 'Vladivostok', 'Восточный', 'Vostochny', 'Находка', 'Nakhodka', 'Санкт-Петербург', 'St. Petersburg', 'Калининград', 'Kaliningrad', 'Новороссийск', 'Novorossiysk', 'Ростов-на-Дону', 'Rostov', 'Астрахань', 'Astrakhan', 'Мурманск', 'Murmansk', 'Архангельск', 'Arkhangelsk']
-        if city in russian_cities:
-            return 'Россия'
-        
-        # Другие страны
-        if city in ['Пусан', 'Busan']:
-            return 'Южная Корея'
-        elif city in ['Сингапур', 'Singapore']:
-            return 'Сингапур'
-        elif city in ['Гонконг', 'Hong Kong']:
-            return 'Китай'
-        elif city in ['Роттердам', 'Rotterdam']:
-            return 'Нидерланды'
-        elif city in ['Гамбург', 'Hamburg']:
-            return 'Германия'
-        elif city in ['Антверпен', 'Antwerp']:
-            return 'Бельгия'
-        elif city in ['Феликстоу', 'Felixstowe']:
-            return 'Великобритания'
-        elif city in ['Лос-Анджелес', 'Los Angeles', 'Лонг-Бич', 'Long Beach', 'Нью-Йорк', 'New York', 'Саванна', 'Savannah']:
-            return 'США'
-        
-        return 'Неизвестно'
+        return _CITY_TO_COUNTRY.get(city, 'Неизвестно')
     
     def analyze_sea_file(self, text: str, file_path: str) -> Dict[str, Any]:
         """Анализирует морской файл."""
@@ -432,8 +550,24 @@ class SeaAnalyzer:
         
         return cleaned[:10]
 
+# Общий анализатор для analyze_sea_file: таблицы портов и регулярные
+# выражения строятся один раз, а не при каждом вызове. Между вызовами
+# анализатор не меняет своего состояния
+_ANALYZER: Optional[SeaAnalyzer] = None
+_ANALYZER_LOCK = threading.Lock()
+
+
+def _get_analyzer() -> SeaAnalyzer:
+    """Возвращает общий экземпляр анализатора морских тарифов."""
+    global _ANALYZER
+    if _ANALYZER is None:
+        with _ANALYZER_LOCK:
+            if _ANALYZER is None:
+                _ANALYZER = SeaAnalyzer()
+    return _ANALYZER
+
+
 def analyze_sea_file(text: str, file_path: str) -> Dict[str, Any]:
     """Универсальная функция анализа морского файла."""
-    analyzer = SeaAnalyzer()
-    return analyzer.analyze_sea_file(text, file_path)
+    return _get_analyzer().analyze_sea_file(text, file_path)
 
@@ -12,6 +12,29 @@ from services.sea_analyzer import SeaAnalyzer
 
 logger = logging.getLogger(__name__)
 
+# Паттерны для поиска времени в пути (в порядке приоритета)
+_TRANSIT_RES = tuple(re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'(\d+)\s*дней?',
+    r'(\d+)\s*days?',
+    r'(\d+)\s*суток?',
+    r'(\d+)\s*дн',
+    r'(\d+)\s*сут',
+    r'время\s*в\s*пути[:\s]*(\d+)',
+    r'transit\s*time[:\s]*(\d+)',
+    r'(\d+)\s*дней?\s*в\s*пути',
+    r'ETA[:\s]*(\d+)',
+    r'время\s*доставки[:\s]*(\d+)'
+))
+
+# Ключевые слова морского транспорта одним выражением: текст
+# просматривается один раз вместо отдельного поиска каждого слова
+_SEA_KEYWORDS_RE = re.compile('|'.join(re.escape(keyword) for keyword in (
+    'морск', 'sea', 'ocean', 'ship', 'vessel', 'container', 'контейнер',
+    'порт', 'port', 'fcl', 'lcl', '20dc', '40hc', '20gp', '40gp',
+    'shipping', 'freight', 'cargo', 'груз', 'судно', 'корабль',
+    'terminal', 'терминал', 'berth', 'причал', 'dock', 'док'
+)))
+
 class SeaParser(BaseParser):
     """Специализированный парсер для морских тарифов."""
     
@@ -125,23 +148,9 @@ class SeaParser(BaseParser):
         """
         if not text:
             return None
-            
-        # Паттерны для поиска времени в пути
-        patterns = [
-            r'(\d+)\s*дней?',
-            r'(\d+)\s*days?',
-            r'(\d+)\s*суток?',
-            r'(\d+)\s*дн',
-            r'(\d+)\s*сут',
-            r'время\s*в\s*пути[:\s]*(\d+)',
-            r'transit\s*time[:\s]*(\d+)',
-            r'(\d+)\s*дней?\s*в\s*пути',
-            r'ETA[:\s]*(\d+)',
-            r'время\s*доставки[:\s]*(\d+)'
-        ]
         
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for pattern in _TRANSIT_RES:
+            match = pattern.search(text)
             if match:
                 try:
                     return int(match.group(1))
@@ -160,13 +169,5 @@ class SeaParser(BaseParser):
         Returns:
             True если текст содержит морские ключевые слова
         """
-        sea_keywords = [
-            'морск', 'sea', 'ocean', 'ship', 'vessel', 'container', 'контейнер',
-            'порт', 'port', 'fcl', 'lcl', '20dc', '40hc', '20gp', '40gp',
-            'shipping', 'freight', 'cargo', 'груз', 'судно', 'корабль',
-            'terminal', 'терминал', 'berth', 'причал', 'dock', 'док'
-        ]
-        
-        text_lower = text.lower()
-        return any(keyword in text_lower for keyword in sea_keywords)
+        return _SEA_KEYWORDS_RE.search(text.lower()) is not None
 
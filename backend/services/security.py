@@ -1,5 +1,7 @@
 import os
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
@@ -15,6 +17,8 @@ import models
 SECRET_KEY = os.getenv("SECRET_KEY", "dev-secret-change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+# Сколько последних проверенных токенов хранится в кэше декодирования
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
@@ -36,6 +40,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def _decode_token(token: str) -> dict:
+    """
+    Проверяет подпись токена и возвращает его содержимое.
+
+    Один и тот же токен приходит с каждым запросом пользователя, поэтому
+    результат кэшируется. Невалидные токены не кэшируются (исключение),
+    а срок действия проверяется при каждом запросе в get_current_user.
+    """
+    return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -51,131 +67,101 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode_token(token)
+        exp = payload.get("exp")
+        if exp is not None and exp < time.time():
+            raise credentials_exception
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+    # Поиск по первичному ключу: объект, уже загруженный в сессию,
+    # берется из identity map без запроса к БД
+    user = db.get(models.User, int(user_id))
     if user is None:
         raise credentials_exception
     return user
 
 
-def require_admin(user: models.User = Depends(get_current_user)) -> models.User:
-    """
-    Проверка прав администратора
-    """
-    if user.role != models.UserRole.admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Требуются права администратора"
-        )
-    return user
-
-
-def require_employee_or_admin(user: models.User = Depends(get_current_user)) -> models.User:
+def requires_roles(*roles: models.UserRole, detail: str):
     """
-    Проверка прав сотрудника или администратора
+    Создает зависимость FastAPI, пропускающую пользователей с указанными ролями
     """
-    if user.role not in [models.UserRole.admin, models.UserRole.employee]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Требуются права сотрудника или администратора"
-        )
-    return user
+    allowed = frozenset(roles)
 
+    def check_role(user: models.User = Depends(get_current_user)) -> models.User:
+        if user.role not in allowed:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=detail
+            )
+        return user
 
-def require_forwarder_or_above(user: models.User = Depends(get_current_user)) -> models.User:
-    """
-    Проверка прав экспедитора или выше
-    """
-    if user.role not in [models.UserRole.admin, models.UserRole.employee, models.UserRole.forwarder]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Требуются права экспедитора или выше"
-        )
-    return user
+    return check_role
 
 
-def require_client_or_above(user: models.User = Depends(get_current_user)) -> models.User:
-    """
-    Проверка прав клиента или выше (все пользователи)
-    """
-    return user
+# Проверка прав администратора
+require_admin = requires_roles(
+    models.UserRole.admin,
+    detail="Требуются права администратора"
+)
 
+# Проверка прав сотрудника или администратора
+require_employee_or_admin = requires_roles(
+    models.UserRole.admin, models.UserRole.employee,
+    detail="Требуются права сотрудника или администратора"
+)
 
-def can_manage_users(user: models.User = Depends(get_current_user)) -> models.User:
-    """
-    Проверка прав на управление пользователями (только админ)
-    """
-    if user.role != models.UserRole.admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Только администратор может управлять пользователями"
-        )
-    return user
+# Проверка прав экспедитора или выше
+require_forwarder_or_above = requires_roles(
+    models.UserRole.admin, models.UserRole.employee, models.UserRole.forwarder,
+    detail="Требуются права экспедитора или выше"
+)
 
 
-def can_manage_forwarders_and_clients(user: models.User = Depends(get_current_user)) -> models.User:
+def require_client_or_above(user: models.User = Depends(get_current_user)) -> models.User:
     """
-    Проверка прав на управление экспедиторами и клиентами (сотрудник или администратор)
+    Проверка прав клиента или выше (все пользователи)
     """
-    if user.role not in [models.UserRole.admin, models.UserRole.employee]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Только сотрудник или администратор может управлять экспедиторами и клиентами"
-        )
     return user
 
 
-def can_set_markups(user: models.User = Depends(get_current_user)) -> models.User:
-    """
-    Проверка прав на установку наценок (админ и сотрудник)
-    """
-    if user.role not in [models.UserRole.admin, models.UserRole.employee]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Только администратор и сотрудник могут устанавливать наценки"
-        )
-    return user
+# Проверка прав на управление пользователями (только админ)
+can_manage_users = requires_roles(
+    models.UserRole.admin,
+    detail="Только администратор может управлять пользователями"
+)
 
+# Проверка прав на управление экспедиторами и клиентами (сотрудник или администратор)
+can_manage_forwarders_and_clients = requires_roles(
+    models.UserRole.admin, models.UserRole.employee,
+    detail="Только сотрудник или администратор может управлять экспедиторами и клиентами"
+)
 
-def can_view_archive(user: models.User = Depends(get_current_user)) -> models.User:
-    """
-    Проверка прав на просмотр архива тарифов (админ и сотрудник)
-    """
-    if user.role not in [models.UserRole.admin, models.UserRole.employee]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Только администратор и сотрудник могут просматривать архив тарифов"
-        )
-    return user
-
+# Проверка прав на установку наценок (админ и сотрудник)
+can_set_markups = requires_roles(
+    models.UserRole.admin, models.UserRole.employee,
+    detail="Только администратор и сотрудник могут устанавливать наценки"
+)
 
-def can_view_request_history(user: models.User = Depends(get_current_user)) -> models.User:
-    """
-    Проверка прав на просмотр истории запросов (админ и сотрудник)
-    """
-    if user.role not in [models.UserRole.admin, models.UserRole.employee]:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Только администратор и сотрудник могут просматривать историю запросов"
-        )
-    return user
+# Проверка прав на просмотр архива тарифов (админ и сотрудник)
+can_view_archive = requires_roles(
+    models.UserRole.admin, models.UserRole.employee,
+    detail="Только администратор и сотрудник могут просматривать архив тарифов"
+)
 
+# Проверка прав на просмотр истории запросов (админ и сотрудник)
+can_view_request_history = requires_roles(
+    models.UserRole.admin, models.UserRole.employee,
+    detail="Только администратор и сотрудник могут просматривать историю запросов"
+)
 
-def can_add_tariffs(user: models.User = Depends(get_current_user)) -> models.User:
-    """
-    Проверка прав на добавление тарифов (все кроме клиента)
-    """
-    if user.role == models.UserRole.client:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Клиенты не могут добавлять тарифы"
-        )
-    return user
+# Проверка прав на добавление тарифов (все кроме клиента)
+can_add_tariffs = requires_roles(
+    models.UserRole.admin, models.UserRole.employee, models.UserRole.forwarder,
+    detail="Клиенты не могут добавлять тарифы"
+)
 
 
 def can_choose_transport(user: models.User = Depends(get_current_user)) -> models.User:
@@ -190,5 +176,3 @@ def can_download_kp(user: models.User = Depends(get_current_user)) -> models.Use
     Проверка прав на скачивание КП (все пользователи)
     """
     return user
-
-
@@ -3,17 +3,42 @@
 """
 
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 import models
 from schemas import TransportType
 
 
+# Поля тарифа, которые копируются в архив без изменений
+_ARCHIVED_FIELDS = (
+    'supplier_id', 'transport_type', 'basis', 'origin_country', 'origin_city',
+    'border_point', 'destination_country', 'destination_city', 'vehicle_type',
+    'price_rub', 'price_usd', 'validity_date', 'currency_conversion',
+    'transit_time_days', 'source_file', 'transit_port', 'departure_station',
+    'arrival_station', 'rail_tariff_rub', 'cbx_cost', 'terminal_handling_cost',
+    'auto_pickup_cost', 'security_cost', 'precarriage_cost', 'created_by_user_id',
+)
+
+
+def _archive_values(tariff: models.Tariff, reason: str) -> Dict[str, Any]:
+    """Собирает значения колонок архивной копии тарифа."""
+    values = {field: getattr(tariff, field) for field in _ARCHIVED_FIELDS}
+    values['original_tariff_id'] = tariff.id
+    values['archive_reason'] = reason
+    values['is_active'] = True
+    return values
+
+
 class TariffArchiveService:
     """Сервис для управления архивом тарифов"""
     
     def __init__(self, db: Session):
         self.db = db
+        # Последние архивные тарифы по критериям поиска: при пакетной
+        # обработке один и тот же маршрут запрашивается многократно.
+        # Кэш живет вместе с сервисом и сбрасывается при изменении архива
+        self._latest_cache: Dict[tuple, Optional[models.TariffArchive]] = {}
     
     def archive_tariff(self, tariff: models.Tariff, reason: str = "Создание нового тарифа") -> models.TariffArchive:
         """
@@ -26,43 +51,10 @@ class TariffArchiveService:
         Returns:
             Архивированный тариф
         """
-        # Создаем архивную копию тарифа
-        archived_tariff = models.TariffArchive(
-            original_tariff_id=tariff.id,
-            supplier_id=tariff.supplier_id,
-            transport_type=tariff.transport_type,
-            basis=tariff.basis,
-            origin_country=tariff.origin_country,
-            origin_city=tariff.origin_city,
-            border_point=tariff.border_point,
-            destination_country=tariff.destination_country,
-            destination_city=tariff.destination_city,
-            vehicle_type=tariff.vehicle_type,
-            price_rub=tariff.price_rub,
-            price_usd=tariff.price_usd,
-            validity_date=tariff.validity_date,
-            currency_conversion=tariff.currency_conversion,
-            transit_time_days=tariff.transit_time_days,
-            source_file=tariff.source_file,
-            transit_port=tariff.transit_port,
-            departure_station=tariff.departure_station,
-            arrival_station=tariff.arrival_station,
-            rail_tariff_rub=tariff.rail_tariff_rub,
-            cbx_cost=tariff.cbx_cost,
-            terminal_handling_cost=tariff.terminal_handling_cost,
-            auto_pickup_cost=tariff.auto_pickup_cost,
-            security_cost=tariff.security_cost,
-            precarriage_cost=tariff.precarriage_cost,
-            archive_reason=reason,
-            is_active=True,
-            created_by_user_id=tariff.created_by_user_id
-        )
-        
-        self.db.add(archived_tariff)
-        self.db.commit()
-        self.db.refresh(archived_tariff)
-        
-        return archived_tariff
+        # Создаем архивную копию тарифа одним INSERT ... RETURNING, без
+        # отдельного SELECT для refresh: после коммита атрибуты записи
+        # загрузятся, только если вызывающий код к ним обратится
+        return self.archive_tariffs_batch([tariff], reason)[0]
     
     def get_archived_tariffs(
         self,
@@ -89,22 +81,21 @@ class TariffArchiveService:
         Returns:
             Список архивных тарифов
         """
-        query = self.db.query(models.TariffArchive).filter(
-            models.TariffArchive.is_active == is_active
-        )
+        filters = {
+            'transport_type': transport_type,
+            'basis': basis,
+            'origin_city': origin_city,
+            'destination_city': destination_city,
+            'vehicle_type': vehicle_type,
+            'supplier_id': supplier_id,
+        }
         
-        if transport_type:
-            query = query.filter(models.TariffArchive.transport_type == transport_type)
-        if basis:
-            query = query.filter(models.TariffArchive.basis == basis)
-        if origin_city:
-            query = query.filter(models.TariffArchive.origin_city == origin_city)
-        if destination_city:
-            query = query.filter(models.TariffArchive.destination_city == destination_city)
-        if vehicle_type:
-            query = query.filter(models.TariffArchive.vehicle_type == vehicle_type)
-        if supplier_id:
-            query = query.filter(models.TariffArchive.supplier_id == supplier_id)
+        # Активные записи отбираются тем же условием, что задано у частичного
+        # индекса ix_tariff_archive_active, иначе СУБД его не использует.
+        # Незаданные критерии не участвуют в фильтре
+        query = self.db.query(models.TariffArchive).filter(
+            models.TariffArchive.is_active if is_active else models.TariffArchive.is_active == is_active
+        ).filter_by(**{column: value for column, value in filters.items() if value})
         
         return query.order_by(models.TariffArchive.archived_at.desc()).all()
     
@@ -112,7 +103,7 @@ class TariffArchiveService:
         """Получает архивный тариф по ID"""
         return self.db.query(models.TariffArchive).filter(
             models.TariffArchive.id == archive_id,
-            models.TariffArchive.is_active == True
+            models.TariffArchive.is_active
         ).first()
     
     def deactivate_archived_tariff(self, archive_id: int) -> bool:
@@ -121,6 +112,7 @@ class TariffArchiveService:
         if archived_tariff:
             archived_tariff.is_active = False
             self.db.commit()
+            self._latest_cache.clear()
             return True
         return False
     
@@ -147,12 +139,16 @@ class TariffArchiveService:
         Returns:
             Последний архивный тариф или None
         """
+        key = (transport_type, basis, origin_city, destination_city, vehicle_type, supplier_id)
+        if key in self._latest_cache:
+            return self._latest_cache[key]
+        
         query = self.db.query(models.TariffArchive).filter(
             models.TariffArchive.transport_type == transport_type,
             models.TariffArchive.basis == basis,
             models.TariffArchive.origin_city == origin_city,
             models.TariffArchive.destination_city == destination_city,
-            models.TariffArchive.is_active == True
+            models.TariffArchive.is_active
         )
         
         if vehicle_type:
@@ -160,7 +156,9 @@ class TariffArchiveService:
         if supplier_id:
             query = query.filter(models.TariffArchive.supplier_id == supplier_id)
         
-        return query.order_by(models.TariffArchive.archived_at.desc()).first()
+        latest = query.order_by(models.TariffArchive.archived_at.desc()).first()
+        self._latest_cache[key] = latest
+        return latest
     
     def archive_tariffs_batch(self, tariffs: List[models.Tariff], reason: str = "Массовое архивирование") -> List[models.TariffArchive]:
         """
@@ -173,10 +171,17 @@ class TariffArchiveService:
         Returns:
             Список архивных тарифов
         """
-        archived_tariffs = []
+        if not tariffs:
+            return []
         
-        for tariff in tariffs:
-            archived_tariff = self.archive_tariff(tariff, reason)
-            archived_tariffs.append(archived_tariff)
+        # Все копии вставляются одним bulk INSERT и одним коммитом вместо
+        # add/commit/refresh на каждый тариф; RETURNING сразу возвращает
+        # созданные записи с их ID
+        archived_tariffs = self.db.scalars(
+            insert(models.TariffArchive).returning(models.TariffArchive),
+            [_archive_values(tariff, reason) for tariff in tariffs]
+        ).all()
+        self.db.commit()
+        self._latest_cache.clear()
         
-        return archived_tariffs
+        return list(archived_tariffs)
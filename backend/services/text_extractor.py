@@ -4,9 +4,13 @@
 """
 
 import os
+import shutil
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Iterator, Optional, List, Tuple
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
 
 import pandas as pd
 import pdfplumber
@@ -16,6 +20,13 @@ from docx import Document
 
 logger = logging.getLogger(__name__)
 
+# OCR через общий с parsers движок (tesserocr или pytesseract): один
+# экземпляр tesserocr и одна загрузка языковых моделей на процесс
+from services.ocr_engine import OCR_MIN_CHARS as _OCR_MIN_CHARS, PyTessBaseAPI, image_to_string as _image_to_string
+
+# Excel читается общим с parsers способом: calamine, если установлен
+from services.excel_reader import CalamineWorkbook, EXCEL_ENGINES as _EXCEL_ENGINES, read_excel_calamine
+
 # Настройка OCR
 try:
     possible_paths = [
@@ -25,17 +36,131 @@ try:
         "/usr/local/bin/tesseract"
     ]
     
-    for path in possible_paths:
-        if os.path.exists(path):
-            pytesseract.pytesseract.tesseract_cmd = path
-            logger.info(f"Tesseract найден по пути: {path}")
-            break
+    # Сначала ищем tesseract в PATH, затем в стандартных каталогах установки
+    path = shutil.which("tesseract") or next(
+        (candidate for candidate in possible_paths if os.path.exists(candidate)), None
+    )
+    if path:
+        pytesseract.pytesseract.tesseract_cmd = path
+        logger.info(f"Tesseract найден по пути: {path}")
     else:
         logger.warning("Tesseract не найден. OCR для изображений будет недоступен.")
 except Exception as e:
     logger.error(f"Ошибка настройки Tesseract: {e}")
 
 
+def _iter_docx_table_lines(tables) -> Iterator[str]:
+    """Возвращает заголовки и непустые строки таблиц DOCX."""
+    for table_idx, table in enumerate(tables):
+        yield f"\n=== ТАБЛИЦА {table_idx + 1} ===\n"
+        
+        for row in table.rows:
+            row_text = " | ".join([cell.text.strip() for cell in row.cells])
+            if row_text.strip():
+                yield row_text
+
+
+def _format_cell(val: Any) -> str:
+    """Форматирует значение ячейки таблицы для текстового представления."""
+    if pd.isna(val):
+        return ""
+    if isinstance(val, (int, float)):
+        # Форматируем числа без научной нотации
+        if val == int(val):
+            return str(int(val))
+        return f"{val:.2f}"
+    return str(val).strip()
+
+
+# Настройки OCR изображений, которые пробуются по очереди, пока не будет
+# распознано хотя бы _OCR_MIN_CHARS значимых символов
+_IMAGE_OCR_CONFIGS = (
+    '--oem 3 --psm 6',  # Стандартные настройки
+    '--oem 3 --psm 3',  # Автоматическое определение страницы
+    '--oem 1 --psm 6',  # Legacy OCR engine
+    '--oem 3 --psm 8',  # Одна строка текста
+    '--oem 3 --psm 13', # Необработанная строка
+)
+# tesserocr не меняет движок после создания экземпляра: конфигурация
+# с --oem 1 дала бы тот же результат, что и '--oem 3 --psm 6'
+_TESSEROCR_IMAGE_CONFIGS = tuple(config for config in _IMAGE_OCR_CONFIGS if '--oem 1' not in config)
+
+
+# Версия tesseract после первой успешной проверки. Проверка запускает
+# отдельный процесс, поэтому повторяется только пока она не удалась
+_TESSERACT_VERSION = None
+
+
+def _tesseract_version():
+    """Возвращает версию tesseract; исключение, если он недоступен."""
+    global _TESSERACT_VERSION
+    if _TESSERACT_VERSION is None:
+        _TESSERACT_VERSION = pytesseract.get_tesseract_version()
+    return _TESSERACT_VERSION
+
+
+def _pdf_workers(page_count: int) -> int:
+    """Число параллельных обработчиков страниц PDF."""
+    return max(1, min(os.cpu_count() or 1, page_count))
+
+
+def _extract_pdf_page(file_path: str, page_num: int) -> Tuple[List[str], bool, bool]:
+    """
+    Извлекает текст, OCR для сканов и таблицу одной страницы PDF.
+    PDF открывается заново: объекты pdfplumber нельзя разделять между потоками.
+    
+    Returns:
+        Кортеж (части текста страницы, использован ли OCR, найдена ли таблица)
+    """
+    text_parts = []
+    ocr_used = False
+    table_found = False
+    
+    # Открывается только нужная страница: pdfplumber не создает объекты
+    # остальных страниц документа
+    with pdfplumber.open(file_path, pages=[page_num + 1]) as pdf:
+        page = pdf.pages[0]
+        logger.info(f"Обрабатываем страницу {page_num + 1}")
+        
+        # Пробуем извлечь текст
+        text = page.extract_text()
+        
+        if text:
+            text_parts.append(f"\n=== СТРАНИЦА {page_num + 1} ===\n")
+            text_parts.append(text)
+        else:
+            # OCR для сканов
+            try:
+                # Новые версии pdfplumber уже хранят растр как изображение PIL -
+                # оно используется без копирования через numpy. Tesseract
+                # получает одноканальное изображение: втрое меньше данных
+                original = page.to_image().original
+                if not isinstance(original, Image.Image):
+                    original = Image.fromarray(original)
+                pil_image = original.convert("L")
+                ocr_text = pytesseract.image_to_string(pil_image, lang="rus+eng")
+                if ocr_text:
+                    text_parts.append(f"\n=== СТРАНИЦА {page_num + 1} (OCR) ===\n")
+                    text_parts.append(ocr_text)
+                    ocr_used = True
+            except Exception as e:
+                logger.warning(f"Ошибка OCR для страницы {page_num + 1}: {e}")
+        
+        # Пробуем извлечь таблицы
+        try:
+            table = page.extract_table()
+            if table and len(table) > 1:
+                table_found = True
+                text_parts.append(f"\n=== ТАБЛИЦА НА СТРАНИЦЕ {page_num + 1} ===\n")
+                for row in table:
+                    row_text = " | ".join([str(cell) if cell else "" for cell in row])
+                    text_parts.append(row_text)
+        except Exception as e:
+            logger.debug(f"Ошибка извлечения таблицы со страницы {page_num + 1}: {e}")
+    
+    return text_parts, ocr_used, table_found
+
+
 class TextExtractor:
     """Класс для извлечения текста из файлов различных форматов."""
     
@@ -120,28 +245,20 @@ class TextExtractor:
         logger.info(f"Извлекаем текст из DOCX: {file_path}")
         
         doc = Document(file_path)
-        text_parts = []
-        table_count = 0
+        # doc.tables каждый раз заново собирает список таблиц из XML
+        tables = doc.tables
         
-        # Извлекаем текст из параграфов
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text_parts.append(para.text)
+        # Текст параграфа python-docx собирает из runs при каждом обращении,
+        # поэтому читаем его один раз
+        paragraphs = (text for text in (para.text for para in doc.paragraphs) if text.strip())
         
-        # Извлекаем текст из таблиц
-        for table_idx, table in enumerate(doc.tables):
-            table_count += 1
-            text_parts.append(f"\n=== ТАБЛИЦА {table_idx + 1} ===\n")
-            
-            for row_idx, row in enumerate(table.rows):
-                row_text = " | ".join([cell.text.strip() for cell in row.cells])
-                if row_text.strip():
-                    text_parts.append(row_text)
+        # Параграфы и строки таблиц склеиваются одним join
+        text = '\n'.join(chain(paragraphs, _iter_docx_table_lines(tables)))
         
         return {
-            'text': '\n'.join(text_parts),
+            'text': text,
             'pages': 1,  # DOCX обычно одна страница
-            'tables': table_count,
+            'tables': len(tables),
             'images': 0
         }
     
@@ -151,10 +268,15 @@ class TextExtractor:
         
         # Пробуем разные движки для чтения Excel
         df = None
-        engines = ["openpyxl", "xlrd"]
+        engines = (["calamine"] if CalamineWorkbook is not None else []) + _EXCEL_ENGINES
         
         for engine in engines:
             try:
+                if engine == "calamine":
+                    df = read_excel_calamine(file_path, header=None)
+                    logger.info(f"Успешно прочитан с движком {engine}")
+                    break
+                
                 # Пробуем разные параметры для чтения
                 try:
                     df = pd.read_excel(file_path, engine=engine, header=None)
@@ -202,22 +324,11 @@ class TextExtractor:
                     headers.append(str(col))
             text_lines.append(" | ".join(headers))
         
-        # Добавляем данные с улучшенной обработкой
-        for idx, row in df.iterrows():
-            row_values = []
-            for val in row:
-                if pd.isna(val):
-                    row_values.append("")
-                elif isinstance(val, (int, float)):
-                    # Форматируем числа без научной нотации
-                    if val == int(val):
-                        row_values.append(str(int(val)))
-                    else:
-                        row_values.append(f"{val:.2f}")
-                else:
-                    row_values.append(str(val).strip())
-            
-            row_text = " | ".join(row_values)
+        # Добавляем данные с улучшенной обработкой. Строки берем списками
+        # Python-значений: iterrows создает Series на каждую строку, и это
+        # основная часть времени на больших листах
+        for row in df.astype(object).to_numpy().tolist():
+            row_text = " | ".join([_format_cell(val) for val in row])
             if row_text.strip():  # Добавляем только непустые строки
                 text_lines.append(row_text)
         
@@ -233,47 +344,24 @@ class TextExtractor:
         logger.info(f"Извлекаем текст из PDF: {file_path}")
         
         text_parts = []
-        page_count = 0
         table_count = 0
         image_count = 0
         
         try:
             with pdfplumber.open(file_path) as pdf:
-                for page_num, page in enumerate(pdf.pages):
-                    page_count += 1
-                    logger.info(f"Обрабатываем страницу {page_num + 1}")
-                    
-                    # Пробуем извлечь текст
-                    text = page.extract_text()
-                    
-                    if text:
-                        text_parts.append(f"\n=== СТРАНИЦА {page_num + 1} ===\n")
-                        text_parts.append(text)
-                    else:
-                        # OCR для сканов
-                        try:
-                            im = page.to_image()
-                            pil_image = Image.fromarray(im.original)
-                            ocr_text = pytesseract.image_to_string(pil_image, lang="rus+eng")
-                            if ocr_text:
-                                text_parts.append(f"\n=== СТРАНИЦА {page_num + 1} (OCR) ===\n")
-                                text_parts.append(ocr_text)
-                                image_count += 1
-                        except Exception as e:
-                            logger.warning(f"Ошибка OCR для страницы {page_num + 1}: {e}")
-                    
-                    # Пробуем извлечь таблицы
-                    try:
-                        table = page.extract_table()
-                        if table and len(table) > 1:
-                            table_count += 1
-                            text_parts.append(f"\n=== ТАБЛИЦА НА СТРАНИЦЕ {page_num + 1} ===\n")
-                            for row in table:
-                                row_text = " | ".join([str(cell) if cell else "" for cell in row])
-                                text_parts.append(row_text)
-                    except Exception as e:
-                        logger.debug(f"Ошибка извлечения таблицы со страницы {page_num + 1}: {e}")
-                        
+                page_count = len(pdf.pages)
+            
+            # Страницы обрабатываются параллельно: OCR выполняется во внешнем
+            # процессе tesseract, так что потоки не ждут друг друга на GIL
+            with ThreadPoolExecutor(max_workers=_pdf_workers(page_count)) as executor:
+                page_results = list(executor.map(partial(_extract_pdf_page, file_path), range(page_count)))
+            
+            # Результаты собираются в порядке страниц
+            for page_parts, ocr_used, table_found in page_results:
+                text_parts.extend(page_parts)
+                image_count += ocr_used
+                table_count += table_found
+        
         except Exception as e:
             logger.error(f"Ошибка обработки PDF: {e}")
             raise
@@ -290,34 +378,32 @@ class TextExtractor:
         logger.info(f"Извлекаем текст из изображения: {file_path}")
         
         # Проверяем, доступен ли Tesseract
-        try:
-            pytesseract.get_tesseract_version()
-        except Exception as e:
-            logger.error(f"Tesseract недоступен: {e}")
-            raise Exception("Tesseract OCR не установлен или недоступен")
+        if PyTessBaseAPI is None:
+            try:
+                _tesseract_version()
+            except Exception as e:
+                logger.error(f"Tesseract недоступен: {e}")
+                raise Exception("Tesseract OCR не установлен или недоступен")
         
         try:
             image = Image.open(file_path)
             logger.info(f"Изображение загружено: {image.size} пикселей")
             
             # Пробуем разные настройки OCR для лучшего распознавания
-            configs = [
-                '--oem 3 --psm 6',  # Стандартные настройки
-                '--oem 3 --psm 3',  # Автоматическое определение страницы
-                '--oem 1 --psm 6',  # Legacy OCR engine
-                '--oem 3 --psm 8',  # Одна строка текста
-                '--oem 3 --psm 13', # Необработанная строка
-            ]
-            
+            configs = _IMAGE_OCR_CONFIGS if PyTessBaseAPI is None else _TESSEROCR_IMAGE_CONFIGS
             best_text = ""
             for config in configs:
                 try:
-                    text = pytesseract.image_to_string(image, lang="rus+eng", config=config)
+                    text = _image_to_string(image, config)
                     if text and len(text.strip()) > len(best_text.strip()):
                         best_text = text
                         logger.info(f"Успешное распознавание с конфигурацией: {config}")
                 except Exception as e:
                     logger.warning(f"Ошибка OCR с конфигурацией {config}: {e}")
+                
+                # Следующие конфигурации нужны, только если текста слишком мало
+                if len("".join(best_text.split())) >= _OCR_MIN_CHARS:
+                    break
             
             return {
                 'text': best_text,
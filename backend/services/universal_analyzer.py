@@ -6,6 +6,7 @@
 
 import re
 import os
+from functools import lru_cache
 from typing import Dict, List, Optional, Any
 from services.enhanced_aviation_analyzer import analyze_aviation_file_enhanced
 from services.adaptive_analyzer import analyze_tariff_text_adaptive
@@ -15,36 +16,108 @@ from services.sea_analyzer import analyze_sea_file
 from services.auto_analyzer import analyze_auto_file
 from services.ltl_analyzer import analyze_ltl_file
 
+# Aho-Corasick находит все ключевые слова за один проход по тексту;
+# если pyahocorasick не установлен, проверяем слова по одному
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Ключевые слова для определения типа транспорта по содержимому
+TRANSPORT_KEYWORDS = {
+    'air': ('авиа', 'aviation', 'air', 'flight', 'airport', 'hkg', 'pek', 'can', 'sha', 'xiy', 'svo', 'vvo'),
+    'sea': ('море', 'sea', 'fcl', 'морской', 'контейнер', 'container', 'порт', 'port', 'vessel', 'ship'),
+    'rail': ('жд', 'rail', 'железнодорожный', 'поезд', 'train', 'станция', 'station'),
+    'auto': ('авто', 'auto', 'ftl', 'грузовик', 'truck', 'автомобильный'),
+    'multimodal': ('мульти', 'multimodal', 'mmp', 'комбинированный', 'combined'),
+    'ltl': ('сборка', 'ltl', 'частичная', 'partial', 'сборный')
+}
+
+# Ключевые слова базисов поставки (в порядке проверки)
+BASIS_KEYWORDS = {
+    'EXW': ('exw', 'ex works', 'франко завод'),
+    'FCA': ('fca', 'free carrier'),
+    'CPT': ('cpt', 'carriage paid to'),
+    'CIP': ('cip', 'carriage and insurance paid to'),
+    'DAP': ('dap', 'delivered at place'),
+    'DPU': ('dpu', 'delivered at place unloaded'),
+    'DDP': ('ddp', 'delivered duty paid'),
+    'FAS': ('fas', 'free alongside ship'),
+    'FOB': ('fob', 'free on board'),
+    'CFR': ('cfr', 'cost and freight'),
+    'CIF': ('cif', 'cost insurance and freight')
+}
+
+
+# Порядок базисов задает приоритет, если в тексте встречается несколько
+_BASIS_ORDER = {basis: position for position, basis in enumerate(BASIS_KEYWORDS)}
+
+
+def _build_automaton(groups: Dict[str, tuple]):
+    """Строит автомат Aho-Corasick со значениями (группа, ключевое слово)."""
+    automaton = ahocorasick.Automaton()
+    for group, keywords in groups.items():
+        for keyword in keywords:
+            automaton.add_word(keyword, (group, keyword))
+    automaton.make_automaton()
+    return automaton
+
+
+if ahocorasick is not None:
+    _TRANSPORT_AUTOMATON = _build_automaton(TRANSPORT_KEYWORDS)
+    _BASIS_AUTOMATON = _build_automaton(BASIS_KEYWORDS)
+else:
+    _TRANSPORT_AUTOMATON = None
+    _BASIS_AUTOMATON = None
+
+_MULTI_PIPE_RE = re.compile(r'[|]{2,}')
+_MULTI_WS_RE = re.compile(r'\s+')
+_NON_WORD_RE = re.compile(r'[^\w\s\-\.]')
+
+# Служебные части названий городов. Однословные части удаляются одним
+# выражением: удаление целого слова не меняет границ слов вокруг, поэтому
+# результат тот же, что при удалении по одной. Фразы "china to" и
+# "to china" пересекаются, их порядок удаления важен - они идут отдельно
+_CITY_PARTS_RES = (
+    re.compile(r'\bchina to\b', re.IGNORECASE),
+    re.compile(r'\bto china\b', re.IGNORECASE),
+    re.compile(
+        r'\b(?:vvo|vyp|com|port|terminal|station|border|customs|gate|checkpoint|vladvistok)\b',
+        re.IGNORECASE
+    ),
+)
+
+# Специализированные анализаторы по типу транспорта; для остальных типов
+# используется адаптивный анализатор
+_FILE_ANALYZERS = {
+    'air': analyze_air_file,
+    'rail': analyze_railway_file,
+    'sea': analyze_sea_file,
+    'auto': analyze_auto_file,
+    'ltl': analyze_ltl_file,
+}
+
+# Служебные слова, которые не могут быть названием города
+_CITY_SKIP_WORDS = frozenset(('sea', 'air', 'rail', 'auto', '05', 'com', 'pol', 'pod', 'fcl', 'ltl', 'ftl'))
+_ROUTE_SKIP_WORDS = frozenset((
+    'pol', 'pod', 'fcl', 'ltl', 'ftl', 'sea', 'air', 'rail', 'auto', 'морской',
+    'авиа', 'жд', 'авто', 'port', 'terminal', '05', 'com'
+))
+
+
 class UniversalAnalyzer:
     """Универсальный анализатор для всех типов файлов."""
     
     def __init__(self):
-        self.transport_keywords = {
-            'air': ['авиа', 'aviation', 'air', 'flight', 'airport', 'hkg', 'pek', 'can', 'sha', 'xiy', 'svo', 'vvo'],
-            'sea': ['море', 'sea', 'fcl', 'морской', 'контейнер', 'container', 'порт', 'port', 'vessel', 'ship'],
-            'rail': ['жд', 'rail', 'железнодорожный', 'поезд', 'train', 'станция', 'station'],
-            'auto': ['авто', 'auto', 'ftl', 'грузовик', 'truck', 'автомобильный'],
-            'multimodal': ['мульти', 'multimodal', 'mmp', 'комбинированный', 'combined'],
-            'ltl': ['сборка', 'ltl', 'частичная', 'partial', 'сборный']
-        }
-        
-        self.basis_keywords = {
-            'EXW': ['exw', 'ex works', 'франко завод'],
-            'FCA': ['fca', 'free carrier'],
-            'CPT': ['cpt', 'carriage paid to'],
-            'CIP': ['cip', 'carriage and insurance paid to'],
-            'DAP': ['dap', 'delivered at place'],
-            'DPU': ['dpu', 'delivered at place unloaded'],
-            'DDP': ['ddp', 'delivered duty paid'],
-            'FAS': ['fas', 'free alongside ship'],
-            'FOB': ['fob', 'free on board'],
-            'CFR': ['cfr', 'cost and freight'],
-            'CIF': ['cif', 'cost insurance and freight']
-        }
+        self.transport_keywords = TRANSPORT_KEYWORDS
+        self.basis_keywords = BASIS_KEYWORDS
+        
+        # Маршруты из одного файла содержат одни и те же города, поэтому
+        # очистка названий кэшируется на экземпляре
+        self._clean_city_name = lru_cache(maxsize=4096)(self._clean_city_name_uncached)
     
     def determine_transport_type(self, text: str, file_path: str) -> str:
         """Определяет тип транспорта по содержимому и пути файла."""
-        text_lower = text.lower()
         file_lower = file_path.lower()
         
         # Сначала проверяем по пути файла
@@ -61,13 +134,21 @@ class UniversalAnalyzer:
         elif 'мульти' in file_lower or 'mmp' in file_lower:
             return 'multimodal'
         
-        # Затем проверяем по содержимому
+        # Затем проверяем по содержимому; копию текста в нижнем регистре
+        # делаем только здесь, когда путь файла не подсказал тип
+        text_lower = text.lower()
         scores = {transport: 0 for transport in self.transport_keywords}
         
-        for transport, keywords in self.transport_keywords.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    scores[transport] += 1
+        if _TRANSPORT_AUTOMATON is not None:
+            # Один проход автомата вместо поиска каждого слова по всему тексту
+            found = {value for _, value in _TRANSPORT_AUTOMATON.iter(text_lower)}
+            for transport, _ in found:
+                scores[transport] += 1
+        else:
+            for transport, keywords in self.transport_keywords.items():
+                for keyword in keywords:
+                    if keyword in text_lower:
+                        scores[transport] += 1
         
         # Возвращаем тип с наибольшим количеством совпадений
         if max(scores.values()) > 0:
@@ -79,10 +160,22 @@ class UniversalAnalyzer:
         """Определяет базис поставки."""
         text_lower = text.lower()
         
-        for basis, keywords in self.basis_keywords.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    return basis
+        if _BASIS_AUTOMATON is not None:
+            # Из всех найденных базисов выбираем первый по порядку проверки
+            best_position, best_basis = len(_BASIS_ORDER), None
+            for _, (basis, _) in _BASIS_AUTOMATON.iter(text_lower):
+                position = _BASIS_ORDER[basis]
+                if position < best_position:
+                    best_position, best_basis = position, basis
+                    if position == 0:
+                        break
+            if best_basis is not None:
+                return best_basis
+        else:
+            for basis, keywords in self.basis_keywords.items():
+                for keyword in keywords:
+                    if keyword in text_lower:
+                        return basis
         
         return 'EXW'  # По умолчанию
     
@@ -123,8 +216,7 @@ class UniversalAnalyzer:
                 continue
             
             # Пропускаем служебные слова
-            skip_words = ['pol', 'pod', 'fcl', 'ltl', 'ftl', 'sea', 'air', 'rail', 'auto', 'морской', 'авиа', 'жд', 'авто', 'port', 'terminal', '05', 'com']
-            if any(word.lower() == origin.lower() or word.lower() == destination.lower() for word in skip_words):
+            if origin.lower() in _ROUTE_SKIP_WORDS or destination.lower() in _ROUTE_SKIP_WORDS:
                 continue
             
             # Обновляем очищенные названия
@@ -135,29 +227,23 @@ class UniversalAnalyzer:
         
         return cleaned_routes[:10]  # Ограничиваем количество маршрутов
     
-    def _clean_city_name(self, city: str) -> str:
+    def _clean_city_name_uncached(self, city: str) -> str:
         """Очищает название города от лишних символов."""
         if not city:
             return ''
         
         # Убираем лишние символы
         city = city.strip()
-        city = re.sub(r'[|]{2,}', ' ', city)  # Убираем множественные |
-        city = re.sub(r'\s+', ' ', city)  # Убираем множественные пробелы
-        city = re.sub(r'[^\w\s\-\.]', ' ', city)  # Оставляем только буквы, цифры, пробелы, дефисы и точки
+        city = _MULTI_PIPE_RE.sub(' ', city)  # Убираем множественные |
+        city = _MULTI_WS_RE.sub(' ', city)  # Убираем множественные пробелы
+        city = _NON_WORD_RE.sub(' ', city)  # Оставляем только буквы, цифры, пробелы, дефисы и точки
         
         # Убираем служебные части
-        parts_to_remove = [
-            'china to', 'to china', 'vvo', 'vyp', 'com', 'port', 'terminal',
-            'station', 'border', 'customs', 'gate', 'checkpoint', 'vladvistok'
-        ]
-        
-        for part in parts_to_remove:
-            city = re.sub(rf'\b{part}\b', '', city, flags=re.IGNORECASE)
+        for part_re in _CITY_PARTS_RES:
+            city = part_re.sub('', city)
         
         # Проверяем на точное совпадение со служебными словами
-        skip_words = ['sea', 'air', 'rail', 'auto', '05', 'com', 'pol', 'pod', 'fcl', 'ltl', 'ftl']
-        if city.lower() in [word.lower() for word in skip_words]:
+        if city.lower() in _CITY_SKIP_WORDS:
             return ''
         
         # Очищаем от лишних пробелов
@@ -177,16 +263,9 @@ class UniversalAnalyzer:
         basis = self.determine_basis(text)
         
         # Выбираем подходящий анализатор
-        if transport_type == 'air':
-            result = analyze_air_file(text, file_path)
-        elif transport_type == 'rail':
-            result = analyze_railway_file(text, file_path)
-        elif transport_type == 'sea':
-            result = analyze_sea_file(text, file_path)
-        elif transport_type == 'auto':
-            result = analyze_auto_file(text, file_path)
-        elif transport_type == 'ltl':
-            result = analyze_ltl_file(text, file_path)
+        analyzer = _FILE_ANALYZERS.get(transport_type)
+        if analyzer is not None:
+            result = analyzer(text, file_path)
         else:
             result = analyze_tariff_text_adaptive(text)
         
@@ -200,7 +279,12 @@ class UniversalAnalyzer:
         
         return result
 
+
+# Анализатор не хранит состояния между вызовами, поэтому используется
+# один общий экземпляр
+_ANALYZER = UniversalAnalyzer()
+
+
 def analyze_file_universal(text: str, file_path: str, use_llm: bool = False) -> Dict[str, Any]:
     """Универсальная функция анализа файла."""
-    analyzer = UniversalAnalyzer()
-    return analyzer.analyze_file(text, file_path, use_llm)
+    return _ANALYZER.analyze_file(text, file_path, use_llm)
@@ -0,0 +1,39 @@
+"""
+Проверка защиты от XXE при потоковом чтении DOCX
+"""
+
+import os
+import sys
+import zipfile
+
+import pytest
+
+for module in ("pdfplumber", "pytesseract", "docx", "lxml", "pandas", "PIL"):
+    pytest.importorskip(module)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import parsers  # noqa: E402
+
+SECRET = "SECRET-TARIFF-CONTENT"
+
+
+def _write_docx(path, document_xml):
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("word/document.xml", document_xml)
+
+
+def test_external_entity_is_not_expanded(tmp_path):
+    secret_file = tmp_path / "secret.txt"
+    secret_file.write_text(SECRET, encoding="utf-8")
+    docx_path = tmp_path / "evil.docx"
+    _write_docx(docx_path, f"""<?xml version="1.0"?>
+<!DOCTYPE d [<!ENTITY x SYSTEM "{secret_file.as_uri()}">]>
+<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">
+<w:body><w:p><w:r><w:t>before&x;after</w:t></w:r></w:p></w:body>
+</w:document>""")
+
+    paragraphs, tables = parsers._fast_docx_content(str(docx_path))
+
+    assert not any(SECRET in paragraph for paragraph in paragraphs)
+    assert tables == []
@@ -5,7 +5,7 @@
 
 import os
 import sys
-from sqlalchemy import create_engine, text
+from sqlalchemy import bindparam, create_engine, text
 from sqlalchemy.orm import sessionmaker
 
 # Добавляем текущую директорию в путь
@@ -13,63 +13,116 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database import DATABASE_URL, engine
 
+# Колонки, которые могут отсутствовать в базах, созданных старыми версиями:
+# (таблица, колонка, определение колонки)
+_REQUIRED_COLUMNS = (
+    ("users", "is_active", "BOOLEAN DEFAULT 1"),
+    ("tariffs", "created_by_user_id", "INTEGER"),
+    ("tariff_archive", "created_by_user_id", "INTEGER"),
+)
+
+# Номер набора изменений схемы; увеличивается при добавлении новых шагов
+_MIGRATION_ID = 1
+
+# Отметка об успешном обновлении хранится рядом с файлом базы: номер
+# набора изменений и PRAGMA schema_version после обновления. SQLite
+# увеличивает schema_version при любом изменении схемы, поэтому если оба
+# числа совпадают, схема уже обновлена и проверки можно не выполнять
+_MIGRATION_STAMP_NAME = ".migration_stamp"
+
+
+def _migration_stamp_path():
+    """Путь к файлу отметки или None, если база не хранится в файле"""
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return None
+    return os.path.join(os.path.dirname(os.path.abspath(database)), _MIGRATION_STAMP_NAME)
+
+
+def _read_migration_stamp(stamp_path):
+    """Читает отметку (schema_version, номер набора изменений) или None"""
+    try:
+        with open(stamp_path, encoding="utf-8") as stamp_file:
+            schema_version, migration_id = stamp_file.read().split()
+        return int(schema_version), int(migration_id)
+    except (OSError, ValueError):
+        return None
+
+
 def update_database_schema():
     """Обновляет схему базы данных"""
     print("🔧 Обновление схемы базы данных...")
     
     try:
         with engine.connect() as connection:
-            # Проверяем, существует ли колонка is_active
-            result = connection.execute(text("""
-                PRAGMA table_info(users);
-            """)).fetchall()
+            stamp_path = _migration_stamp_path()
+            if stamp_path is not None:
+                schema_version = connection.exec_driver_sql("PRAGMA schema_version").scalar()
+                if _read_migration_stamp(stamp_path) == (schema_version, _MIGRATION_ID):
+                    print("✅ Схема базы данных уже обновлена")
+                    return True
             
-            columns = [row[1] for row in result]
+            # WAL и synchronous=NORMAL: фиксация транзакции требует меньше
+            # синхронизаций с диском, а читатели не блокируются записью.
+            # Режим журнала меняется только вне транзакции и сохраняется
+            # в файле базы
+            connection.exec_driver_sql("PRAGMA journal_mode=WAL")
+            connection.exec_driver_sql("PRAGMA synchronous=NORMAL")
             
-            if 'is_active' not in columns:
-                print("➕ Добавление колонки 'is_active' в таблицу 'users'...")
-                connection.execute(text("""
-                    ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT 1;
-                """))
-                connection.commit()
-                print("✅ Колонка 'is_active' добавлена")
-            else:
-                print("✅ Колонка 'is_active' уже существует")
+            # Все проверки и изменения схемы выполняются в одной транзакции:
+            # одна блокировка и одна синхронизация с диском вместо отдельной
+            # фиксации после каждого ALTER TABLE. При ошибке схема остается
+            # прежней целиком. IMMEDIATE сразу берет блокировку на запись,
+            # чтобы схему не изменили между проверкой и ALTER TABLE
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
             
-            # Проверяем, существует ли колонка created_by_user_id в tariffs
-            result = connection.execute(text("""
-                PRAGMA table_info(tariffs);
-            """)).fetchall()
+            # Колонки всех нужных таблиц читаем одним запросом и дальше
+            # проверяем по словарю
+            schema = {table: set() for table, _, _ in _REQUIRED_COLUMNS}
+            result = connection.execute(
+                text("""
+                    SELECT m.name, p.name
+                    FROM sqlite_master AS m
+                    JOIN pragma_table_info(m.name) AS p
+                    WHERE m.type = 'table' AND m.name IN :tables;
+                """).bindparams(bindparam("tables", expanding=True)),
+                {"tables": list(schema)}
+            )
+            for table, column in result:
+                schema[table].add(column)
             
-            columns = [row[1] for row in result]
+            # Сначала собираем недостающие колонки, затем добавляем их подряд
+            missing_columns = []
+            for table, column, column_ddl in _REQUIRED_COLUMNS:
+                if column in schema[table]:
+                    print(f"✅ Колонка '{column}' уже существует в '{table}'")
+                else:
+                    missing_columns.append((table, column, column_ddl))
             
-            if 'created_by_user_id' not in columns:
-                print("➕ Добавление колонки 'created_by_user_id' в таблицу 'tariffs'...")
-                connection.execute(text("""
-                    ALTER TABLE tariffs ADD COLUMN created_by_user_id INTEGER;
-                """))
-                connection.commit()
-                print("✅ Колонка 'created_by_user_id' добавлена в 'tariffs'")
-            else:
-                print("✅ Колонка 'created_by_user_id' уже существует в 'tariffs'")
+            for table, column, column_ddl in missing_columns:
+                print(f"➕ Добавление колонки '{column}' в таблицу '{table}'...")
+                connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_ddl};"))
+                print(f"✅ Колонка '{column}' добавлена в '{table}'")
             
-            # Проверяем, существует ли колонка created_by_user_id в tariff_archive
-            result = connection.execute(text("""
-                PRAGMA table_info(tariff_archive);
-            """)).fetchall()
+            # Создаем частичный индекс для поиска по активному архиву тарифов;
+            # заменяет прежний составной индекс ix_tariff_archive_lookup
+            connection.execute(text("""
+                DROP INDEX IF EXISTS ix_tariff_archive_lookup;
+            """))
+            connection.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_tariff_archive_active ON tariff_archive
+                (transport_type, basis, origin_city, destination_city, archived_at DESC)
+                WHERE is_active = 1;
+            """))
+            print("✅ Индекс 'ix_tariff_archive_active' в 'tariff_archive' создан или уже существует")
             
-            columns = [row[1] for row in result]
+            connection.commit()
             
-            if 'created_by_user_id' not in columns:
-                print("➕ Добавление колонки 'created_by_user_id' в таблицу 'tariff_archive'...")
-                connection.execute(text("""
-                    ALTER TABLE tariff_archive ADD COLUMN created_by_user_id INTEGER;
-                """))
-                connection.commit()
-                print("✅ Колонка 'created_by_user_id' добавлена в 'tariff_archive'")
-            else:
-                print("✅ Колонка 'created_by_user_id' уже существует в 'tariff_archive'")
-                
+            if stamp_path is not None:
+                schema_version = connection.exec_driver_sql("PRAGMA schema_version").scalar()
+                with open(stamp_path, "w", encoding="utf-8") as stamp_file:
+                    stamp_file.write(f"{schema_version} {_MIGRATION_ID}\n")
+
         print("✅ Схема базы данных обновлена успешно!")
         
     except Exception as e:
@@ -1,6 +1,9 @@
 import os
+import re
+import time
 import logging
-import requests
+from typing import Dict, List, Optional, Tuple
+import aiohttp
 from aiogram import Bot, Dispatcher, executor, types
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
@@ -14,6 +17,54 @@ logging.basicConfig(level=logging.INFO)
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher(bot)
 
+# Общая асинхронная HTTP-сессия: соединения с API и с серверами Telegram
+# переиспользуются между запросами (keep-alive), а ожидание ответа не
+# блокирует обработку сообщений других пользователей. Создается при
+# запуске бота, так как ей нужен работающий event loop
+session: Optional[aiohttp.ClientSession] = None
+
+# Вес и объем в сообщении для расчета: целое или десятичное число
+_NUMERIC_RE = re.compile(r'\d+(?:\.\d+)?')
+
+# Размер фрагмента при пересылке файла из Telegram в API
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Результаты bot.get_file по file_id: при повторной загрузке того же файла
+# путь не запрашивается у Telegram заново. Ссылка на файл действительна
+# около часа, поэтому запись хранится немного меньше
+_FILE_CACHE_TTL = 3000
+_FILE_CACHE_MAXSIZE = 1024
+_file_cache: Dict[str, Tuple[float, types.File]] = {}
+
+
+async def get_file_cached(file_id: str) -> types.File:
+    """Возвращает bot.get_file(file_id), используя недавний результат."""
+    now = time.monotonic()
+    cached = _file_cache.get(file_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    
+    file = await bot.get_file(file_id)
+    _file_cache.pop(file_id, None)
+    if len(_file_cache) >= _FILE_CACHE_MAXSIZE:
+        # Вытесняем самую старую запись
+        del _file_cache[next(iter(_file_cache))]
+    _file_cache[file_id] = (now + _FILE_CACHE_TTL, file)
+    return file
+
+
+async def on_startup(dispatcher: Dispatcher):
+    global session
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=20),
+        timeout=aiohttp.ClientTimeout(total=30),
+    )
+
+
+async def on_shutdown(dispatcher: Dispatcher):
+    if session is not None:
+        await session.close()
+
 
 @dp.message_handler(commands=["start"]) 
 async def start(message: types.Message):
@@ -69,43 +120,53 @@ async def calculate(message: types.Message):
     await message.answer("🧮 Отправьте данные для расчёта в формате:\nтип_транспорта, базис, город_отправления, город_назначения, вес_кг, объём_м³, наименование_груза\n\nПример: auto, EXW, Москва, Санкт-Петербург, 1000, 5.5, Оборудование")
 
 
-@dp.message_handler(lambda m: "," in m.text and m.text.count(",") >= 3)
+def _parse_num(value: str) -> Optional[float]:
+    """Вес или объём из сообщения; None, если это не число."""
+    return float(value) if _NUMERIC_RE.fullmatch(value) else None
+
+
+def _payload_find(parts: List[str]) -> dict:
+    """Запрос поиска тарифов из сообщения из 4 полей."""
+    transport, basis, origin, dest = parts
+    return {
+        "transport_type": transport.lower(),
+        "basis": basis.upper(),
+        "origin_city": origin,
+        "destination_city": dest,
+    }
+
+
+def _payload_calc(parts: List[str]) -> dict:
+    """Запрос полного расчёта из сообщения из 7 и более полей."""
+    transport, basis, origin, dest, weight, volume, cargo_name = parts[:7]
+    return {
+        "cargo_kind": "general",
+        "transport_type": transport.lower(),
+        "basis": basis.upper(),
+        "origin_city": origin,
+        "destination_city": dest,
+        "weight_kg": _parse_num(weight),
+        "volume_m3": _parse_num(volume),
+        "cargo_name": cargo_name,
+    }
+
+
+@dp.message_handler(lambda m: bool(m.text) and m.text.count(",") >= 3)
 async def handle_calculation_params(message: types.Message):
     try:
         parts = [p.strip() for p in message.text.split(",")]
         
         if len(parts) >= 4:
-            # Поиск тарифов
-            if len(parts) == 4:
-                transport, basis, origin, dest = parts
-                payload = {
-                    "transport_type": transport.lower(),
-                    "basis": basis.upper(),
-                    "origin_city": origin,
-                    "destination_city": dest,
-                }
-                endpoint = "/calculate/calculate"
-            else:
-                # Полный расчёт
-                transport, basis, origin, dest, weight, volume, cargo_name = parts[:7]
-                payload = {
-                    "cargo_kind": "general",
-                    "transport_type": transport.lower(),
-                    "basis": basis.upper(),
-                    "origin_city": origin,
-                    "destination_city": dest,
-                    "weight_kg": float(weight) if weight.replace('.', '').isdigit() else None,
-                    "volume_m3": float(volume) if volume.replace('.', '').isdigit() else None,
-                    "cargo_name": cargo_name,
-                }
-                endpoint = "/calculate/calculate"
-            
-            resp = requests.post(f"{API_BASE}{endpoint}", json=payload, timeout=30)
-            if not resp.ok:
-                await message.answer(f"❌ Ошибка при расчёте: {resp.status_code}")
-                return
+            # Поиск тарифов или полный расчёт
+            payload = _payload_find(parts) if len(parts) == 4 else _payload_calc(parts)
+            endpoint = "/calculate/calculate"
             
-            data = resp.json()
+            async with session.post(f"{API_BASE}{endpoint}", json=payload) as resp:
+                if resp.status >= 400:
+                    await message.answer(f"❌ Ошибка при расчёте: {resp.status}")
+                    return
+                
+                data = await resp.json()
             if not data:
                 await message.answer("🔍 Тарифы не найдены для указанных параметров")
                 return
@@ -173,25 +234,27 @@ async def handle_upload(message: types.Message):
             return
         
         # Скачиваем файл
-        file = await bot.get_file(file_id)
+        file = await get_file_cached(file_id)
         file_path = file.file_path
         url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
         
-        # Отправляем файл в API
-        with requests.get(url, stream=True) as file_response:
-            files = {"file": (file_name, file_response.content)}
-            data = {"supplier_id": str(supplier_id)}
-            
-            resp = requests.post(f"{API_BASE}/tariffs/upload", data=data, files=files, timeout=60)
+        # Пересылаем файл в API по частям, не загружая его в память целиком
+        upload_timeout = aiohttp.ClientTimeout(total=60)
+        async with session.get(url, timeout=upload_timeout) as file_response:
+            file_response.raise_for_status()
+            form = aiohttp.FormData()
+            form.add_field("supplier_id", str(supplier_id))
+            form.add_field("file", file_response.content.iter_chunked(UPLOAD_CHUNK_SIZE), filename=file_name)
             
-            if resp.ok:
-                result = resp.json()
-                if isinstance(result, list) and result:
-                    await message.answer(f"✅ Файл успешно обработан!\n📊 Распознано записей: {len(result)}")
+            async with session.post(f"{API_BASE}/tariffs/upload", data=form, timeout=upload_timeout) as resp:
+                if resp.status < 400:
+                    result = await resp.json()
+                    if isinstance(result, list) and result:
+                        await message.answer(f"✅ Файл успешно обработан!\n📊 Распознано записей: {len(result)}")
+                    else:
+                        await message.answer("✅ Файл загружен, но данные не распознаны. Проверьте формат файла.")
                 else:
-                    await message.answer("✅ Файл загружен, но данные не распознаны. Проверьте формат файла.")
-            else:
-                await message.answer(f"❌ Ошибка обработки файла: {resp.status_code}")
+                    await message.answer(f"❌ Ошибка обработки файла: {resp.status}")
                 
     except Exception as e:
         logging.error(f"Error in file upload: {e}")
@@ -201,17 +264,17 @@ async def handle_upload(message: types.Message):
 @dp.message_handler(commands=["status"])
 async def status(message: types.Message):
     try:
-        resp = requests.get(f"{API_BASE}/", timeout=5)
-        if resp.ok:
-            await message.answer("✅ Сервер работает нормально")
-        else:
-            await message.answer("⚠️ Сервер недоступен")
+        async with session.get(f"{API_BASE}/", timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            if resp.status < 400:
+                await message.answer("✅ Сервер работает нормально")
+            else:
+                await message.answer("⚠️ Сервер недоступен")
     except:
         await message.answer("❌ Сервер недоступен")
 
 
 if __name__ == "__main__":
     logging.info("Starting Telegram bot...")
-    executor.start_polling(dp, skip_updates=True)
+    executor.start_polling(dp, skip_updates=True, on_startup=on_startup, on_shutdown=on_shutdown)
 
 